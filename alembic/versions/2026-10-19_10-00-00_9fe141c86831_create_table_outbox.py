@@ -0,0 +1,61 @@
+"""create table outbox
+
+Revision ID: 9fe141c86831
+Revises: 9e9890988855
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import aiosqlite
+
+# revision identifiers, used by Alembic.
+revision = "9fe141c86831"
+down_revision = "9e9890988855"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if isinstance(op.get_context().dialect, aiosqlite.dialect):
+        now_context = sa.text("(CURRENT_TIMESTAMP)")
+    else:
+        now_context = sa.text("now()")
+    op.create_table(
+        "outbox",
+        sa.Column(
+            "id",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            autoincrement=True,
+            nullable=False,
+        ),
+        sa.Column("topic", sa.String(length=50), nullable=False),
+        sa.Column("key", sa.String(length=100), nullable=False),
+        sa.Column("event", sa.String(length=50), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column(
+            "created",
+            sa.DateTime(timezone=True),
+            server_default=now_context,
+            nullable=True,
+        ),
+        sa.Column("published", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "position",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_outbox_published"), "outbox", ["published"], unique=False
+    )
+    op.create_index(
+        op.f("ix_outbox_position"), "outbox", ["position"], unique=True
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_outbox_position"), table_name="outbox")
+    op.drop_index(op.f("ix_outbox_published"), table_name="outbox")
+    op.drop_table("outbox")
@@ -0,0 +1,35 @@
+"""create table refreshtoken
+
+Revision ID: b7d2e4c91f06
+Revises: a3c5e1f27b40
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b7d2e4c91f06"
+down_revision = "a3c5e1f27b40"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "refreshtoken",
+        sa.Column("token", sa.String(length=64), nullable=False),
+        sa.Column("expires", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("token"),
+    )
+    op.create_index(
+        op.f("ix_refreshtoken_expires"),
+        "refreshtoken",
+        ["expires"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_refreshtoken_expires"), table_name="refreshtoken")
+    op.drop_table("refreshtoken")
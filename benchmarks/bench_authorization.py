@@ -0,0 +1,62 @@
+"""
+Benchmark of bearer token authorization dependency.
+
+Measures time ``utils.security.authorize`` spends on every request with
+a valid admin access token, decoding token every time and with decoded
+tokens cache, which is used by application.
+
+Usage:
+
+    python -m benchmarks.bench_authorization
+"""
+import asyncio
+import time
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+
+from fastapi.security import HTTPAuthorizationCredentials, SecurityScopes
+
+from utils.auth import create_access_token
+from utils.security import TokenCache, authorize
+
+ROUNDS = 20000
+
+
+def per_call(started: float) -> str:
+    """Format time spent for one round in microseconds."""
+    return f"{(time.perf_counter() - started) / ROUNDS * 1e6:.2f} us"
+
+
+async def bench_authorize() -> None:
+    """Measure authorization of a request with admin access token."""
+    token = create_access_token(
+        {
+            "id": 1,
+            "email": "admin@example.com",
+            "jti": uuid.uuid4().hex,
+            "scope": ["admin"],
+            "token_type": "access_token",
+        },
+        timedelta(seconds=300),
+    )
+    credentials = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=token
+    )
+    scopes = SecurityScopes(["admin"])
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace()))
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        await authorize(scopes, request, credentials)  # type: ignore
+    print("authorize, decode every time:", per_call(started))
+
+    request.app.state.token_cache = TokenCache(ROUNDS)
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        await authorize(scopes, request, credentials)  # type: ignore
+    print("authorize, decoded cache:    ", per_call(started))
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_authorize())
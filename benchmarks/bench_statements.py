@@ -0,0 +1,71 @@
+"""
+Benchmark of hot user queries statements.
+
+Compares building ``select`` statement on every request with executing
+prebuilt module level statement and prints compiled cache statistics.
+
+Usage:
+
+    python -m benchmarks.bench_statements
+"""
+import asyncio
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from db.database import (
+    instrument_engine,
+    statement_cache_hits,
+    statement_cache_misses,
+)
+from models import Base
+from repositories.users import select_user_by_id, user_columns, users_table
+
+ROUNDS = 20000
+
+
+def per_call(started: float) -> str:
+    """Format time spent for one round in microseconds."""
+    return f"{(time.perf_counter() - started) / ROUNDS * 1e6:.2f} us"
+
+
+def bench_build() -> None:
+    """Measure statement construction and cache key generation only."""
+    started = time.perf_counter()
+    for user_id in range(ROUNDS):
+        select(*user_columns).where(
+            users_table.c.id == user_id
+        )._generate_cache_key()
+    print("build select + cache key:   ", per_call(started))
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        select_user_by_id._generate_cache_key()
+    print("prebuilt select cache key:  ", per_call(started))
+
+
+async def bench_execute() -> None:
+    """Measure statements execution against in memory database."""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    instrument_engine(engine.sync_engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with engine.connect() as conn:
+        started = time.perf_counter()
+        for user_id in range(ROUNDS):
+            await conn.execute(
+                select(*user_columns).where(users_table.c.id == user_id)
+            )
+        print("execute built select:       ", per_call(started))
+        started = time.perf_counter()
+        for user_id in range(ROUNDS):
+            await conn.execute(select_user_by_id, {"user_id": user_id})
+        print("execute prebuilt select:    ", per_call(started))
+    await engine.dispose()
+    print("compiled cache hits:        ", statement_cache_hits.value)
+    print("compiled cache misses:      ", statement_cache_misses.value)
+
+
+if __name__ == "__main__":
+    bench_build()
+    asyncio.run(bench_execute())
@@ -0,0 +1,72 @@
+"""
+Benchmark of refresh tokens store backends.
+
+Adds tokens and checks them back with every backend and prints mean
+latency of one operation. SQL backend uses in memory SQLite, redis
+backend uses ``REDIS_URL`` and is skipped when redis is unavailable.
+
+Usage:
+
+    python -m benchmarks.bench_token_store
+"""
+import asyncio
+import time
+import uuid
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config.connection import REDIS_URL
+from models import Base
+from repositories.tokens import (
+    InMemoryTokenStore,
+    RedisTokenStore,
+    SQLTokenStore,
+    TokenStore,
+)
+
+ROUNDS = 2000
+
+
+async def bench_store(name: str, store: TokenStore) -> None:
+    """Measure add, exists and batch exists of one backend."""
+    tokens = [uuid.uuid4().hex for _ in range(ROUNDS)]
+    started = time.perf_counter()
+    for token in tokens:
+        await store.add(token, 60)
+    added = time.perf_counter()
+    for token in tokens:
+        await store.exists(token)
+    checked = time.perf_counter()
+    for start in range(0, ROUNDS, 100):
+        await store.exists_many(tokens[start : start + 100])  # noqa: E203
+    batched = time.perf_counter()
+    print(
+        f"{name:8}",
+        f"add {(added - started) / ROUNDS * 1e6:9.2f} us,",
+        f"exists {(checked - added) / ROUNDS * 1e6:9.2f} us,",
+        f"exists x100 {(batched - checked) / ROUNDS * 1e8:9.2f} us",
+    )
+
+
+async def bench_token_store() -> None:
+    """Measure every backend."""
+    await bench_store("memory", InMemoryTokenStore())
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await bench_store("sql", SQLTokenStore(engine))
+    await engine.dispose()
+    client = redis.from_url(REDIS_URL or "redis://127.0.0.1:6379/0")
+    try:
+        await client.ping()
+    except (OSError, redis.RedisError) as exc:
+        print("redis    skipped:", exc)
+    else:
+        await bench_store("redis", RedisTokenStore(client))
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_token_store())
@@ -0,0 +1,78 @@
+"""
+Benchmark of forward authentication endpoint.
+
+Calls ``/auth/verify`` through ASGI interface of an application with
+forward authentication router only, so HTTP parsing and network are
+excluded, and prints requests per second of one core.
+
+Usage:
+
+    python -m benchmarks.bench_verify
+"""
+import asyncio
+import time
+import uuid
+from datetime import timedelta
+
+from fastapi import FastAPI
+
+from utils.auth import create_access_token
+from utils.security import TokenCache
+from views import verify
+
+ROUNDS = 20000
+
+
+async def bench_verify() -> None:
+    """Measure forward authentication of valid and invalid tokens."""
+    app = FastAPI()
+    app.include_router(verify.router)
+    app.state.token_cache = TokenCache(ROUNDS)
+    token = create_access_token(
+        {
+            "id": 1,
+            "email": "admin@example.com",
+            "jti": uuid.uuid4().hex,
+            "scope": ["admin"],
+            "token_type": "access_token",
+        },
+        timedelta(seconds=300),
+    )
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        pass
+
+    for name, authorization in (
+        ("valid token:  ", f"Bearer {token}".encode()),
+        ("no token:     ", b""),
+    ):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/auth/verify",
+            "raw_path": b"/auth/verify",
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"authorization", authorization)],
+            "client": ("127.0.0.1", 1),
+            "server": ("127.0.0.1", 8000),
+        }
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            await app(dict(scope), receive, send)
+        elapsed = time.perf_counter() - started
+        print(
+            name,
+            f"{elapsed / ROUNDS * 1e6:.2f} us,",
+            f"{ROUNDS / elapsed:.0f} req/s",
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_verify())
@@ -8,3 +8,47 @@ SECRET_KEY = environ.get("SECRET_KEY", "test secret string for jwt")
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE = 300
 REFRESH_TOKEN_EXPIRE = 86400
+
+# last login timestamps are buffered and written to database in batches
+LAST_LOGIN_FLUSH_INTERVAL = float(environ.get("LAST_LOGIN_FLUSH_INTERVAL", 5))
+LAST_LOGIN_BUFFER_SIZE = int(environ.get("LAST_LOGIN_BUFFER_SIZE", 10000))
+# max number of users written by one statement of a flush
+LAST_LOGIN_FLUSH_CHUNK = int(environ.get("LAST_LOGIN_FLUSH_CHUNK", 500))
+
+# decoded access tokens are cached until expiry to authorize without decoding
+TOKEN_CACHE_SIZE = int(environ.get("TOKEN_CACHE_SIZE", 10000))
+
+# max number of tokens in one batch introspection request
+INTROSPECT_BATCH_SIZE = int(environ.get("INTROSPECT_BATCH_SIZE", 100))
+
+# revocation events stream, kept for the longest token lifetime
+REVOCATION_STREAM = environ.get("REVOCATION_STREAM", "revocations")
+REVOCATION_FEED_KEEPALIVE = float(environ.get("REVOCATION_FEED_KEEPALIVE", 15))
+REVOCATION_FEED_QUEUE_SIZE = int(
+    environ.get("REVOCATION_FEED_QUEUE_SIZE", 1000)
+)
+
+# max number of ids in one users batch lookup
+USERS_BATCH_SIZE = int(environ.get("USERS_BATCH_SIZE", 2000))
+
+# host wide table of verified tokens and revocation lookups shared by
+# worker processes through mmap of the file, empty - disabled,
+# e.g. /dev/shm/auth-fapi.cache
+SHARED_CACHE_PATH = environ.get("SHARED_CACHE_PATH", "")
+SHARED_CACHE_SLOTS = int(environ.get("SHARED_CACHE_SLOTS", 16384))
+# seconds a token id found not revoked is trusted without redis lookup
+REVOCATION_CACHE_TTL = float(environ.get("REVOCATION_CACHE_TTL", 1))
+
+# refresh tokens store backend: redis, memory (single process) or sql
+TOKEN_STORE = environ.get("TOKEN_STORE", "redis")
+# sql store: seconds between background purges of expired tokens and max
+# number of rows one purge statement deletes
+TOKEN_PURGE_INTERVAL = float(environ.get("TOKEN_PURGE_INTERVAL", 60))
+TOKEN_PURGE_BATCH_SIZE = int(environ.get("TOKEN_PURGE_BATCH_SIZE", 1000))
+
+# login when refresh tokens store is unavailable: fail - respond 503,
+# degrade - issue access token only
+LOGIN_TOKEN_STORE_POLICY = environ.get("LOGIN_TOKEN_STORE_POLICY", "fail")
+
+# threads running password hashing off the event loop
+PASSWORD_HASH_WORKERS = int(environ.get("PASSWORD_HASH_WORKERS", 4))
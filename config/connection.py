@@ -20,3 +20,44 @@ DATABASE_URL = (
 
 
 REDIS_URL = environ.get("REDIS_URL")
+# standalone - REDIS_URL server, cluster - REDIS_URL is one of cluster
+# nodes, sentinel - master of REDIS_SENTINEL_SERVICE is discovered with
+# comma separated host:port REDIS_SENTINELS, REDIS_URL gives password
+# and database
+REDIS_MODE = environ.get("REDIS_MODE", "standalone")
+REDIS_SENTINELS = environ.get("REDIS_SENTINELS", "")
+REDIS_SENTINEL_SERVICE = environ.get("REDIS_SENTINEL_SERVICE", "mymaster")
+# refresh tokens stored before user hash tags are still read, may be
+# switched off once REFRESH_TOKEN_EXPIRE seconds passed since upgrade,
+# never read in cluster mode
+REDIS_LEGACY_KEYS = environ.get("REDIS_LEGACY_KEYS", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# seconds to connect and to wait for any reply on redis socket, longer
+# than revocation feed blocking read, requests are bounded by deadline
+REDIS_CONNECT_TIMEOUT = float(environ.get("REDIS_CONNECT_TIMEOUT", 2))
+REDIS_SOCKET_TIMEOUT = float(environ.get("REDIS_SOCKET_TIMEOUT", 30))
+
+# size of SQLAlchemy compiled statements cache,
+# asyncpg prepared statements cache of each connection is sized to match
+DATABASE_STATEMENT_CACHE_SIZE = int(
+    environ.get("DATABASE_STATEMENT_CACHE_SIZE", 500)
+)
+
+# statements running longer than threshold seconds are logged with
+# parameter types, a share of them get EXPLAIN plan captured
+SLOW_QUERY_THRESHOLD = float(environ.get("SLOW_QUERY_THRESHOLD", 0.1))
+SLOW_QUERY_EXPLAIN_RATE = float(environ.get("SLOW_QUERY_EXPLAIN_RATE", 0.1))
+# max number of distinct statements with aggregated stats
+QUERY_STATS_SIZE = int(environ.get("QUERY_STATS_SIZE", 1000))
+
+# calls to redis and database fail after timeout seconds, circuit opens
+# after that many consecutive failures and rejects calls for reset seconds
+REDIS_TIMEOUT = float(environ.get("REDIS_TIMEOUT", 2))
+REDIS_BREAKER_FAILURES = int(environ.get("REDIS_BREAKER_FAILURES", 5))
+REDIS_BREAKER_RESET = float(environ.get("REDIS_BREAKER_RESET", 10))
+DATABASE_TIMEOUT = float(environ.get("DATABASE_TIMEOUT", 5))
+DATABASE_BREAKER_FAILURES = int(environ.get("DATABASE_BREAKER_FAILURES", 5))
+DATABASE_BREAKER_RESET = float(environ.get("DATABASE_BREAKER_RESET", 10))
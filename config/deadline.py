@@ -0,0 +1,20 @@
+"""
+Request deadlines configuration.
+"""
+from os import environ
+
+# seconds a request may take unless its route has own budget, 0 - unbounded
+REQUEST_DEADLINE = float(environ.get("REQUEST_DEADLINE", 10))
+# comma separated route_name=seconds budgets, 0 - unbounded
+REQUEST_DEADLINE_ROUTES = environ.get(
+    "REQUEST_DEADLINE_ROUTES", "revocations:feed=0,debug:profile=0"
+)
+# request header with seconds client waits for response, replaces budget
+REQUEST_DEADLINE_HEADER = environ.get(
+    "REQUEST_DEADLINE_HEADER", "x-request-timeout"
+)
+# max seconds client may ask for with deadline header
+REQUEST_DEADLINE_MAX = float(environ.get("REQUEST_DEADLINE_MAX", 60))
+# seconds statement timeout set for a deadline is reused for next
+# statements, they may run this much past the deadline
+STATEMENT_TIMEOUT_SLACK = float(environ.get("STATEMENT_TIMEOUT_SLACK", 0.05))
@@ -0,0 +1,11 @@
+"""
+Debug endpoints configuration file.
+"""
+from os import environ
+
+# longest allowed profile and seconds between stack samples
+PROFILE_MAX_SECONDS = float(environ.get("PROFILE_MAX_SECONDS", 60))
+PROFILE_SAMPLE_INTERVAL = float(environ.get("PROFILE_SAMPLE_INTERVAL", 0.01))
+
+# stack frames stored for every traced allocation by default
+MEMORY_TRACE_FRAMES = int(environ.get("MEMORY_TRACE_FRAMES", 10))
@@ -0,0 +1,9 @@
+"""
+Health checks configuration.
+"""
+from os import environ
+
+# seconds between background probes of dependencies
+HEALTH_PROBE_INTERVAL = float(environ.get("HEALTH_PROBE_INTERVAL", 5))
+# seconds to wait for dependency probe response
+HEALTH_PROBE_TIMEOUT = float(environ.get("HEALTH_PROBE_TIMEOUT", 1))
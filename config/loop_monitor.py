@@ -0,0 +1,11 @@
+"""
+Event loop lag monitor configuration.
+"""
+from os import environ
+
+# seconds between heartbeats measuring event loop scheduling delay
+LOOP_LAG_INTERVAL = float(environ.get("LOOP_LAG_INTERVAL", 0.5))
+# seconds of lag after which stack of blocked event loop is logged
+LOOP_LAG_THRESHOLD = float(environ.get("LOOP_LAG_THRESHOLD", 0.1))
+# innermost stack frames logged for blocked event loop
+LOOP_LAG_STACK_LIMIT = int(environ.get("LOOP_LAG_STACK_LIMIT", 30))
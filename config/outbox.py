@@ -0,0 +1,15 @@
+"""
+User change events outbox configuration file.
+"""
+from os import environ
+
+# redis stream events are relayed to and its approximate max length
+OUTBOX_STREAM = environ.get("OUTBOX_STREAM", "user-events")
+OUTBOX_STREAM_MAXLEN = int(environ.get("OUTBOX_STREAM_MAXLEN", 100000))
+
+# seconds between relay runs when outbox is drained
+OUTBOX_RELAY_INTERVAL = float(environ.get("OUTBOX_RELAY_INTERVAL", 1))
+OUTBOX_RELAY_BATCH_SIZE = int(environ.get("OUTBOX_RELAY_BATCH_SIZE", 500))
+
+# seconds published events are kept for replay
+OUTBOX_RETENTION = int(environ.get("OUTBOX_RETENTION", 7 * 86400))
@@ -0,0 +1,24 @@
+"""
+Production server configuration.
+"""
+import os
+from os import environ
+
+SERVER_HOST = environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(environ.get("SERVER_PORT", 8000))
+# number of worker processes, defaults to number of cores
+SERVER_WORKERS = int(environ.get("SERVER_WORKERS", os.cpu_count() or 1))
+# bind socket in every worker with SO_REUSEPORT when supported,
+# otherwise workers share socket of supervisor, which keeps queued
+# connections while workers are recycled
+SERVER_REUSE_PORT = environ.get("SERVER_REUSE_PORT", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# recycle worker after serving that many requests, 0 - never
+SERVER_MAX_REQUESTS = int(environ.get("SERVER_MAX_REQUESTS", 0))
+# random extra requests, so workers are not recycled at the same time
+SERVER_MAX_REQUESTS_JITTER = int(environ.get("SERVER_MAX_REQUESTS_JITTER", 0))
+# seconds for workers to finish in-flight requests on reload or shutdown
+SERVER_GRACEFUL_TIMEOUT = int(environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
@@ -0,0 +1,22 @@
+"""
+Request tracing configuration file.
+"""
+from os import environ
+
+# spans are exported as OTLP JSON lines to a file or posted to OTLP/HTTP
+# collector url, e.g. http://localhost:4318/v1/traces, tracing is off
+# when neither is set
+TRACE_EXPORT_FILE = environ.get("TRACE_EXPORT_FILE", "")
+TRACE_EXPORT_URL = environ.get("TRACE_EXPORT_URL", "")
+TRACE_EXPORT_TIMEOUT = float(environ.get("TRACE_EXPORT_TIMEOUT", 5))
+TRACE_SERVICE_NAME = environ.get("TRACE_SERVICE_NAME", "auth-fapi")
+
+# share of traces started here which are recorded, incoming traceparent
+# sampled flag is followed
+TRACE_SAMPLE_RATIO = float(environ.get("TRACE_SAMPLE_RATIO", 1))
+
+# spans are exported in batches every interval seconds or when a batch
+# is full, spans finished while queue is full are dropped
+TRACE_EXPORT_BATCH_SIZE = int(environ.get("TRACE_EXPORT_BATCH_SIZE", 512))
+TRACE_EXPORT_INTERVAL = float(environ.get("TRACE_EXPORT_INTERVAL", 5))
+TRACE_QUEUE_SIZE = int(environ.get("TRACE_QUEUE_SIZE", 2048))
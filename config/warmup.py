@@ -0,0 +1,12 @@
+"""
+Startup warm-up configuration.
+"""
+from os import environ
+
+WARMUP_ENABLED = environ.get("WARMUP_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+WARMUP_DB_CONNECTIONS = int(environ.get("WARMUP_DB_CONNECTIONS", 5))
+WARMUP_REDIS_CONNECTIONS = int(environ.get("WARMUP_REDIS_CONNECTIONS", 5))
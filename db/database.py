@@ -1,11 +1,271 @@
 """
 Main database module.
+
+Database calls of request handlers go through ``database_breaker`` with
+``DATABASE_TIMEOUT`` deadline. PostgreSQL and MySQL statements of a
+request with deadline run with server side timeout of what is left of
+it, so the database stops working on abandoned queries too. MariaDB
+takes the timeout in seconds.
 """
+import math
+import time
+from typing import Any
+
 from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
-from config.connection import DATABASE_URL
+from config.connection import (
+    DATABASE_BREAKER_FAILURES,
+    DATABASE_BREAKER_RESET,
+    DATABASE_STATEMENT_CACHE_SIZE,
+    DATABASE_TIMEOUT,
+    DATABASE_URL,
+)
+from config.deadline import STATEMENT_TIMEOUT_SLACK
+from db.query_stats import query_end, query_error, query_start
+from repositories.users import SQLUserRepository
+from utils.circuit import CircuitBreaker
+from utils.deadline import deadline_var
+from utils.metrics import Counter, Gauge
+from utils.tracing import KIND_CLIENT, start_span
+
+statement_cache_hits = Counter(
+    "sql_compiled_cache_hits_total",
+    "SQL statements executed using cached compiled form",
+)
+statement_cache_misses = Counter(
+    "sql_compiled_cache_misses_total",
+    "SQL statements compiled because compiled form was not cached",
+)
+identity_map_size = Gauge(
+    "sqlalchemy_session_identity_map_size",
+    "objects in identity map of the shared ORM session",
+)
+database_breaker = CircuitBreaker(
+    "database",
+    DATABASE_TIMEOUT,
+    DATABASE_BREAKER_FAILURES,
+    DATABASE_BREAKER_RESET,
+    failures=(OperationalError, InterfaceError, PoolTimeoutError, OSError),
+)
+
+
+def engine_options(url: str) -> dict:
+    """Get create engine options for database url.
+
+    Args:
+        url: database connection url
+
+    Returns:
+        dict of options for create_async_engine
+    """
+    options: dict = {"query_cache_size": DATABASE_STATEMENT_CACHE_SIZE}
+    if make_url(url).get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": DATABASE_STATEMENT_CACHE_SIZE
+        }
+    return options
+
+
+def count_statement_cache(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    """Count compiled statements cache hits and misses.
+
+    Args:
+        conn: connection
+        cursor: DBAPI cursor
+        statement: executed statement
+        parameters: statement parameters
+        context: execution context
+        executemany: whether executemany was used
+
+    Returns:
+        None
+    """
+    cache_hit = getattr(context, "cache_hit", None)
+    if cache_hit is CACHE_HIT:
+        statement_cache_hits.inc()
+    elif cache_hit is CACHE_MISS:
+        statement_cache_misses.inc()
+
+
+def trace_statement_start(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    """Start span of statement executed in a sampled trace.
+
+    Args:
+        conn: connection
+        cursor: DBAPI cursor
+        statement: executed statement
+        parameters: statement parameters
+        context: execution context
+        executemany: whether executemany was used
+
+    Returns:
+        None
+    """
+    context._trace_span = start_span(
+        statement.split(None, 1)[0].upper() if statement else "SQL",
+        KIND_CLIENT,
+        {"db.system": conn.dialect.name, "db.statement": statement},
+    )
+
+
+def trace_statement_end(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    """Finish span of executed statement.
+
+    Args:
+        conn: connection
+        cursor: DBAPI cursor
+        statement: executed statement
+        parameters: statement parameters
+        context: execution context
+        executemany: whether executemany was used
+
+    Returns:
+        None
+    """
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.finish()
+
+
+def trace_statement_error(exception_context: Any) -> None:
+    """Finish span of failed statement.
+
+    Args:
+        exception_context: statement error context
+
+    Returns:
+        None
+    """
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        span.finish(exception_context.original_exception)
+
+
+# session settings limiting statement time, ms or seconds are formatted in
+STATEMENT_TIMEOUT_SETTINGS = {
+    "postgresql": (
+        "SET statement_timeout = {ms}",
+        "SET statement_timeout TO DEFAULT",
+    ),
+    "mysql": (
+        "SET SESSION max_execution_time = {ms}",
+        "SET SESSION max_execution_time = DEFAULT",
+    ),
+    "mariadb": (
+        "SET SESSION max_statement_time = {seconds:.3f}",
+        "SET SESSION max_statement_time = DEFAULT",
+    ),
+}
+
+
+def apply_statement_timeout(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    """Limit statement time to what is left of request deadline.
+
+    Timeout is what is left of the deadline when a statement starts, it
+    is kept for next statements of the deadline for at most
+    ``STATEMENT_TIMEOUT_SLACK`` seconds and is set back to server
+    default for statements without deadline.
+
+    Args:
+        conn: connection
+        cursor: DBAPI cursor
+        statement: executed statement
+        parameters: statement parameters
+        context: execution context
+        executemany: whether executemany was used
+
+    Returns:
+        None
+    """
+    settings = STATEMENT_TIMEOUT_SETTINGS.get(conn.dialect.name)
+    if settings is None:
+        return
+    deadline = deadline_var.get()
+    now = time.monotonic()
+    if conn.info.get("statement_deadline") == deadline:
+        set_at = conn.info.get("statement_timeout_set", now)
+        if deadline is None or now - set_at <= STATEMENT_TIMEOUT_SLACK:
+            return
+    if deadline is None:
+        cursor.execute(settings[1])
+    else:
+        timeout = max(math.ceil((deadline - now) * 1000), 1)
+        cursor.execute(settings[0].format(ms=timeout, seconds=timeout / 1000))
+    conn.info["statement_deadline"] = deadline
+    conn.info["statement_timeout_set"] = now
+
+
+def forget_statement_timeout(conn: Any) -> None:
+    """Forget statement timeout of connection reverted by rollback.
+
+    Args:
+        conn: connection
+
+    Returns:
+        None
+    """
+    conn.info.pop("statement_deadline", None)
+    conn.info.pop("statement_timeout_set", None)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Add statistics, query stats, tracing and statement timeout listeners.
+
+    Args:
+        engine: sync engine
+
+    Returns:
+        None
+    """
+    listeners = (
+        ("after_cursor_execute", count_statement_cache),
+        ("before_cursor_execute", query_start),
+        ("after_cursor_execute", query_end),
+        ("handle_error", query_error),
+        ("before_cursor_execute", trace_statement_start),
+        ("after_cursor_execute", trace_statement_end),
+        ("handle_error", trace_statement_error),
+        ("before_cursor_execute", apply_statement_timeout),
+        ("rollback", forget_statement_timeout),
+    )
+    for name, listener in listeners:
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
 
 
 async def app_init_db(app: FastAPI) -> None:
@@ -18,13 +278,20 @@ async def app_init_db(app: FastAPI) -> None:
         None
     """
     engine = create_async_engine(
-        url=DATABASE_URL, echo=False, pool_size=50, pool_pre_ping=True
+        url=DATABASE_URL,
+        echo=False,
+        pool_size=50,
+        pool_pre_ping=True,
+        **engine_options(DATABASE_URL),
     )
+    instrument_engine(engine.sync_engine)
     async_session = sessionmaker(
         engine, expire_on_commit=False, autoflush=False, class_=AsyncSession
     )
     session = async_session(bind=engine)
+    identity_map_size.set_function(lambda: len(session.identity_map))
     app.state.db = session
+    app.state.users = SQLUserRepository(engine, breaker=database_breaker)
 
 
 async def app_dispose_db(app: FastAPI) -> None:
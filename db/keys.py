@@ -0,0 +1,86 @@
+"""
+Redis keys layout module.
+
+Keys of a user share ``{user:<id>}`` hash tag, so in cluster mode they
+are stored in one hash slot and multi-key commands and pipelines of a
+user's keys are served by one node.
+
+Refresh tokens stored before hash tags are still looked up outside
+cluster mode while ``REDIS_LEGACY_KEYS`` is on, so tokens issued before
+upgrade stay active until they expire.
+
+Methods:
+    user_tag: hash tag of user keys
+    refresh_key: key of active refresh token
+    revoked_key: key of revoked token id
+    disabled_key: key of user with all tokens revoked
+    legacy_refresh_key: key of refresh token stored before hash tags
+"""
+import hashlib
+from typing import Any, Mapping, Optional
+
+
+def user_tag(user_id: Any) -> str:
+    """Get hash tag of user keys.
+
+    Args:
+        user_id: user id
+
+    Returns:
+        hash tag
+    """
+    return f"{{user:{user_id}}}"
+
+
+def refresh_key(claims: Mapping[str, Any], token: str) -> str:
+    """Get key of active refresh token.
+
+    Args:
+        claims: token claims
+        token: encoded token, identifies token without id claims
+
+    Returns:
+        redis key
+    """
+    if claims.get("id") is None or not claims.get("jti"):
+        return f"refresh:{hashlib.sha256(token.encode()).hexdigest()}"
+    return f"refresh:{user_tag(claims['id'])}:{claims['jti']}"
+
+
+def revoked_key(jti: str, user_id: Optional[Any] = None) -> str:
+    """Get key of revoked token id.
+
+    Args:
+        jti: token id
+        user_id: token user id, None - token of no user
+
+    Returns:
+        redis key
+    """
+    if user_id is None:
+        return f"revoked:{jti}"
+    return f"revoked:{user_tag(user_id)}:{jti}"
+
+
+def disabled_key(user_id: Any) -> str:
+    """Get key of user with all tokens revoked.
+
+    Args:
+        user_id: user id
+
+    Returns:
+        redis key
+    """
+    return f"revoked:{user_tag(user_id)}"
+
+
+def legacy_refresh_key(token: str) -> str:
+    """Get key of refresh token stored before hash tags.
+
+    Args:
+        token: encoded token
+
+    Returns:
+        redis key, the token itself
+    """
+    return token
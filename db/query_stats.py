@@ -0,0 +1,359 @@
+"""Query statistics module.
+
+Engine event listeners time every executed statement and aggregate
+stats per statement text, with lists of placeholders collapsed, so an
+expanding ``IN`` of any length counts as one statement. Statements
+slower than the threshold are logged with shapes of bound parameters,
+their values are never logged. A sampled share of slow statements get
+their plan captured with ``EXPLAIN`` on PostgreSQL and SQLite.
+
+Attributes:
+    QueryStats: per statement aggregated stats
+    query_stats: application query stats
+
+Methods:
+    parameter_shape: describe parameters without values
+    normalize_statement: collapse lists of placeholders
+    explainable: check statement plan can be captured
+    query_start: before cursor execute listener
+    query_end: after cursor execute listener
+    query_error: error listener
+"""
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config.connection import (
+    QUERY_STATS_SIZE,
+    SLOW_QUERY_EXPLAIN_RATE,
+    SLOW_QUERY_THRESHOLD,
+)
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+slow_queries = Counter(
+    "sql_slow_queries_total", "SQL statements slower than threshold"
+)
+
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+EXPLAINED_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+_placeholder = r"\s*(?:\?|%s|\$\d+|:\w+|%\(\w+\)s)\s*"
+placeholder_list = re.compile(rf"\({_placeholder}(?:,{_placeholder})+\)")
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse lists of placeholders of statement.
+
+    Args:
+        statement: statement text
+
+    Returns:
+        statement text with ``(...)`` in place of placeholder lists
+    """
+    return placeholder_list.sub("(...)", statement)
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> Any:
+    """Describe bound parameters by types without values.
+
+    Args:
+        parameters: DBAPI parameters of statement
+        executemany: parameters are a sequence of parameter sets
+
+    Returns:
+        type names in parameters structure
+    """
+    if executemany:
+        sets = list(parameters or [])
+        shape = parameter_shape(sets[0]) if sets else None
+        return {"sets": len(sets), "shape": shape}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class StatementStats:
+    """Aggregated stats of a statement."""
+
+    __slots__ = (
+        "statement",
+        "calls",
+        "errors",
+        "slow",
+        "total_time",
+        "max_time",
+        "plan",
+        "plan_time",
+    )
+
+    def __init__(self, statement: str) -> None:
+        """Create empty stats.
+
+        Args:
+            statement: SQL statement text
+        """
+        self.statement = statement
+        self.calls = 0
+        self.errors = 0
+        self.slow = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.plan: Optional[List[str]] = None
+        self.plan_time: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Convert stats to dict.
+
+        Returns:
+            stats with times in milliseconds
+        """
+        return {
+            "statement": self.statement,
+            "calls": self.calls,
+            "errors": self.errors,
+            "slow": self.slow,
+            "total_ms": self.total_time * 1000,
+            "mean_ms": self.total_time * 1000 / self.calls
+            if self.calls
+            else 0.0,
+            "max_ms": self.max_time * 1000,
+            "plan": self.plan,
+            "plan_captured": self.plan_time,
+        }
+
+
+class QueryStats:
+    """Per statement aggregated stats."""
+
+    def __init__(
+        self, size: int, threshold: float, explain_rate: float
+    ) -> None:
+        """Create empty stats.
+
+        Args:
+            size: max number of tracked statements, others are counted
+                as one ``<other>`` statement
+            threshold: seconds a statement is logged as slow after
+            explain_rate: share of slow statements getting plan captured
+        """
+        self.size = size
+        self.threshold = threshold
+        self.explain_rate = explain_rate
+        self._stats: Dict[str, StatementStats] = {}
+        # listeners of sync engines may run in threads
+        self._lock = threading.Lock()
+
+    def _get(self, statement: str) -> StatementStats:
+        key = normalize_statement(statement)
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self.size:
+                key = "<other>"
+                stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StatementStats(key)
+        return stats
+
+    def record(
+        self, statement: str, elapsed: float, error: bool = False
+    ) -> StatementStats:
+        """Add statement execution.
+
+        Args:
+            statement: statement text
+            elapsed: execution seconds
+            error: whether execution failed
+
+        Returns:
+            stats of statement
+        """
+        with self._lock:
+            stats = self._get(statement)
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            if error:
+                stats.errors += 1
+            if elapsed >= self.threshold:
+                stats.slow += 1
+        return stats
+
+    def top(self, limit: int, order: str = "total_ms") -> List[dict]:
+        """Get stats of statements with the highest value.
+
+        Args:
+            limit: max number of statements
+            order: stats field to order by
+
+        Returns:
+            list of statements stats
+        """
+        with self._lock:
+            stats = [stats.as_dict() for stats in self._stats.values()]
+        stats.sort(key=lambda item: item[order], reverse=True)
+        return stats[:limit]
+
+    def reset(self) -> None:
+        """Remove all stats.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._stats.clear()
+
+
+query_stats = QueryStats(
+    QUERY_STATS_SIZE, SLOW_QUERY_THRESHOLD, SLOW_QUERY_EXPLAIN_RATE
+)
+
+
+def explainable(dialect: str, statement: str) -> bool:
+    """Check statement plan can be captured.
+
+    Args:
+        dialect: database dialect name
+        statement: statement text
+
+    Returns:
+        True - dialect and statement support EXPLAIN
+    """
+    if dialect not in EXPLAIN_PREFIXES:
+        return False
+    return statement.lstrip().upper().startswith(EXPLAINED_STATEMENTS)
+
+
+def explain(conn: Any, statement: str, parameters: Any) -> List[str]:
+    """Capture statement plan with a raw DBAPI cursor.
+
+    The plan is read without executing the statement and without
+    firing engine events again.
+
+    Args:
+        conn: connection statement was executed with
+        statement: statement text
+        parameters: DBAPI parameters of statement
+
+    Returns:
+        plan lines
+    """
+    prefix = EXPLAIN_PREFIXES[conn.dialect.name]
+    # failed statement aborts PostgreSQL transaction of the request,
+    # so EXPLAIN runs in a savepoint there
+    guarded = conn.dialect.name == "postgresql"
+    cursor = conn.connection.cursor()
+    try:
+        if guarded:
+            cursor.execute("SAVEPOINT query_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if guarded:
+                cursor.execute("ROLLBACK TO SAVEPOINT query_explain")
+            raise
+        if guarded:
+            cursor.execute("RELEASE SAVEPOINT query_explain")
+    finally:
+        cursor.close()
+    return [" ".join(str(column) for column in row) for row in rows]
+
+
+def query_start(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    """Remember statement start time.
+
+    Args:
+        conn: connection
+        cursor: DBAPI cursor
+        statement: executed statement
+        parameters: statement parameters
+        context: execution context
+        executemany: whether executemany was used
+
+    Returns:
+        None
+    """
+    context._query_start = time.perf_counter()
+
+
+def query_end(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    """Record executed statement, log and explain slow one.
+
+    Args:
+        conn: connection
+        cursor: DBAPI cursor
+        statement: executed statement
+        parameters: statement parameters
+        context: execution context
+        executemany: whether executemany was used
+
+    Returns:
+        None
+    """
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats = query_stats.record(statement, elapsed)
+    if elapsed < query_stats.threshold:
+        return
+    slow_queries.inc()
+    logger.warning(
+        "slow query %.1fms: %s parameters: %s",
+        elapsed * 1000,
+        statement,
+        parameter_shape(parameters, executemany),
+    )
+    if executemany or not explainable(conn.dialect.name, statement):
+        return
+    if random.random() >= query_stats.explain_rate:
+        return
+    try:
+        stats.plan = explain(conn, statement, parameters)
+        stats.plan_time = time.time()
+    except Exception:
+        logger.warning("slow query explain failed", exc_info=True)
+
+
+def query_error(exception_context: Any) -> None:
+    """Record failed statement.
+
+    Args:
+        exception_context: statement error context
+
+    Returns:
+        None
+    """
+    context = exception_context.execution_context
+    start = getattr(context, "_query_start", None)
+    if start is None or exception_context.statement is None:
+        return
+    query_stats.record(
+        exception_context.statement,
+        time.perf_counter() - start,
+        error=True,
+    )
@@ -1,13 +1,157 @@
 """
 Redis module.
+
+Standalone server, cluster or master discovered by sentinels is used
+depending on ``REDIS_MODE``. Request path commands are called through
+``redis_breaker`` with ``REDIS_TIMEOUT`` deadline, shortened to what is
+left of request deadline.
 """
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
 
 from fastapi import FastAPI
 import redis.asyncio as redis
 from redis.asyncio.client import Redis
+from redis.asyncio.connection import parse_url
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from config.connection import (
+    REDIS_BREAKER_FAILURES,
+    REDIS_BREAKER_RESET,
+    REDIS_CONNECT_TIMEOUT,
+    REDIS_LEGACY_KEYS,
+    REDIS_MODE,
+    REDIS_SENTINEL_SERVICE,
+    REDIS_SENTINELS,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_TIMEOUT,
+    REDIS_URL,
+)
+from utils.circuit import CircuitBreaker
+from utils.metrics import Gauge
+from utils.tracing import KIND_CLIENT, start_span
+
+pool_in_use = Gauge(
+    "redis_pool_connections_in_use", "redis connections taken from pool"
+)
+pool_available = Gauge(
+    "redis_pool_connections_available", "idle redis connections in pool"
+)
+redis_breaker = CircuitBreaker(
+    "redis",
+    REDIS_TIMEOUT,
+    REDIS_BREAKER_FAILURES,
+    REDIS_BREAKER_RESET,
+    failures=(RedisConnectionError, RedisTimeoutError, OSError),
+)
+
+
+def pool_connections(redis_pool: Redis, kind: str) -> int:
+    """Count connections of redis connection pool.
+
+    Args:
+        redis_pool: redis connection pool object
+        kind: pool attribute holding connections of a kind
+
+    Returns:
+        number of connections
+    """
+    pool = getattr(redis_pool, "connection_pool", None)
+    return len(getattr(pool, kind, ()))
+
+
+def is_cluster(redis_pool: Redis) -> bool:
+    """Check redis client is cluster client.
+
+    Args:
+        redis_pool: redis client
+
+    Returns:
+        True - cluster client, False - otherwise
+    """
+    return isinstance(redis_pool, redis.RedisCluster)
+
+
+def reads_legacy_keys(redis_pool: Redis) -> bool:
+    """Check keys stored before hash tags are looked up.
+
+    Cluster never held them and they would cross key slots there.
+
+    Args:
+        redis_pool: redis client
+
+    Returns:
+        True - legacy keys are looked up, False - otherwise
+    """
+    return REDIS_LEGACY_KEYS and not is_cluster(redis_pool)
+
+
+def parse_sentinels(sentinels: str) -> List[Tuple[str, int]]:
+    """Parse sentinels addresses.
 
-from config.connection import REDIS_URL
+    Args:
+        sentinels: comma separated host:port addresses
+
+    Returns:
+        host and port pairs
+    """
+    addresses = []
+    for address in sentinels.split(","):
+        host, _, port = address.strip().rpartition(":")
+        if host:
+            addresses.append((host, int(port)))
+    return addresses
+
+
+def create_redis(mode: str, url: Optional[str]) -> Redis:
+    """Create redis client of mode.
+
+    Args:
+        mode: standalone, cluster or sentinel
+        url: redis url, startup node url of cluster
+
+    Returns:
+        redis client
+
+    Raises:
+        ValueError: unknown mode
+    """
+    timeouts = {
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+    }
+    if mode == "standalone":
+        return redis.from_url(url, **timeouts)
+    if mode == "cluster":
+        return redis.RedisCluster.from_url(url, **timeouts)
+    if mode == "sentinel":
+        options = parse_url(url) if url else {}
+        options.pop("host", None)
+        options.pop("port", None)
+        addresses = parse_sentinels(REDIS_SENTINELS)
+        sentinel = redis.Sentinel(addresses, **timeouts)
+        return sentinel.master_for(REDIS_SENTINEL_SERVICE, **options)
+    raise ValueError(f"Unknown redis mode {mode!r}")
+
+
+@asynccontextmanager
+async def redis_connection(redis_pool: Redis) -> AsyncIterator[Redis]:
+    """Take dedicated connection of redis client.
+
+    Cluster client routes every command to node of key slot itself.
+
+    Args:
+        redis_pool: redis client
+
+    Returns:
+        connection client
+    """
+    if is_cluster(redis_pool):
+        yield redis_pool
+        return
+    async with redis_pool.client() as conn:
+        yield conn
 
 
 async def app_init_redis(app: FastAPI) -> None:
@@ -19,7 +163,13 @@ async def app_init_redis(app: FastAPI) -> None:
     Returns:
         None
     """
-    app.state.redis = redis.from_url(REDIS_URL)
+    app.state.redis = create_redis(REDIS_MODE, REDIS_URL)
+    pool_in_use.set_function(
+        lambda: pool_connections(app.state.redis, "_in_use_connections")
+    )
+    pool_available.set_function(
+        lambda: pool_connections(app.state.redis, "_available_connections")
+    )
 
 
 async def app_dispose_redis(app: FastAPI) -> None:
@@ -43,10 +193,17 @@ async def get_redis_key(redis: Redis, key: str) -> Optional[str]:
 
     Returns:
         value if found, None - otherwise
+
+    Raises:
+        DependencyUnavailable: redis failed, timed out or circuit is open
     """
-    async with redis.client() as conn:
-        val = await conn.get(key)
-    return val
+
+    async def get() -> Optional[str]:
+        async with redis_connection(redis) as conn:
+            return await conn.get(key)
+
+    with start_span("redis GET", KIND_CLIENT, {"db.system": "redis"}):
+        return await redis_breaker.call(get)
 
 
 async def set_redis_key(
@@ -62,10 +219,16 @@ async def set_redis_key(
 
     Returns:
         True - success, False - otherwise
+
+    Raises:
+        DependencyUnavailable: redis failed, timed out or circuit is open
     """
-    async with redis.client() as conn:
-        if expire is None:
-            res = await conn.set(key, value)
-        else:
-            res = await conn.set(key, value, ex=expire)
-    return res
+
+    async def set_() -> bool:
+        async with redis_connection(redis) as conn:
+            if expire is None:
+                return await conn.set(key, value)
+            return await conn.set(key, value, ex=expire)
+
+    with start_span("redis SET", KIND_CLIENT, {"db.system": "redis"}):
+        return await redis_breaker.call(set_)
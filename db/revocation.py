@@ -0,0 +1,563 @@
+"""
+Tokens revocation module.
+
+Refresh token is active while it's stored by login, access token is
+active until its id or its user is stored as revoked. Keys of a user
+share hash tag, see ``db.keys``.
+
+Every revocation is also appended to a redis stream, which is kept for
+the longest token lifetime, so downstream token caches can follow it.
+
+Attributes:
+    RevocationFeed: fan-out of revocation stream to local subscribers
+    RedisRevocation: token ids and users revocation lookups in redis
+    SharedRevocation: token ids revocation lookups shared by processes
+    Subscription: subscriber events queue
+
+Methods:
+    revoke_token: revoke access token id
+    disable_user: revoke all tokens of user
+    revocation_keys: keys revoking token
+    tokens_active: check revocation of a batch of tokens
+    read_events: read revocation events after stream id
+    snapshot: compact revocations which are still in effect
+    app_init_revocation_feed: create revocation feed
+    app_dispose_revocation_feed: stop reading revocation stream
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from fastapi import FastAPI
+from redis.asyncio.client import Redis
+
+from config.auth import (
+    REFRESH_TOKEN_EXPIRE,
+    REVOCATION_CACHE_TTL,
+    REVOCATION_FEED_QUEUE_SIZE,
+    REVOCATION_STREAM,
+)
+from db.keys import (
+    disabled_key,
+    legacy_refresh_key,
+    refresh_key,
+    revoked_key,
+)
+from db.redis import is_cluster, reads_legacy_keys, redis_breaker
+from repositories.tokens import RedisTokenStore, TokenStore
+from utils.shared_cache import SharedTable
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Dict[str, str]]
+
+
+def stream_id(timestamp: float) -> str:
+    """Get the first stream id at given time.
+
+    Args:
+        timestamp: unix time
+
+    Returns:
+        stream id
+    """
+    return f"{int(timestamp * 1000)}-0"
+
+
+def parse_id(event_id: str) -> Tuple[int, int]:
+    """Parse stream id to comparable tuple.
+
+    Args:
+        event_id: stream id
+
+    Returns:
+        milliseconds and sequence number
+    """
+    milliseconds, _, sequence = event_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def decode_entry(entry: tuple) -> Event:
+    """Decode stream entry read with redis client.
+
+    Args:
+        entry: stream entry id and fields
+
+    Returns:
+        event id and fields
+    """
+    entry_id, fields = entry
+    return _text(entry_id), {
+        _text(key): _text(value) for key, value in fields.items()
+    }
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+async def _revoke(redis: Redis, key: str, expire: int, event: dict) -> bool:
+    """Store revoked key and append event to stream in one transaction.
+
+    Key and stream are in different hash slots of redis cluster, so
+    there they are written in one pipeline without transaction.
+    """
+    async with redis.pipeline(transaction=not is_cluster(redis)) as pipe:
+        pipe.set(key, "1", ex=max(expire, 1))
+        pipe.xadd(
+            REVOCATION_STREAM,
+            event,
+            minid=stream_id(time.time() - REFRESH_TOKEN_EXPIRE),
+            approximate=True,
+        )
+        result = await pipe.execute()
+    return bool(result[0])
+
+
+async def revoke_token(
+    redis: Redis, jti: str, expire: int, user_id: Optional[int] = None
+) -> bool:
+    """Store access token id as revoked until token expiry.
+
+    Args:
+        redis: redis connection pool object
+        jti: token id
+        expire: seconds until token expiry
+        user_id: token user id, None - token of no user
+
+    Returns:
+        True - success, False - otherwise
+    """
+    event = {"type": "token", "jti": jti, "exp": int(time.time()) + expire}
+    if user_id is not None:
+        event["user_id"] = user_id
+    return await _revoke(redis, revoked_key(jti, user_id), expire, event)
+
+
+async def disable_user(redis: Redis, user_id: int) -> bool:
+    """Revoke all issued tokens of user.
+
+    User stays revoked for the longest token lifetime.
+
+    Args:
+        redis: redis connection pool object
+        user_id: user id
+
+    Returns:
+        True - success, False - otherwise
+    """
+    event = {
+        "type": "user",
+        "user_id": user_id,
+        "exp": int(time.time()) + REFRESH_TOKEN_EXPIRE,
+    }
+    return await _revoke(
+        redis, disabled_key(user_id), REFRESH_TOKEN_EXPIRE, event
+    )
+
+
+async def tokens_active(
+    redis: Redis,
+    tokens: Sequence[str],
+    claims: Sequence[Optional[dict]],
+    store: Optional[TokenStore] = None,
+) -> List[bool]:
+    """Check revocation of decoded tokens with one pipelined round trip.
+
+    Refresh tokens are checked in the same pipeline when they are kept
+    in the same redis, otherwise the store is queried concurrently.
+
+    Args:
+        redis: redis connection pool object
+        tokens: encoded tokens
+        claims: decoded claims of every token, None - invalid token
+        store: refresh tokens store, None - refresh tokens are redis keys
+
+    Returns:
+        active flag of every token
+    """
+    if isinstance(store, RedisTokenStore) and store.redis is redis:
+        store = None
+    legacy = reads_legacy_keys(redis)
+    active = [False] * len(tokens)
+    checked: List[Tuple[int, bool, bool]] = []
+    refresh_tokens: List[str] = []
+    async with redis.pipeline(transaction=False) as pipe:
+        for index, token in enumerate(tokens):
+            token_claims = claims[index]
+            if token_claims is None:
+                continue
+            revoked = revocation_keys(
+                token_claims.get("jti"), token_claims.get("id")
+            )
+            refresh = token_claims.get("token_type") == "refresh_token"
+            if refresh and store is not None:
+                refresh_tokens.append(token)
+            elif refresh:
+                keys = [refresh_key(token_claims, token)]
+                if legacy:
+                    keys.append(legacy_refresh_key(token))
+                pipe.exists(*keys)
+            if revoked:
+                pipe.exists(*revoked)
+            checked.append((index, refresh, bool(revoked)))
+        replies, stored_flags = await asyncio.gather(
+            redis_breaker.call(pipe.execute) if len(pipe) else _empty(),
+            store.exists_many(refresh_tokens) if refresh_tokens else _empty(),
+        )
+    results = iter(replies)
+    stored_refresh = iter(stored_flags)
+    for index, refresh, has_revoked in checked:
+        stored = True
+        if refresh:
+            stored = next(results if store is None else stored_refresh)
+        revoked_count = next(results) if has_revoked else 0
+        active[index] = bool(stored) and not revoked_count
+    return active
+
+
+async def _empty() -> list:
+    return []
+
+
+def revocation_keys(jti: Optional[str], user_id: Optional[int]) -> List[str]:
+    """Get keys any of which revokes token.
+
+    Keys of a user token share hash slot, so they are looked up with
+    one multi-key command in cluster too.
+
+    Args:
+        jti: token id
+        user_id: token user id
+
+    Returns:
+        revoked token id and disabled user keys
+    """
+    keys = []
+    if jti:
+        keys.append(revoked_key(jti, user_id))
+    if user_id is not None:
+        keys.append(disabled_key(user_id))
+    return keys
+
+
+class RedisRevocation:
+    """Token ids and users revocation lookups in redis."""
+
+    def __init__(self, redis: Redis) -> None:
+        """Create revocation lookups.
+
+        Args:
+            redis: redis connection pool object
+        """
+        self.redis = redis
+
+    async def is_revoked(
+        self, jti: Optional[str], user_id: Optional[int] = None
+    ) -> bool:
+        """Check token id or its user is revoked.
+
+        Args:
+            jti: token id
+            user_id: token user id
+
+        Returns:
+            True - revoked, False - otherwise
+        """
+        keys = revocation_keys(jti, user_id)
+        if not keys:
+            return False
+        return bool(await redis_breaker.call(lambda: self.redis.exists(*keys)))
+
+
+class SharedRevocation:
+    """Token ids and users revocation lookups cached in shared table.
+
+    Revoked token is cached until its redis keys expire, not revoked
+    one for a short time, so every token id is looked up in redis about
+    once per host and cache time.
+    """
+
+    def __init__(self, redis: Redis, table: SharedTable, ttl: float) -> None:
+        """Create revocation lookups.
+
+        Args:
+            redis: redis connection pool object
+            table: shared table
+            ttl: seconds not revoked token id is cached
+        """
+        self.redis = redis
+        self.table = table
+        self.ttl = ttl
+
+    async def _ttls(self, keys: List[str]) -> List[int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.pttl(key)
+            return await pipe.execute()
+
+    async def is_revoked(
+        self, jti: Optional[str], user_id: Optional[int] = None
+    ) -> bool:
+        """Check token id or its user is revoked.
+
+        Args:
+            jti: token id
+            user_id: token user id
+
+        Returns:
+            True - revoked, False - otherwise
+        """
+        keys = revocation_keys(jti, user_id)
+        if not keys:
+            return False
+        cache_key = keys[0].encode()
+        cached = self.table.get(cache_key)
+        if cached is not None:
+            return cached == b"1"
+        ttls = await redis_breaker.call(lambda: self._ttls(keys))
+        # -2 - no key, -1 - key without expiry
+        alive = [ttl for ttl in ttls if ttl != -2]
+        expire = self.ttl
+        if alive and min(alive) > 0:
+            expire = max(alive) / 1000
+        self.table.set(
+            cache_key, b"1" if alive else b"0", time.time() + expire
+        )
+        return bool(alive)
+
+
+async def read_events(redis: Redis, after: str) -> List[Event]:
+    """Read revocation events after stream id.
+
+    Args:
+        redis: redis connection pool object
+        after: stream id
+
+    Returns:
+        events in stream order
+    """
+    entries = await redis.xrange(REVOCATION_STREAM, min=f"({after}")
+    return [decode_entry(entry) for entry in entries]
+
+
+async def snapshot(redis: Redis) -> Tuple[str, dict]:
+    """Read revocations which are still in effect.
+
+    Args:
+        redis: redis connection pool object
+
+    Returns:
+        last stream id and compacted revoked token ids and users
+        with their expiry
+    """
+    now = time.time()
+    entries = await redis.xrange(
+        REVOCATION_STREAM, min=stream_id(now - REFRESH_TOKEN_EXPIRE)
+    )
+    last_id = "0-0"
+    tokens: Dict[str, int] = {}
+    users: Dict[int, int] = {}
+    for entry in entries:
+        last_id, event = decode_entry(entry)
+        exp = int(event.get("exp", 0))
+        if exp <= now:
+            continue
+        if event.get("type") == "token":
+            tokens[event["jti"]] = exp
+        elif event.get("type") == "user":
+            users[int(event["user_id"])] = exp
+    return last_id, {
+        "tokens": [{"jti": jti, "exp": exp} for jti, exp in tokens.items()],
+        "users": [
+            {"user_id": user_id, "exp": exp} for user_id, exp in users.items()
+        ],
+    }
+
+
+def is_retained(event_id: str) -> bool:
+    """Check whether events after stream id are still kept in stream.
+
+    Args:
+        event_id: stream id
+
+    Returns:
+        True - events can be resumed, False - snapshot is required
+    """
+    try:
+        parsed = parse_id(event_id)
+    except ValueError:
+        return False
+    return parsed >= parse_id(stream_id(time.time() - REFRESH_TOKEN_EXPIRE))
+
+
+class Subscription:
+    """Revocation events queue of one subscriber."""
+
+    def __init__(self, size: int) -> None:
+        """Create subscription.
+
+        Args:
+            size: max number of queued events
+        """
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(size)
+        self.lagged = False
+
+
+class RevocationFeed:
+    """Fan-out of revocation stream to subscribers of this process.
+
+    One background task tails the stream while there are subscribers,
+    so the number of redis connections doesn't grow with subscribers.
+    A subscriber which doesn't keep up is dropped and has to resume.
+    """
+
+    def __init__(self, redis: Redis, queue_size: int, block: float) -> None:
+        """Create feed.
+
+        Args:
+            redis: redis connection pool object
+            queue_size: max number of queued events of a subscriber
+            block: seconds to wait for new events in one read
+        """
+        self.redis = redis
+        self.queue_size = queue_size
+        self.block = block
+        self.subscribers: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self) -> Subscription:
+        """Subscribe to new revocation events.
+
+        Events appended after subscribing are delivered, so events read
+        from stream afterwards overlap with delivered ones.
+
+        Returns:
+            subscription
+        """
+        async with self._lock:
+            if self._task is None or self._task.done():
+                entries = await self.redis.xrevrange(
+                    REVOCATION_STREAM, count=1
+                )
+                last_id = decode_entry(entries[0])[0] if entries else "0-0"
+                self._task = asyncio.get_running_loop().create_task(
+                    self.run(last_id)
+                )
+            subscription = Subscription(self.queue_size)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop delivering events to subscriber.
+
+        Stream is not read anymore when the last subscriber is gone.
+
+        Args:
+            subscription: subscription
+
+        Returns:
+            None
+        """
+        self.subscribers.discard(subscription)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, event: Event) -> None:
+        """Deliver event to all subscribers.
+
+        Args:
+            event: stream id and fields
+
+        Returns:
+            None
+        """
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.lagged = True
+                self.subscribers.discard(subscription)
+
+    async def run(self, last_id: str) -> None:
+        """Tail revocation stream while there are subscribers.
+
+        Args:
+            last_id: read events after this stream id
+
+        Returns:
+            None
+        """
+        while self.subscribers:
+            try:
+                response = await self.redis.xread(
+                    {REVOCATION_STREAM: last_id},
+                    count=self.queue_size,
+                    block=int(self.block * 1000),
+                )
+            except Exception:
+                logger.exception("revocation stream read failed")
+                await asyncio.sleep(1)
+                continue
+            for _, entries in response or ():
+                for entry in entries:
+                    event = decode_entry(entry)
+                    last_id = event[0]
+                    self.publish(event)
+
+    async def stop(self) -> None:
+        """Stop reading stream and drop all subscribers.
+
+        Returns:
+            None
+        """
+        for subscription in self.subscribers:
+            subscription.lagged = True
+        self.subscribers.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def app_init_revocation_feed(app: FastAPI) -> None:
+    """Create revocation feed, stream is read once subscribed.
+
+    Access tokens are checked for revocation of their id or user in
+    redis, lookups are cached for all processes of a host when shared
+    table is mapped.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    app.state.revocation_feed = RevocationFeed(
+        app.state.redis, queue_size=REVOCATION_FEED_QUEUE_SIZE, block=5
+    )
+    shared = getattr(app.state, "shared_cache", None)
+    if shared is not None:
+        app.state.revocation = SharedRevocation(
+            app.state.redis, shared, REVOCATION_CACHE_TTL
+        )
+    else:
+        app.state.revocation = RedisRevocation(app.state.redis)
+
+
+async def app_dispose_revocation_feed(app: FastAPI) -> None:
+    """Stop reading revocation stream.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    await app.state.revocation_feed.stop()
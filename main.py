@@ -4,9 +4,59 @@ Main start module.
 import uvicorn
 from fastapi import FastAPI
 
+from config.warmup import WARMUP_ENABLED
 from db.database import app_dispose_db, app_init_db
 from db.redis import app_dispose_redis, app_init_redis
-from views import healthcheck, items, login, users, welcome
+from db.revocation import (
+    app_dispose_revocation_feed,
+    app_init_revocation_feed,
+)
+from repositories.last_login import (
+    app_dispose_last_login,
+    app_init_last_login,
+)
+from repositories.outbox import app_dispose_outbox, app_init_outbox
+from repositories.tokens import (
+    app_dispose_token_store,
+    app_init_token_store,
+)
+from utils.circuit import (
+    DependencyUnavailable,
+    dependency_unavailable_handler,
+)
+from utils.deadline import (
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    deadline_exceeded_handler,
+)
+from utils.health import app_dispose_health, app_init_health
+from utils.loop_monitor import (
+    app_dispose_loop_monitor,
+    app_init_loop_monitor,
+)
+from utils.security import app_init_token_cache
+from utils.shared_cache import (
+    app_dispose_shared_cache,
+    app_init_shared_cache,
+)
+from utils.tracing import (
+    TracingMiddleware,
+    app_dispose_tracing,
+    app_init_tracing,
+)
+from utils.warmup import app_warmup
+from views import (
+    debug,
+    healthcheck,
+    introspect,
+    items,
+    login,
+    metrics,
+    revocations,
+    users,
+    verify,
+    welcome,
+)
 
 DESCRIPTION = """
 **API with HTTP Bearer authorization using JWT token**
@@ -23,7 +73,8 @@ openapi_tags = [
     {
         "name": "users",
         "description": (
-            "admin operations with users accounts: find, create, update, delete"
+            "admin operations with users accounts: "
+            "find, create, update, delete"
         ),
         "externalDocs": {
             "description": "Read more",
@@ -31,6 +82,10 @@ openapi_tags = [
         },
     },
     {"name": "status", "description": "application status check methods"},
+    {
+        "name": "debug",
+        "description": "admin tools for investigating worker performance",
+    },
 ]
 
 app = FastAPI(
@@ -53,22 +108,56 @@ app = FastAPI(
 @app.on_event("startup")
 async def startup_event() -> None:
     """Startup events function."""
+    app.state.ready = False
+    await app_init_tracing(app)
+    await app_init_loop_monitor(app)
     await app_init_db(app)
     await app_init_redis(app)
+    await app_init_token_store(app)
+    if WARMUP_ENABLED:
+        await app_warmup(app)
+    await app_init_health(app)
+    await app_init_last_login(app)
+    await app_init_shared_cache(app)
+    await app_init_token_cache(app)
+    await app_init_revocation_feed(app)
+    await app_init_outbox(app)
+    app.state.ready = True
 
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
     """Shutdown events function."""
+    await app_dispose_health(app)
+    await app_dispose_revocation_feed(app)
+    await app_dispose_outbox(app)
+    await app_dispose_last_login(app)
+    await app_dispose_token_store(app)
+    await app_dispose_shared_cache(app)
     await app_dispose_db(app)
     await app_dispose_redis(app)
+    await app_dispose_loop_monitor(app)
+    await app_dispose_tracing(app)
+
 
+# tracing wraps deadline middleware to record cancelled requests
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_exception_handler(
+    DependencyUnavailable, dependency_unavailable_handler
+)
+app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
 
 app.include_router(login.router, tags=["login"])
+app.include_router(verify.router)
+app.include_router(introspect.router, tags=["login"])
+app.include_router(revocations.router, tags=["login"])
 app.include_router(users.router, tags=["users"])
 app.include_router(items.router, tags=["items"])
 app.include_router(welcome.router)
 app.include_router(healthcheck.router, tags=["status"])
+app.include_router(metrics.router, tags=["status"])
+app.include_router(debug.router, tags=["debug"])
 
 if __name__ == "__main__":  # pragma: no cover
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -2,6 +2,8 @@
 SQLAlchemy models.
 """
 from db import Base
+from models.outbox import Outbox
+from models.tokens import RefreshToken
 from models.users import User
 
-__all__ = ["Base", "User"]
+__all__ = ["Base", "Outbox", "RefreshToken", "User"]
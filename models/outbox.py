@@ -0,0 +1,43 @@
+"""Outbox Models.
+
+Attributes:
+    Outbox: transactional outbox of change events SQLAlchemy schema.
+
+"""
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    String,
+    func,
+)
+
+from db import Base
+
+
+class Outbox(Base):
+    """Change event written in the same transaction as the change."""
+
+    id = Column(
+        "id",
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    topic = Column("topic", String(50), nullable=False)
+    key = Column("key", String(100), nullable=False)
+    event = Column("event", String(50), nullable=False)
+    payload = Column("payload", JSON, nullable=False)
+    created = Column(
+        "created", DateTime(timezone=True), server_default=func.now()
+    )
+    published = Column("published", DateTime(timezone=True), index=True)
+    # publication order, assigned in commit order by relay
+    position = Column(
+        "position",
+        BigInteger().with_variant(Integer, "sqlite"),
+        index=True,
+        unique=True,
+    )
@@ -0,0 +1,17 @@
+"""Token Models.
+
+Attributes:
+    RefreshToken: active refresh token SQLAlchemy schema.
+
+"""
+from sqlalchemy import BigInteger, Column, String
+
+from db import Base
+
+
+class RefreshToken(Base):
+    """Active refresh token stored by digest until its expiry."""
+
+    token = Column("token", String(64), primary_key=True)
+    # unix time, expired tokens are inactive until background purge
+    expires = Column("expires", BigInteger, nullable=False, index=True)
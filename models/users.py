@@ -24,3 +24,7 @@ class User(Base):
     )
     last_login = Column("last_login", DateTime(timezone=True))
     confirmed = Column("confirmed", Boolean, default=False)
+    # bumped by every update, identifies row state for ETag preconditions
+    version = Column(
+        "version", Integer, nullable=False, default=1, server_default="1"
+    )
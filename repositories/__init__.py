@@ -0,0 +1,16 @@
+"""
+Repositories package.
+"""
+from repositories.users import (
+    InMemoryUserRepository,
+    SQLUserRepository,
+    UserRecord,
+    UserRepository,
+)
+
+__all__ = [
+    "InMemoryUserRepository",
+    "SQLUserRepository",
+    "UserRecord",
+    "UserRepository",
+]
@@ -0,0 +1,178 @@
+"""Last login write-behind buffer module.
+
+Login records last login time in process memory and a background task
+writes buffered timestamps with a single bulk update, so login doesn't
+pay for a write and commit.
+
+Attributes:
+    LastLoginBuffer: bounded write-behind buffer of last login times
+
+Methods:
+    app_init_last_login: create buffer and start flushing
+    app_dispose_last_login: stop flushing and write buffered timestamps
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from fastapi import FastAPI
+
+from config.auth import LAST_LOGIN_BUFFER_SIZE, LAST_LOGIN_FLUSH_INTERVAL
+from repositories.users import UserRepository
+from utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+buffer_size = Gauge(
+    "last_login_buffer_size", "users with buffered last login time"
+)
+flush_batch_size = Gauge(
+    "last_login_flush_batch_size", "users written by the last flush"
+)
+flush_lag = Gauge(
+    "last_login_flush_lag_seconds",
+    "age of the oldest buffered last login time at the last flush",
+)
+dropped = Counter(
+    "last_login_dropped_total", "last login times dropped as buffer was full"
+)
+
+
+class LastLoginBuffer:
+    """Bounded write-behind buffer of users last login time."""
+
+    def __init__(
+        self, users: UserRepository, max_size: int, interval: float
+    ) -> None:
+        """Create buffer.
+
+        Args:
+            users: users repository
+            max_size: max number of buffered users
+            interval: seconds between flushes
+        """
+        self.users = users
+        self.max_size = max_size
+        self.interval = interval
+        self.logins: Dict[int, datetime] = {}
+        self.oldest: Optional[float] = None
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: int, when: Optional[datetime] = None) -> None:
+        """Record user login.
+
+        Args:
+            user_id: user id
+            when: login time, None - now
+
+        Returns:
+            None
+        """
+        if user_id not in self.logins and len(self.logins) >= self.max_size:
+            dropped.inc()
+            return
+        self.logins[user_id] = when or datetime.now(timezone.utc)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        buffer_size.set(len(self.logins))
+        if len(self.logins) >= self.max_size:
+            self._full.set()
+
+    async def flush(self) -> int:
+        """Write buffered last login times.
+
+        Timestamps are returned to buffer if write fails,
+        unless newer ones were recorded meanwhile.
+
+        Returns:
+            number of written users
+        """
+        async with self._lock:
+            if not self.logins:
+                return 0
+            logins, self.logins = self.logins, {}
+            oldest, self.oldest = self.oldest, None
+            self._full.clear()
+            try:
+                await self.users.update_last_login(logins)
+            except Exception:
+                logger.exception("last login flush failed")
+                for user_id, when in logins.items():
+                    self.logins.setdefault(user_id, when)
+                self.oldest = oldest
+                return 0
+            finally:
+                buffer_size.set(len(self.logins))
+            flush_batch_size.set(len(logins))
+            flush_lag.set(time.monotonic() - oldest)  # type: ignore
+            return len(logins)
+
+    async def run(self) -> None:
+        """Flush buffer periodically or when it's full.
+
+        Returns:
+            None
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            # flush in progress is finished even if task is cancelled
+            await asyncio.shield(self.flush())
+
+    def start(self) -> None:
+        """Start background flushing task.
+
+        Returns:
+            None
+        """
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop background flushing task and flush buffer.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+async def app_init_last_login(app: FastAPI) -> None:
+    """Create last login buffer and start flushing.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    app.state.last_login = LastLoginBuffer(
+        app.state.users,
+        max_size=LAST_LOGIN_BUFFER_SIZE,
+        interval=LAST_LOGIN_FLUSH_INTERVAL,
+    )
+    app.state.last_login.start()
+
+
+async def app_dispose_last_login(app: FastAPI) -> None:
+    """Stop flushing and write buffered last login times.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    await app.state.last_login.stop()
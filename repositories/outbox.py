@@ -0,0 +1,351 @@
+"""Outbox repository module.
+
+Repositories write change events into ``outbox`` table in the same
+transaction as the change itself. A background relay publishes them in
+batches to a redis stream and marks them published in the same
+transaction, so every committed change is delivered at least once:
+consumers deduplicate by event id. Published events are kept for replay
+for a retention period.
+
+Event ids are allocated before commit, so an event with a lower id may
+commit after a higher one and a reader paging by id would skip it.
+Published events get a position instead: relay takes ``max + 1`` and the
+unique index makes a concurrent relay wait for its commit, so positions
+become visible in order. Replay pages by position and returns only
+published events, once a position is seen no lower one appears later.
+
+Attributes:
+    OutboxEvent: outbox event record with ``__slots__``
+    OutboxRelay: background publisher of outbox events
+
+Methods:
+    list_events: read published events after position for replay
+    app_init_outbox: create relay and start publishing
+    app_dispose_outbox: stop publishing
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI
+from redis.asyncio.client import Redis
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config.outbox import (
+    OUTBOX_RELAY_BATCH_SIZE,
+    OUTBOX_RELAY_INTERVAL,
+    OUTBOX_RETENTION,
+    OUTBOX_STREAM,
+    OUTBOX_STREAM_MAXLEN,
+)
+from models.outbox import Outbox
+from utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+outbox_table = Outbox.__table__
+
+published_events = Counter(
+    "outbox_published_total", "outbox events published to redis stream"
+)
+relay_lag = Gauge(
+    "outbox_relay_lag_seconds",
+    "age of the oldest event in the last published batch",
+)
+
+
+class OutboxEvent:
+    """Change event record."""
+
+    __slots__ = (
+        "id",
+        "topic",
+        "key",
+        "event",
+        "payload",
+        "created",
+        "position",
+    )
+
+    def __init__(
+        self,
+        id: int,  # noqa: A002
+        topic: str,
+        key: str,
+        event: str,
+        payload: Dict[str, Any],
+        created: Optional[datetime],
+        position: Optional[int] = None,
+    ) -> None:
+        """Create event record.
+
+        Args:
+            id: event id
+            topic: event topic
+            key: key of changed entity
+            event: event name
+            payload: event payload
+            created: event creation time
+            position: publishing order of event, None - not published
+        """
+        self.id = id
+        self.topic = topic
+        self.key = key
+        self.event = event
+        self.payload = payload
+        self.created = created
+        self.position = position
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Convert record to dict.
+
+        Returns:
+            dict of record fields
+        """
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+event_columns = tuple(outbox_table.c[field] for field in OutboxEvent.__slots__)
+
+insert_event = insert(outbox_table)
+select_events_after = (
+    select(*event_columns)
+    .where(outbox_table.c.position > bindparam("after"))
+    .order_by(outbox_table.c.position)
+    .limit(bindparam("limit"))
+)
+select_last_position = select(
+    func.coalesce(func.max(outbox_table.c.position), 0)
+)
+# concurrent relays of other workers skip rows locked by this one
+select_unpublished = (
+    select(*event_columns)
+    .where(outbox_table.c.published.is_(None))
+    .order_by(outbox_table.c.id)
+    .limit(bindparam("limit"))
+    .with_for_update(skip_locked=True)
+)
+mark_published = (
+    update(outbox_table)
+    .where(outbox_table.c.id == bindparam("event_id"))
+    .values(published=bindparam("now"), position=bindparam("event_position"))
+)
+delete_published_before = delete(outbox_table).where(
+    outbox_table.c.published < bindparam("before")
+)
+
+
+def stream_fields(event: OutboxEvent) -> Dict[str, Any]:
+    """Convert event to redis stream entry fields.
+
+    Args:
+        event: outbox event
+
+    Returns:
+        stream entry fields
+    """
+    return {
+        "id": event.id,
+        "topic": event.topic,
+        "key": event.key,
+        "event": event.event,
+        "payload": json.dumps(event.payload, separators=(",", ":")),
+        "created": event.created.isoformat() if event.created else "",
+        "position": event.position,
+    }
+
+
+async def list_events(
+    engine: AsyncEngine, after: int, limit: int
+) -> List[OutboxEvent]:
+    """Read published events after position.
+
+    Args:
+        engine: async database engine
+        after: position, 0 - from the oldest kept event
+        limit: max number of events
+
+    Returns:
+        events in position order
+    """
+    async with engine.connect() as conn:
+        res = await conn.execute(
+            select_events_after, {"after": after, "limit": limit}
+        )
+        rows = res.all()
+    return [OutboxEvent(*row) for row in rows]
+
+
+class OutboxRelay:
+    """Background publisher of outbox events to redis stream."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        redis: Redis,
+        batch_size: int,
+        interval: float,
+        retention: int,
+    ) -> None:
+        """Create relay.
+
+        Args:
+            engine: async database engine
+            redis: redis connection pool object
+            batch_size: max number of events published at once
+            interval: seconds between runs when outbox is drained
+            retention: seconds published events are kept
+        """
+        self.engine = engine
+        self.redis = redis
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retention = retention
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish_batch(self) -> int:
+        """Publish a batch of unpublished events.
+
+        Events are marked published with their positions before they
+        are sent to redis, the transaction is committed only after redis
+        accepted them, so if anything fails they are published again.
+        Batch is left for the next run when a concurrent relay committed
+        the same positions first.
+
+        Returns:
+            number of published events
+        """
+        try:
+            return await self._publish_batch()
+        except IntegrityError:
+            logger.debug("outbox positions taken by concurrent relay")
+            return 0
+
+    async def _publish_batch(self) -> int:
+        async with self.engine.begin() as conn:
+            res = await conn.execute(
+                select_unpublished, {"limit": self.batch_size}
+            )
+            events = [OutboxEvent(*row) for row in res.all()]
+            if not events:
+                return 0
+            now = datetime.now(timezone.utc)
+            last = (await conn.execute(select_last_position)).scalar()
+            for position, event in enumerate(events, last + 1):
+                event.position = position
+            await conn.execute(
+                mark_published,
+                [
+                    {
+                        "event_id": event.id,
+                        "event_position": event.position,
+                        "now": now,
+                    }
+                    for event in events
+                ],
+            )
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for event in events:
+                    pipe.xadd(
+                        OUTBOX_STREAM,
+                        stream_fields(event),
+                        maxlen=OUTBOX_STREAM_MAXLEN,
+                        approximate=True,
+                    )
+                await pipe.execute()
+        published_events.inc(len(events))
+        oldest = events[0].created
+        if oldest is not None:
+            if oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=timezone.utc)
+            relay_lag.set((now - oldest).total_seconds())
+        return len(events)
+
+    async def prune(self) -> int:
+        """Delete published events older than retention period.
+
+        Returns:
+            number of deleted events
+        """
+        before = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+        async with self.engine.begin() as conn:
+            res = await conn.execute(
+                delete_published_before, {"before": before}
+            )
+        return res.rowcount
+
+    async def run(self) -> None:
+        """Publish events until outbox is drained, then wait.
+
+        Returns:
+            None
+        """
+        pruned = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                while await self.publish_batch() == self.batch_size:
+                    pass
+                if time.monotonic() - pruned > self.interval * 60:
+                    pruned = time.monotonic()
+                    await self.prune()
+            except Exception:
+                logger.exception("outbox relay failed")
+
+    def start(self) -> None:
+        """Start background publishing task.
+
+        Returns:
+            None
+        """
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop background publishing task.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def app_init_outbox(app: FastAPI) -> None:
+    """Create outbox relay and start publishing.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    app.state.outbox = OutboxRelay(
+        app.state.users.engine,
+        app.state.redis,
+        batch_size=OUTBOX_RELAY_BATCH_SIZE,
+        interval=OUTBOX_RELAY_INTERVAL,
+        retention=OUTBOX_RETENTION,
+    )
+    app.state.outbox.start()
+
+
+async def app_dispose_outbox(app: FastAPI) -> None:
+    """Stop publishing outbox events.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    await app.state.outbox.stop()
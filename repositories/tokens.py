@@ -0,0 +1,550 @@
+"""Refresh tokens store module.
+
+Login stores issued refresh token as active until its expiry through
+``TokenStore`` interface, so deployment picks the backend by
+``TOKEN_STORE`` setting: redis shared by all instances, in-process
+memory of a single node deployment or SQL database, which needs no
+extra service. SQL backend stores token digests only and purges expired
+ones in bounded batches from a background task. Redis and SQL stores
+are called through the circuit breaker of their dependency.
+
+Attributes:
+    TokenStore: refresh tokens store interface
+    RedisTokenStore: redis keys with expiry
+    InMemoryTokenStore: dict with expiry heap of a single process
+    SQLTokenStore: SQLAlchemy Core table of token digests
+    get_token_store: FastAPI dependency returning application store
+
+Methods:
+    app_init_token_store: create configured refresh tokens store
+    app_dispose_token_store: stop purging expired tokens
+"""
+import abc
+import asyncio
+import hashlib
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import FastAPI
+from jose import JWTError, jwt
+from redis.asyncio.client import Redis
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+
+from config.auth import (
+    TOKEN_PURGE_BATCH_SIZE,
+    TOKEN_PURGE_INTERVAL,
+    TOKEN_STORE,
+)
+from db.keys import legacy_refresh_key, refresh_key
+from db.redis import reads_legacy_keys, redis_breaker, set_redis_key
+from models.tokens import RefreshToken
+from utils.circuit import CircuitBreaker, guarded
+
+logger = logging.getLogger(__name__)
+
+tokens_table = RefreshToken.__table__
+
+select_token_active = select(tokens_table.c.token).where(
+    tokens_table.c.token == bindparam("digest"),
+    tokens_table.c.expires > bindparam("now"),
+)
+select_tokens_active = select(tokens_table.c.token).where(
+    tokens_table.c.token.in_(bindparam("digests", expanding=True)),
+    tokens_table.c.expires > bindparam("now"),
+)
+insert_token = insert(tokens_table)
+# SET clause is rendered from ``expires`` parameter
+update_token_expires = update(tokens_table).where(
+    tokens_table.c.token == bindparam("digest")
+)
+delete_token_active = delete(tokens_table).where(
+    tokens_table.c.token == bindparam("digest"),
+    tokens_table.c.expires > bindparam("now"),
+)
+# bounded batch, short transactions don't hold locks of many rows; batch
+# is selected first as MySQL rejects LIMIT in subquery of deleted table
+select_tokens_expired = (
+    select(tokens_table.c.token)
+    .where(tokens_table.c.expires <= bindparam("now"))
+    .limit(bindparam("limit"))
+)
+# expiry is checked again for tokens added again since batch was selected
+delete_tokens_expired = delete(tokens_table).where(
+    tokens_table.c.token.in_(bindparam("digests", expanding=True)),
+    tokens_table.c.expires <= bindparam("now"),
+)
+
+
+def token_digest(token: str) -> str:
+    """Get digest token is stored by in database.
+
+    Args:
+        token: encoded token
+
+    Returns:
+        hex sha256 digest
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenStore(abc.ABC):
+    """Refresh tokens store interface."""
+
+    @abc.abstractmethod
+    async def add(self, token: str, ttl: int) -> None:
+        """Store token as active.
+
+        Args:
+            token: encoded token
+            ttl: seconds token stays active
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def exists(self, token: str) -> bool:
+        """Check token is active.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            True - active, False - not stored or expired
+        """
+
+    @abc.abstractmethod
+    async def exists_many(self, tokens: Sequence[str]) -> List[bool]:
+        """Check a batch of tokens with a single lookup.
+
+        Args:
+            tokens: encoded tokens
+
+        Returns:
+            active flag of every token
+        """
+
+    @abc.abstractmethod
+    async def delete(self, token: str) -> bool:
+        """Deactivate token.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            True - token was active, False - otherwise
+        """
+
+    @abc.abstractmethod
+    async def purge(self) -> int:
+        """Remove expired tokens.
+
+        Returns:
+            number of removed tokens
+        """
+
+
+class RedisTokenStore(TokenStore):
+    """Refresh tokens kept as redis keys with expiry.
+
+    Keys are tagged with token user, see ``db.keys.refresh_key``.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        """Create store.
+
+        Args:
+            redis: redis connection pool object
+        """
+        self.redis = redis
+        self.breaker = redis_breaker
+
+    @staticmethod
+    def key(token: str) -> str:
+        """Get key of token.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            redis key
+        """
+        try:
+            claims = jwt.get_unverified_claims(token)
+        except JWTError:
+            claims = {}
+        return refresh_key(claims, token)
+
+    async def add(self, token: str, ttl: int) -> None:
+        """Store token as redis key expiring with it.
+
+        Args:
+            token: encoded token
+            ttl: seconds token stays active
+
+        Returns:
+            None
+        """
+        await set_redis_key(self.redis, self.key(token), "1", ttl)
+
+    def keys(self, token: str) -> List[str]:
+        """Get keys token may be stored under.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            redis keys, key of layout before hash tags too while it's read
+        """
+        keys = [self.key(token)]
+        if reads_legacy_keys(self.redis):
+            keys.append(legacy_refresh_key(token))
+        return keys
+
+    @guarded
+    async def exists(self, token: str) -> bool:
+        """Check token is active.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            True - active, False - not stored or expired
+        """
+        return bool(await self.redis.exists(*self.keys(token)))
+
+    @guarded
+    async def exists_many(self, tokens: Sequence[str]) -> List[bool]:
+        """Check a batch of tokens with one pipeline round trip.
+
+        Args:
+            tokens: encoded tokens
+
+        Returns:
+            active flag of every token
+        """
+        if not tokens:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for token in tokens:
+                pipe.exists(*self.keys(token))
+            results = await pipe.execute()
+        return [bool(result) for result in results]
+
+    @guarded
+    async def delete(self, token: str) -> bool:
+        """Delete keys of token.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            True - token was active, False - otherwise
+        """
+        return bool(await self.redis.delete(*self.keys(token)))
+
+    async def purge(self) -> int:
+        """Remove expired tokens.
+
+        Returns:
+            0, redis expires keys itself
+        """
+        return 0
+
+
+class InMemoryTokenStore(TokenStore):
+    """Refresh tokens of a single process with expiry heap.
+
+    Expired tokens are removed from the top of the heap as store is
+    used, heap entries of re-added or deleted tokens are skipped.
+    """
+
+    def __init__(self) -> None:
+        """Create empty store."""
+        self._expires: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def _expire(self, now: float) -> int:
+        removed = 0
+        while self._heap and self._heap[0][0] <= now:
+            expires, token = heapq.heappop(self._heap)
+            if self._expires.get(token) == expires:
+                del self._expires[token]
+                removed += 1
+        return removed
+
+    async def add(self, token: str, ttl: int) -> None:
+        """Store token as active, removing expired tokens first.
+
+        Args:
+            token: encoded token
+            ttl: seconds token stays active
+
+        Returns:
+            None
+        """
+        now = time.time()
+        self._expire(now)
+        expires = now + ttl
+        self._expires[token] = expires
+        heapq.heappush(self._heap, (expires, token))
+
+    async def exists(self, token: str) -> bool:
+        """Check token is active.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            True - active, False - not stored or expired
+        """
+        return self._expires.get(token, 0) > time.time()
+
+    async def exists_many(self, tokens: Sequence[str]) -> List[bool]:
+        """Check a batch of tokens with a single lookup.
+
+        Args:
+            tokens: encoded tokens
+
+        Returns:
+            active flag of every token
+        """
+        now = time.time()
+        return [self._expires.get(token, 0) > now for token in tokens]
+
+    async def delete(self, token: str) -> bool:
+        """Deactivate token.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            True - token was active, False - otherwise
+        """
+        return self._expires.pop(token, 0) > time.time()
+
+    async def purge(self) -> int:
+        """Remove expired tokens from the top of the heap.
+
+        Returns:
+            number of removed tokens
+        """
+        return self._expire(time.time())
+
+
+class SQLTokenStore(TokenStore):
+    """SQLAlchemy Core refresh tokens table of token digests.
+
+    Expired rows are purged by a background task in bounded batches,
+    requests never wait for it.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        purge_batch_size: int = TOKEN_PURGE_BATCH_SIZE,
+        purge_interval: float = TOKEN_PURGE_INTERVAL,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        """Create store.
+
+        Args:
+            engine: async database engine
+            purge_batch_size: max number of rows deleted at once
+            purge_interval: seconds between background purges
+            breaker: database circuit breaker of request calls,
+                None - call directly
+        """
+        self.engine = engine
+        self.purge_batch_size = purge_batch_size
+        self.purge_interval = purge_interval
+        self.breaker = breaker
+        self._task: Optional[asyncio.Task] = None
+
+    @guarded
+    async def add(self, token: str, ttl: int) -> None:
+        """Store digest of token, extending expiry of stored one.
+
+        Args:
+            token: encoded token
+            ttl: seconds token stays active
+
+        Returns:
+            None
+        """
+        digest = token_digest(token)
+        expires = int(time.time()) + ttl
+        async with self.engine.begin() as conn:
+            res = await conn.execute(
+                update_token_expires, {"digest": digest, "expires": expires}
+            )
+            if not res.rowcount:
+                await conn.execute(
+                    insert_token, {"token": digest, "expires": expires}
+                )
+
+    @guarded
+    async def exists(self, token: str) -> bool:
+        """Check token is active.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            True - active, False - not stored or expired
+        """
+        params = {"digest": token_digest(token), "now": int(time.time())}
+        async with self.engine.connect() as conn:
+            res = await conn.execute(select_token_active, params)
+            return res.first() is not None
+
+    @guarded
+    async def exists_many(self, tokens: Sequence[str]) -> List[bool]:
+        """Check a batch of tokens with a single query.
+
+        Args:
+            tokens: encoded tokens
+
+        Returns:
+            active flag of every token
+        """
+        if not tokens:
+            return []
+        digests = [token_digest(token) for token in tokens]
+        params = {"digests": digests, "now": int(time.time())}
+        async with self.engine.connect() as conn:
+            res = await conn.execute(select_tokens_active, params)
+            active = set(res.scalars())
+        return [digest in active for digest in digests]
+
+    @guarded
+    async def delete(self, token: str) -> bool:
+        """Deactivate token.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            True - token was active, False - otherwise
+        """
+        params = {"digest": token_digest(token), "now": int(time.time())}
+        async with self.engine.begin() as conn:
+            res = await conn.execute(delete_token_active, params)
+        return bool(res.rowcount)
+
+    async def purge(self) -> int:
+        """Delete expired tokens in batches of ``purge_batch_size`` rows.
+
+        Every batch is deleted in its own transaction.
+
+        Returns:
+            number of removed tokens
+        """
+        # background job, not bounded by request circuit breaker
+        now = int(time.time())
+        purged = 0
+        while True:
+            async with self.engine.begin() as conn:
+                res = await conn.execute(
+                    select_tokens_expired,
+                    {"now": now, "limit": self.purge_batch_size},
+                )
+                digests = list(res.scalars())
+                if digests:
+                    res = await conn.execute(
+                        delete_tokens_expired,
+                        {"digests": digests, "now": now},
+                    )
+                    purged += res.rowcount
+            if len(digests) < self.purge_batch_size:
+                return purged
+
+    async def run(self) -> None:
+        """Purge expired tokens periodically.
+
+        Returns:
+            None
+        """
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await self.purge()
+            except Exception:
+                logger.exception("refresh tokens purge failed")
+
+    def start(self) -> None:
+        """Start background purging task.
+
+        Returns:
+            None
+        """
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop background purging task.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def get_token_store(request: Request) -> TokenStore:
+    """Get refresh tokens store of application.
+
+    Args:
+        request: incoming request
+
+    Returns:
+        refresh tokens store
+    """
+    return request.app.state.token_store
+
+
+async def app_init_token_store(app: FastAPI) -> None:
+    """Create refresh tokens store selected by ``TOKEN_STORE``.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: unknown store backend
+    """
+    if TOKEN_STORE == "redis":
+        app.state.token_store = RedisTokenStore(app.state.redis)
+    elif TOKEN_STORE == "memory":
+        app.state.token_store = InMemoryTokenStore()
+    elif TOKEN_STORE == "sql":
+        app.state.token_store = SQLTokenStore(
+            app.state.users.engine,
+            breaker=getattr(app.state.users, "breaker", None),
+        )
+        app.state.token_store.start()
+    else:
+        raise ValueError(f"Unknown token store {TOKEN_STORE!r}")
+
+
+async def app_dispose_token_store(app: FastAPI) -> None:
+    """Stop purging expired tokens.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    if isinstance(app.state.token_store, SQLTokenStore):
+        await app.state.token_store.stop()
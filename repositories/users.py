@@ -0,0 +1,811 @@
+"""User repository module.
+
+Views work with users through ``UserRepository`` interface instead of
+ORM session, every change is recorded as outbox event in the same
+transaction.
+
+Attributes:
+    UserRecord: user record with ``__slots__``
+    VersionConflict: conditional update of changed user
+    UserRepository: repository interface views depend on
+    SQLUserRepository: SQLAlchemy Core repository implementation
+    InMemoryUserRepository: dict based repository implementation for tests
+    get_user_repository: FastAPI dependency returning application repository
+"""
+import abc
+import itertools
+from datetime import datetime, timezone
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Integer,
+    any_,
+    bindparam,
+    case,
+    delete,
+    insert,
+    literal,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from starlette.requests import Request
+
+from config.auth import LAST_LOGIN_FLUSH_CHUNK
+from models.users import User
+from repositories.outbox import insert_event
+from utils.circuit import CircuitBreaker, guarded
+from utils.singleflight import SingleFlight
+
+users_table = User.__table__
+
+
+class VersionConflict(Exception):
+    """User version doesn't match any of expected versions."""
+
+
+class UserRecord:
+    """Plain user record returned by repositories."""
+
+    __slots__ = (
+        "id",
+        "email",
+        "password",
+        "is_active",
+        "is_superuser",
+        "created",
+        "last_login",
+        "confirmed",
+        "version",
+    )
+
+    def __init__(
+        self,
+        id: Optional[int] = None,  # noqa: A002
+        email: Optional[str] = None,
+        password: Optional[str] = None,
+        is_active: Optional[bool] = None,
+        is_superuser: Optional[bool] = None,
+        created: Optional[datetime] = None,
+        last_login: Optional[datetime] = None,
+        confirmed: Optional[bool] = None,
+        version: Optional[int] = None,
+    ) -> None:
+        self.id = id
+        self.email = email
+        self.password = password
+        self.is_active = is_active
+        self.is_superuser = is_superuser
+        self.created = created
+        self.last_login = last_login
+        self.confirmed = confirmed
+        self.version = version
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Convert record to dict.
+
+        Returns:
+            dict of record fields
+        """
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, UserRecord):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self) -> str:
+        return f"UserRecord(id={self.id!r}, email={self.email!r})"
+
+
+# columns are selected in record slots order to build records positionally
+user_columns = tuple(users_table.c[field] for field in UserRecord.__slots__)
+
+# hot statements are built once, so their cache keys are memoized and
+# each execution is a single compiled cache lookup
+select_user_by_id = select(*user_columns).where(
+    users_table.c.id == bindparam("user_id")
+)
+select_user_by_email = select(*user_columns).where(
+    users_table.c.email == bindparam("email")
+)
+select_users_by_ids = select(*user_columns).where(
+    users_table.c.id.in_(bindparam("user_ids", expanding=True))
+)
+# postgresql gets ids as one array parameter, so statement text doesn't
+# depend on number of ids and stays prepared
+select_users_by_id_array = select(*user_columns).where(
+    users_table.c.id == any_(bindparam("user_ids", type_=ARRAY(Integer)))
+)
+select_user_version = select(users_table.c.version).where(
+    users_table.c.id == bindparam("user_id")
+)
+select_user_list_versions = (
+    select(users_table.c.id, users_table.c.version)
+    .order_by(users_table.c.id)
+    .offset(bindparam("skip"))
+    .limit(bindparam("limit"))
+)
+select_user_list = (
+    select(*user_columns)
+    .order_by(users_table.c.id)
+    .offset(bindparam("skip"))
+    .limit(bindparam("limit"))
+)
+insert_user = insert(users_table)
+update_user_by_id = (
+    update(users_table)
+    .where(users_table.c.id == bindparam("user_id"))
+    .values(version=users_table.c.version + 1)
+)
+delete_user_by_id = delete(users_table).where(
+    users_table.c.id == bindparam("user_id")
+)
+insert_user_returning = insert_user.returning(*user_columns)
+# optimistic concurrency: the row is changed only in expected versions
+update_user_by_id_and_versions = update_user_by_id.where(
+    users_table.c.version.in_(bindparam("versions", expanding=True))
+)
+update_user_by_id_returning = update_user_by_id.returning(*user_columns)
+update_user_by_id_and_versions_returning = (
+    update_user_by_id_and_versions.returning(*user_columns)
+)
+delete_user_by_id_returning = delete_user_by_id.returning(*user_columns)
+
+
+def user_event(event: str, record: UserRecord) -> Dict[str, Any]:
+    """Create outbox event values of user change.
+
+    Password hash is never published.
+
+    Args:
+        event: change name, created, updated or deleted
+        record: user record after change
+
+    Returns:
+        outbox row values
+    """
+    payload = {
+        field: value.isoformat() if isinstance(value, datetime) else value
+        for field, value in record.as_dict().items()
+        if field != "password"
+    }
+    return {
+        "topic": "user",
+        "key": str(record.id),
+        "event": event,
+        "payload": payload,
+    }
+
+
+class UserRepository(abc.ABC):
+    """Users storage interface."""
+
+    @abc.abstractmethod
+    async def get_by_id(self, user_id: int) -> Optional[UserRecord]:
+        """Find user by id.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            user record if found, None - otherwise
+        """
+
+    @abc.abstractmethod
+    async def get_by_email(self, email: str) -> Optional[UserRecord]:
+        """Find user by email.
+
+        Args:
+            email: user email
+
+        Returns:
+            user record if found, None - otherwise
+        """
+
+    @abc.abstractmethod
+    async def get_many(self, user_ids: Sequence[int]) -> Dict[int, UserRecord]:
+        """Find users by ids with a single lookup.
+
+        Args:
+            user_ids: user ids
+
+        Returns:
+            found user records by id
+        """
+
+    @abc.abstractmethod
+    async def get_version(self, user_id: int) -> Optional[int]:
+        """Get user version without reading the row.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            user version if found, None - otherwise
+        """
+
+    @abc.abstractmethod
+    async def get_list_versions(
+        self, skip: int = 0, limit: int = 50
+    ) -> List[Tuple[int, int]]:
+        """Get ids and versions of users list page.
+
+        Args:
+            skip: number of users to skip
+            limit: max number of users to return
+
+        Returns:
+            list of user id and version pairs in list order
+        """
+
+    @abc.abstractmethod
+    async def get_list(
+        self, skip: int = 0, limit: int = 50
+    ) -> List[UserRecord]:
+        """Get list of users.
+
+        Args:
+            skip: number of users to skip
+            limit: max number of users to return
+
+        Returns:
+            list of user records
+        """
+
+    @abc.abstractmethod
+    async def create(self, values: Dict[str, Any]) -> UserRecord:
+        """Create a new user.
+
+        Args:
+            values: user attributes
+
+        Returns:
+            created user record
+        """
+
+    @abc.abstractmethod
+    async def update(
+        self,
+        user_id: int,
+        values: Dict[str, Any],
+        versions: Optional[Collection[int]] = None,
+    ) -> Optional[UserRecord]:
+        """Update user attributes.
+
+        Args:
+            user_id: user id
+            values: attributes to be updated
+            versions: update only user in one of versions, None - any
+
+        Returns:
+            updated user record if found, None - otherwise
+
+        Raises:
+            VersionConflict: user version is not one of versions
+        """
+
+    @abc.abstractmethod
+    async def delete(self, user_id: int) -> Optional[UserRecord]:
+        """Delete user.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            deleted user record if found, None - otherwise
+        """
+
+    @abc.abstractmethod
+    async def update_last_login(self, logins: Dict[int, datetime]) -> int:
+        """Set last login time of many users at once.
+
+        Args:
+            logins: user id to last login time mapping
+
+        Returns:
+            number of updated users
+        """
+
+
+class SQLUserRepository(UserRepository):
+    """SQLAlchemy Core users repository.
+
+    Statements return lightweight records, so there is no identity map
+    bookkeeping, attribute instrumentation or refresh queries on hot
+    paths. Request calls go through optional circuit breaker.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        breaker: Optional[CircuitBreaker] = None,
+        last_login_chunk: int = LAST_LOGIN_FLUSH_CHUNK,
+    ) -> None:
+        """Create repository.
+
+        Args:
+            engine: async database engine
+            breaker: database circuit breaker of request calls,
+                None - call directly
+            last_login_chunk: max number of users updated by one
+                last login statement
+        """
+        self.engine = engine
+        self.breaker = breaker
+        self.last_login_chunk = last_login_chunk
+        self._lookups = SingleFlight()
+
+    async def _fetch_one(
+        self, conn: AsyncConnection, user_id: int
+    ) -> Optional[UserRecord]:
+        res = await conn.execute(select_user_by_id, {"user_id": user_id})
+        row = res.first()
+        return UserRecord(*row) if row else None
+
+    @guarded
+    async def _get_by_id(self, user_id: int) -> Optional[UserRecord]:
+        async with self.engine.connect() as conn:
+            return await self._fetch_one(conn, user_id)
+
+    @guarded
+    async def _get_by_email(self, email: str) -> Optional[UserRecord]:
+        async with self.engine.connect() as conn:
+            res = await conn.execute(select_user_by_email, {"email": email})
+            row = res.first()
+        return UserRecord(*row) if row else None
+
+    async def get_by_id(self, user_id: int) -> Optional[UserRecord]:
+        """Find user by id, sharing query of concurrent identical lookups.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            user record if found, None - otherwise
+        """
+        return await self._lookups.do(
+            ("id", user_id), lambda: self._get_by_id(user_id)
+        )
+
+    async def get_by_email(self, email: str) -> Optional[UserRecord]:
+        """Find user by email, sharing query of concurrent lookups.
+
+        Args:
+            email: user email
+
+        Returns:
+            user record if found, None - otherwise
+        """
+        return await self._lookups.do(
+            ("email", email), lambda: self._get_by_email(email)
+        )
+
+    @guarded
+    async def get_many(self, user_ids: Sequence[int]) -> Dict[int, UserRecord]:
+        """Find users by ids with a single query.
+
+        Args:
+            user_ids: user ids
+
+        Returns:
+            found user records by id
+        """
+        if not user_ids:
+            return {}
+        stmt = select_users_by_ids
+        if self.engine.dialect.name == "postgresql":
+            stmt = select_users_by_id_array
+        async with self.engine.connect() as conn:
+            res = await conn.execute(stmt, {"user_ids": list(user_ids)})
+            rows = res.all()
+        return {row[0]: UserRecord(*row) for row in rows}
+
+    @guarded
+    async def get_version(self, user_id: int) -> Optional[int]:
+        """Get user version without reading the row.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            user version if found, None - otherwise
+        """
+        async with self.engine.connect() as conn:
+            res = await conn.execute(select_user_version, {"user_id": user_id})
+            return res.scalar()
+
+    @guarded
+    async def get_list_versions(
+        self, skip: int = 0, limit: int = 50
+    ) -> List[Tuple[int, int]]:
+        """Get ids and versions of users list page.
+
+        Args:
+            skip: number of users to skip
+            limit: max number of users to return
+
+        Returns:
+            list of user id and version pairs in list order
+        """
+        async with self.engine.connect() as conn:
+            res = await conn.execute(
+                select_user_list_versions, {"skip": skip, "limit": limit}
+            )
+            rows = res.all()
+        return [(user_id, version) for user_id, version in rows]
+
+    @guarded
+    async def get_list(
+        self, skip: int = 0, limit: int = 50
+    ) -> List[UserRecord]:
+        """Get list of users.
+
+        Args:
+            skip: number of users to skip
+            limit: max number of users to return
+
+        Returns:
+            list of user records
+        """
+        async with self.engine.connect() as conn:
+            res = await conn.execute(
+                select_user_list, {"skip": skip, "limit": limit}
+            )
+            rows = res.all()
+        return [UserRecord(*row) for row in rows]
+
+    @guarded
+    async def create(self, values: Dict[str, Any]) -> UserRecord:
+        """Create a new user and its created event.
+
+        Args:
+            values: user attributes
+
+        Returns:
+            created user record
+        """
+        async with self.engine.begin() as conn:
+            if self.engine.dialect.insert_returning:
+                res = await conn.execute(insert_user_returning, values)
+                record = UserRecord(*res.one())
+            else:
+                res = await conn.execute(insert_user, values)
+                record = await self._fetch_one(  # type: ignore
+                    conn, res.inserted_primary_key[0]
+                )
+            await conn.execute(insert_event, user_event("created", record))
+        return record
+
+    @guarded
+    async def update(
+        self,
+        user_id: int,
+        values: Dict[str, Any],
+        versions: Optional[Collection[int]] = None,
+    ) -> Optional[UserRecord]:
+        """Update user attributes and write updated event.
+
+        Every update bumps user version. Expected versions are checked by
+        the ``UPDATE`` statement itself, so no row lock is held across
+        round trips.
+
+        Args:
+            user_id: user id
+            values: attributes to be updated
+            versions: update only user in one of versions, None - any
+
+        Returns:
+            updated user record if found, None - otherwise
+
+        Raises:
+            VersionConflict: user version is not one of versions
+        """
+        if not values:
+            async with self.engine.connect() as conn:
+                record = await self._fetch_one(conn, user_id)
+            if record and versions is not None:
+                if record.version not in versions:
+                    raise VersionConflict(user_id)
+            return record
+        # SET clause is rendered from parameter names matching columns
+        params = {**values, "user_id": user_id}
+        stmt, stmt_returning = update_user_by_id, update_user_by_id_returning
+        if versions is not None:
+            params["versions"] = list(versions)
+            stmt = update_user_by_id_and_versions
+            stmt_returning = update_user_by_id_and_versions_returning
+        async with self.engine.begin() as conn:
+            if self.engine.dialect.update_returning:
+                res = await conn.execute(stmt_returning, params)
+                row = res.first()
+                record = UserRecord(*row) if row else None
+            else:
+                res = await conn.execute(stmt, params)
+                record = None
+                if res.rowcount:
+                    record = await self._fetch_one(conn, user_id)
+            if record:
+                await conn.execute(insert_event, user_event("updated", record))
+            elif versions is not None:
+                # nothing updated: tell changed user from missing one
+                res = await conn.execute(
+                    select_user_version, {"user_id": user_id}
+                )
+                if res.scalar() is not None:
+                    raise VersionConflict(user_id)
+        return record
+
+    @guarded
+    async def delete(self, user_id: int) -> Optional[UserRecord]:
+        """Delete user and write deleted event.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            deleted user record if found, None - otherwise
+        """
+        params = {"user_id": user_id}
+        async with self.engine.begin() as conn:
+            if self.engine.dialect.delete_returning:
+                res = await conn.execute(delete_user_by_id_returning, params)
+                row = res.first()
+                record = UserRecord(*row) if row else None
+            else:
+                record = await self._fetch_one(conn, user_id)
+                if record:
+                    await conn.execute(delete_user_by_id, params)
+            if record:
+                await conn.execute(insert_event, user_event("deleted", record))
+        return record
+
+    async def update_last_login(self, logins: Dict[int, datetime]) -> int:
+        """Set last login time of many users in chunks.
+
+        Every chunk of ``last_login_chunk`` users is one statement in its
+        own transaction. Last login is not a user change, so neither
+        version is bumped nor outbox event is written, and conditional
+        updates of users who just logged in don't fail.
+
+        Args:
+            logins: user id to last login time mapping
+
+        Returns:
+            number of updated users
+        """
+        # background flush, not a request call: a large buffer must not
+        # count against or be cut by request circuit breaker, chunks keep
+        # statements and row locks of one transaction small
+        last_login = users_table.c.last_login
+        items = iter(logins.items())
+        updated = 0
+        while True:
+            chunk = dict(itertools.islice(items, self.last_login_chunk))
+            if not chunk:
+                return updated
+            stmt = (
+                update(users_table)
+                .where(users_table.c.id.in_(list(chunk)))
+                .values(
+                    last_login=case(
+                        {
+                            user_id: literal(value, last_login.type)
+                            for user_id, value in chunk.items()
+                        },
+                        value=users_table.c.id,
+                    ),
+                )
+            )
+            async with self.engine.begin() as conn:
+                res = await conn.execute(stmt)
+            updated += res.rowcount
+
+
+class InMemoryUserRepository(UserRepository):
+    """Users repository keeping records in process memory.
+
+    Used in tests and as a reference implementation of repository
+    interface. Returns copies of stored records, so callers can't change
+    stored state.
+    """
+
+    defaults = {
+        "is_active": False,
+        "is_superuser": False,
+        "confirmed": False,
+        "version": 1,
+    }
+
+    def __init__(self) -> None:
+        """Create empty repository."""
+        self._users: Dict[int, UserRecord] = {}
+        self._emails: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _copy(record: Optional[UserRecord]) -> Optional[UserRecord]:
+        return UserRecord(**record.as_dict()) if record else None
+
+    async def get_by_id(self, user_id: int) -> Optional[UserRecord]:
+        """Find user by id.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            user record if found, None - otherwise
+        """
+        return self._copy(self._users.get(user_id))
+
+    async def get_by_email(self, email: str) -> Optional[UserRecord]:
+        """Find user by email.
+
+        Args:
+            email: user email
+
+        Returns:
+            user record if found, None - otherwise
+        """
+        user_id = self._emails.get(email)
+        return self._copy(self._users.get(user_id))  # type: ignore
+
+    async def get_many(self, user_ids: Sequence[int]) -> Dict[int, UserRecord]:
+        """Find users by ids with a single lookup.
+
+        Args:
+            user_ids: user ids
+
+        Returns:
+            found user records by id
+        """
+        return {
+            user_id: self._copy(self._users[user_id])  # type: ignore
+            for user_id in user_ids
+            if user_id in self._users
+        }
+
+    async def get_version(self, user_id: int) -> Optional[int]:
+        """Get user version without reading the row.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            user version if found, None - otherwise
+        """
+        record = self._users.get(user_id)
+        return record.version if record else None
+
+    async def get_list_versions(
+        self, skip: int = 0, limit: int = 50
+    ) -> List[Tuple[int, int]]:
+        """Get ids and versions of users list page.
+
+        Args:
+            skip: number of users to skip
+            limit: max number of users to return
+
+        Returns:
+            list of user id and version pairs in list order
+        """
+        ids = sorted(self._users)[skip : skip + limit]  # noqa: E203
+        return [(user_id, self._users[user_id].version) for user_id in ids]
+
+    async def get_list(
+        self, skip: int = 0, limit: int = 50
+    ) -> List[UserRecord]:
+        """Get list of users.
+
+        Args:
+            skip: number of users to skip
+            limit: max number of users to return
+
+        Returns:
+            list of user records
+        """
+        ids = sorted(self._users)[skip : skip + limit]  # noqa: E203
+        return [self._copy(self._users[user_id]) for user_id in ids]
+
+    async def create(self, values: Dict[str, Any]) -> UserRecord:
+        """Create a new user.
+
+        Args:
+            values: user attributes
+
+        Returns:
+            created user record
+
+        Raises:
+            ValueError: user with email exists
+        """
+        if values.get("email") in self._emails:
+            raise ValueError(f"User with email '{values['email']}' exists")
+        record = UserRecord(
+            **{**self.defaults, **values},
+            id=next(self._ids),
+            created=datetime.now(timezone.utc),
+        )
+        self._users[record.id] = record
+        self._emails[record.email] = record.id
+        return self._copy(record)  # type: ignore
+
+    async def update(
+        self,
+        user_id: int,
+        values: Dict[str, Any],
+        versions: Optional[Collection[int]] = None,
+    ) -> Optional[UserRecord]:
+        """Update user attributes.
+
+        Args:
+            user_id: user id
+            values: attributes to be updated
+            versions: update only user in one of versions, None - any
+
+        Returns:
+            updated user record if found, None - otherwise
+
+        Raises:
+            VersionConflict: user version is not one of versions
+            ValueError: user with new email exists
+        """
+        record = self._users.get(user_id)
+        if not record:
+            return None
+        if versions is not None and record.version not in versions:
+            raise VersionConflict(user_id)
+        if not values:
+            return self._copy(record)
+        if "email" in values and values["email"] != record.email:
+            if values["email"] in self._emails:
+                raise ValueError(f"User with email '{values['email']}' exists")
+            del self._emails[record.email]
+            self._emails[values["email"]] = user_id
+        for field, value in values.items():
+            setattr(record, field, value)
+        record.version += 1
+        return self._copy(record)
+
+    async def delete(self, user_id: int) -> Optional[UserRecord]:
+        """Delete user.
+
+        Args:
+            user_id: user id
+
+        Returns:
+            deleted user record if found, None - otherwise
+        """
+        record = self._users.pop(user_id, None)
+        if record:
+            del self._emails[record.email]
+        return record
+
+    async def update_last_login(self, logins: Dict[int, datetime]) -> int:
+        """Set last login time of many users at once.
+
+        Args:
+            logins: user id to last login time mapping
+
+        Returns:
+            number of updated users
+        """
+        updated = 0
+        for user_id, value in logins.items():
+            if user_id in self._users:
+                self._users[user_id].last_login = value
+                updated += 1
+        return updated
+
+
+def get_user_repository(request: Request) -> UserRepository:
+    """Get users repository of application.
+
+    Args:
+        request: incoming request
+
+    Returns:
+        users repository
+    """
+    return request.app.state.users
@@ -0,0 +1,32 @@
+"""
+Token introspection schemas.
+"""
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from config.auth import INTROSPECT_BATCH_SIZE
+
+
+class IntrospectBatch(BaseModel):
+    """Batch token introspection input schema."""
+
+    tokens: List[str] = Field(min_length=1, max_length=INTROSPECT_BATCH_SIZE)
+
+
+class Introspection(BaseModel):
+    """Token introspection result schema (RFC 7662)."""
+
+    active: bool
+    scope: Optional[str] = None
+    username: Optional[str] = None
+    sub: Optional[str] = None
+    exp: Optional[int] = None
+    jti: Optional[str] = None
+    token_type: Optional[str] = None
+
+
+class IntrospectionBatch(BaseModel):
+    """Batch token introspection output schema, results in input order."""
+
+    results: List[Introspection]
@@ -1,6 +1,8 @@
 """
 Login schemas.
 """
+from typing import Optional
+
 from pydantic import BaseModel, EmailStr
 
 
@@ -18,10 +20,13 @@ class Auth(Register):
 
 
 class Token(BaseModel):
-    """Token schema."""
+    """Token schema.
+
+    Refresh token is None when login degrades to access token only.
+    """
 
     access_token: str
-    refresh_token: str
+    refresh_token: Optional[str] = None
 
     class Config:
         """Config for token schema."""
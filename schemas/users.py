@@ -2,9 +2,11 @@
 Pydantic schemas for users.
 """
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+
+from config.auth import USERS_BATCH_SIZE
 
 
 # base shared properties
@@ -39,6 +41,7 @@ class UserOut(UserBase):
     id: Optional[int] = None
     created: Optional[datetime] = None
     last_login: Optional[datetime] = None
+    version: Optional[int] = None
 
     class Config:
         """Config for user schema."""
@@ -54,8 +57,48 @@ class UserDB(UserBase):
     password: str
     created: Optional[datetime] = None
     last_login: Optional[datetime] = None
+    version: Optional[int] = None
 
     class Config:
         """UserDB class config."""
 
         orm_mode = True
+
+
+# users batch lookup query
+class UserBatch(BaseModel):
+    """Users batch lookup schema."""
+
+    ids: List[int] = Field(min_length=1, max_length=USERS_BATCH_SIZE)
+
+
+# users batch lookup result
+class UserBatchOut(BaseModel):
+    """Users batch lookup result schema.
+
+    Users are in requested ids order, None - user not found.
+    """
+
+    users: List[Optional[UserOut]]
+    missing: List[int]
+
+
+# user change event
+class UserEvent(BaseModel):
+    """User change event schema."""
+
+    id: int
+    topic: str
+    key: str
+    event: str
+    payload: Dict[str, Any]
+    created: Optional[datetime] = None
+    position: int
+
+
+# page of user change events
+class UserEventList(BaseModel):
+    """User change events page schema."""
+
+    events: List[UserEvent]
+    last_position: int
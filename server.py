@@ -0,0 +1,485 @@
+"""
+Production server module.
+
+Pre-forks uvicorn worker processes serving ``main:app``, supervises them
+and replaces workers which exited, e.g. recycled after serving
+``--max-requests`` requests.
+
+Usage:
+
+    python server.py --workers 4 --port 8000
+
+Signals:
+    SIGHUP: graceful reload, new workers are started with fresh code
+        and old workers are drained after new ones are ready, old
+        workers keep serving if new ones are not ready in time
+    SIGTERM, SIGINT: graceful shutdown
+
+Application modules are never imported by supervisor process, so every
+worker imports application itself and runs its startup and shutdown
+hooks exactly once.
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import random
+import signal
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+import uvicorn
+
+from config.server import (
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_HOST,
+    SERVER_MAX_REQUESTS,
+    SERVER_MAX_REQUESTS_JITTER,
+    SERVER_PORT,
+    SERVER_REUSE_PORT,
+    SERVER_WORKERS,
+)
+
+APP = "main:app"
+
+logger = logging.getLogger("server")
+
+Notify = Callable[[], None]
+Worker = Callable[[Notify], None]
+
+
+def select_loop() -> str:
+    """Select the fastest available event loop implementation.
+
+    Returns:
+        uvicorn loop setting
+    """
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def select_http() -> str:
+    """Select the fastest available HTTP protocol implementation.
+
+    Returns:
+        uvicorn http setting
+    """
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def reuse_port_supported() -> bool:
+    """Check whether SO_REUSEPORT socket option is supported.
+
+    Returns:
+        True - supported, False - otherwise
+    """
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def create_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    """Create bound listening socket.
+
+    Args:
+        host: bind host
+        port: bind port
+        reuse_port: set SO_REUSEPORT option
+
+    Returns:
+        socket
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def max_requests(limit: int, jitter: int) -> Optional[int]:
+    """Get number of requests after which worker is recycled.
+
+    Args:
+        limit: base number of requests, 0 - never recycle
+        jitter: max random number of extra requests
+
+    Returns:
+        number of requests, None - never recycle
+    """
+    if not limit:
+        return None
+    return limit + random.randint(0, jitter)
+
+
+class NotifyingServer(uvicorn.Server):
+    """Uvicorn server notifying supervisor when it's ready."""
+
+    def __init__(self, config: uvicorn.Config, notify: Notify) -> None:
+        """Create server.
+
+        Args:
+            config: uvicorn server config
+            notify: function telling supervisor worker is ready
+        """
+        super().__init__(config)
+        self.notify = notify
+
+    async def startup(self, sockets: Optional[list] = None) -> None:
+        """Start serving and notify supervisor unless startup failed.
+
+        Args:
+            sockets: sockets inherited from supervisor, None - bind
+
+        Returns:
+            None
+        """
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self.notify()
+
+
+class Supervisor:
+    """Pre-fork workers supervisor."""
+
+    def __init__(
+        self, worker: Worker, workers: int, graceful_timeout: float
+    ) -> None:
+        """Create supervisor.
+
+        Args:
+            worker: function running in worker process,
+                which calls notify when worker is ready to serve
+            workers: number of worker processes
+            graceful_timeout: seconds to wait for workers to finish
+        """
+        self.worker = worker
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.generation = 0
+        self.children: Dict[int, int] = {}
+        self.ready: Set[int] = set()
+        self.retiring: List[int] = []
+        self.terminated: Set[int] = set()
+        self.reload_started = 0.0
+        self.running = False
+        self.signals: List[int] = []
+        self._ready_read, self._ready_write = os.pipe()
+        os.set_blocking(self._ready_read, False)
+
+    def spawn(self) -> int:
+        """Fork a new worker process of current generation.
+
+        Returns:
+            worker process id
+        """
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            status = 0
+            try:
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                os.close(self._ready_read)
+                self.worker(self._notify)
+            except BaseException:
+                logger.exception("worker [%d] failed", os.getpid())
+                status = 1
+            finally:
+                os._exit(status)
+        self.children[pid] = self.generation
+        logger.info("started worker [%d]", pid)
+        return pid
+
+    def _notify(self) -> None:  # pragma: no cover
+        os.write(self._ready_write, f"{os.getpid()}\n".encode())
+
+    def read_ready(self) -> None:
+        """Read ready notifications of workers.
+
+        Returns:
+            None
+        """
+        try:
+            data = os.read(self._ready_read, 65536)
+        except BlockingIOError:
+            return
+        self.ready.update(int(pid) for pid in data.split())
+
+    def reap(self) -> None:
+        """Collect exited workers.
+
+        Returns:
+            None
+        """
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            self.children.pop(pid, None)
+            self.ready.discard(pid)
+            self.terminated.discard(pid)
+            if pid in self.retiring:
+                self.retiring.remove(pid)
+            logger.info("worker [%d] exited with status %d", pid, status)
+
+    def current(self) -> List[int]:
+        """Get workers of current generation which are not terminated.
+
+        Returns:
+            list of process ids
+        """
+        return [
+            pid
+            for pid, gen in self.children.items()
+            if gen == self.generation and pid not in self.terminated
+        ]
+
+    def maintain(self) -> None:
+        """Spawn workers of current generation up to configured number.
+
+        Returns:
+            None
+        """
+        for _ in range(self.workers - len(self.current())):
+            self.spawn()
+
+    def reload(self) -> None:
+        """Start a new generation of workers and retire old ones.
+
+        Old workers are terminated when all new workers are ready, the
+        reload is aborted if they are not ready within graceful timeout.
+
+        Returns:
+            None
+        """
+        logger.info("reloading workers")
+        self.retiring.extend(
+            pid
+            for pid in self.children
+            if pid not in self.retiring and pid not in self.terminated
+        )
+        self.generation += 1
+        self.reload_started = time.monotonic()
+        self.maintain()
+
+    def retire(self) -> None:
+        """Terminate old workers when new ones are ready.
+
+        New workers not ready within graceful timeout are terminated
+        instead and old workers become current generation again.
+
+        Returns:
+            None
+        """
+        if not self.retiring:
+            return
+        current = self.current()
+        if not all(pid in self.ready for pid in current):
+            if time.monotonic() - self.reload_started > self.graceful_timeout:
+                self.abort_reload(current)
+            return
+        for pid in self.retiring:
+            self.kill(pid, signal.SIGTERM)
+            self.terminated.add(pid)
+        self.retiring = []
+
+    def abort_reload(self, current: List[int]) -> None:
+        """Terminate new workers and keep old ones serving.
+
+        Args:
+            current: workers of current generation
+
+        Returns:
+            None
+        """
+        logger.error(
+            "new workers not ready in %s seconds, reload aborted",
+            self.graceful_timeout,
+        )
+        for pid in current:
+            self.kill(pid, signal.SIGTERM)
+            self.terminated.add(pid)
+        for pid in self.retiring:
+            self.children[pid] = self.generation
+        self.retiring = []
+
+    @staticmethod
+    def kill(pid: int, signum: int) -> None:
+        """Send signal to worker ignoring already exited ones.
+
+        Args:
+            pid: worker process id
+            signum: signal number
+
+        Returns:
+            None
+        """
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def handle_signal(self, signum: int, frame: object) -> None:
+        """Queue signal to be handled in supervisor loop.
+
+        Args:
+            signum: signal number
+            frame: current stack frame
+
+        Returns:
+            None
+        """
+        self.signals.append(signum)
+
+    def step(self) -> None:
+        """Run one iteration of supervisor loop.
+
+        Returns:
+            None
+        """
+        self.read_ready()
+        self.reap()
+        while self.signals:
+            signum = self.signals.pop(0)
+            if signum == signal.SIGHUP:
+                self.reload()
+            else:
+                self.running = False
+        if self.running:
+            self.maintain()
+            self.retire()
+
+    def stop(self) -> None:
+        """Gracefully terminate all workers.
+
+        Returns:
+            None
+        """
+        for pid in self.children:
+            if pid not in self.terminated:
+                self.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in self.children:
+            self.kill(pid, signal.SIGKILL)
+        while self.children:
+            pid, _ = os.waitpid(-1, 0)
+            self.children.pop(pid, None)
+
+    def run(self) -> None:
+        """Run workers until terminated.
+
+        Returns:
+            None
+        """
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.handle_signal)
+        self.running = True
+        self.maintain()
+        while self.running:
+            self.step()
+            time.sleep(0.1)
+        logger.info("shutting down workers")
+        self.stop()
+
+
+def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Args:
+        args: command line arguments, None - use sys.argv
+
+    Returns:
+        parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Run production server")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument(
+        "--reuse-port",
+        dest="reuse_port",
+        action="store_true",
+        default=SERVER_REUSE_PORT,
+    )
+    parser.add_argument(
+        "--max-requests", type=int, default=SERVER_MAX_REQUESTS
+    )
+    parser.add_argument(
+        "--max-requests-jitter", type=int, default=SERVER_MAX_REQUESTS_JITTER
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT
+    )
+    return parser.parse_args(args)
+
+
+def make_worker(
+    settings: argparse.Namespace, sock: Optional[socket.socket]
+) -> Worker:
+    """Create function serving application in worker process.
+
+    Args:
+        settings: server settings
+        sock: shared listening socket, None - bind own socket
+
+    Returns:
+        worker function
+    """
+
+    def worker(notify: Notify) -> None:  # pragma: no cover
+        listen = sock or create_socket(
+            settings.host, settings.port, reuse_port=True
+        )
+        config = uvicorn.Config(
+            APP,
+            loop=select_loop(),
+            http=select_http(),
+            lifespan="on",
+            limit_max_requests=max_requests(
+                settings.max_requests, settings.max_requests_jitter
+            ),
+            timeout_graceful_shutdown=settings.graceful_timeout,
+        )
+        NotifyingServer(config, notify).run(sockets=[listen])
+
+    return worker
+
+
+def main(args: Optional[List[str]] = None) -> None:  # pragma: no cover
+    """Start supervisor and workers.
+
+    Args:
+        args: command line arguments
+
+    Returns:
+        None
+    """
+    logging.basicConfig(level=logging.INFO)
+    settings = parse_args(args)
+    reuse_port = settings.reuse_port and reuse_port_supported()
+    sock = None
+    if not reuse_port:
+        sock = create_socket(settings.host, settings.port, reuse_port=False)
+    logger.info(
+        "serving %s on %s:%d with %d workers, loop=%s http=%s reuse_port=%s",
+        APP,
+        settings.host,
+        settings.port,
+        settings.workers,
+        select_loop(),
+        select_http(),
+        reuse_port,
+    )
+    Supervisor(
+        make_worker(settings, sock),
+        workers=settings.workers,
+        graceful_timeout=settings.graceful_timeout,
+    ).run()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
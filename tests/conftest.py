@@ -217,8 +217,22 @@ async def get_app(
             create_eng.return_value = engine
             from main import app
 
-            async with LifespanManager(app):
-                yield app
+            # background probing and flushing are tested separately
+            with mock.patch(
+                "utils.health.HEALTH_PROBE_INTERVAL", 3600
+            ), mock.patch(
+                "repositories.last_login.LAST_LOGIN_FLUSH_INTERVAL", 3600
+            ), mock.patch(
+                "repositories.outbox.OUTBOX_RELAY_INTERVAL", 3600
+            ), mock.patch(
+                "utils.loop_monitor.LOOP_LAG_INTERVAL", 3600
+            ):
+                async with LifespanManager(app):
+                    from tests.test_token_store import FakeRedis
+
+                    # tokens are checked for revocation on every request
+                    app.state.revocation.redis = FakeRedis()
+                    yield app
 
 
 @pytest_asyncio.fixture()
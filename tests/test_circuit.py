@@ -0,0 +1,175 @@
+"""
+Test dependency deadlines and circuit breaker.
+"""
+import asyncio
+from unittest import mock
+
+import pytest
+from starlette import status
+
+from db.redis import get_redis_key, redis_breaker
+from repositories.tokens import RedisTokenStore, SQLTokenStore
+from tests.test_security import access_token
+from utils.circuit import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpen,
+    DependencyTimeout,
+    DependencyUnavailable,
+    dependency_unavailable_handler,
+    guarded,
+)
+
+RESET = 0.05
+
+
+def breaker(**kwargs) -> CircuitBreaker:
+    options = {
+        "timeout": 0.05,
+        "failure_threshold": 2,
+        "reset_timeout": RESET,
+        "registry": None,
+    }
+    return CircuitBreaker("test", **{**options, **kwargs})
+
+
+async def fail() -> None:
+    raise ConnectionRefusedError()
+
+
+async def hang(*args) -> None:
+    await asyncio.sleep(10)
+
+
+async def ok() -> str:
+    return "ok"
+
+
+async def open_circuit(circuit: CircuitBreaker) -> None:
+    for _ in range(circuit.failure_threshold):
+        with pytest.raises(DependencyUnavailable):
+            await circuit.call(fail)
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_consecutive_failures():
+    circuit = breaker()
+    with pytest.raises(DependencyUnavailable) as exc_info:
+        await circuit.call(fail)
+    assert isinstance(exc_info.value.__cause__, ConnectionRefusedError)
+    assert circuit.state == CLOSED
+    assert await circuit.call(ok) == "ok"
+    assert circuit.consecutive == 0
+    await open_circuit(circuit)
+    assert circuit.state == OPEN
+    called = mock.AsyncMock()
+    with pytest.raises(CircuitOpen) as exc_info:
+        await circuit.call(called)
+    called.assert_not_called()
+    assert exc_info.value.retry_after >= 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_timeout_is_failure():
+    circuit = breaker()
+    with pytest.raises(DependencyTimeout):
+        await circuit.call(hang)
+    assert circuit.consecutive == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_passes_other_errors():
+    circuit = breaker()
+    with pytest.raises(DependencyUnavailable):
+        await circuit.call(fail)
+
+    async def invalid() -> None:
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        await circuit.call(invalid)
+    assert circuit.consecutive == 0
+
+
+@pytest.mark.asyncio
+async def test_breaker_half_open_trial():
+    circuit = breaker()
+    await open_circuit(circuit)
+    await asyncio.sleep(RESET)
+    assert circuit.state == HALF_OPEN
+    with pytest.raises(DependencyUnavailable):
+        await circuit.call(fail)
+    assert circuit.state == OPEN
+    await asyncio.sleep(RESET)
+    trial = asyncio.ensure_future(circuit.call(ok))
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitOpen):
+        await circuit.call(ok)
+    assert await trial == "ok"
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_breaker_nested_calls_share_deadline():
+    circuit = breaker()
+    await open_circuit(circuit)
+    await asyncio.sleep(RESET)
+
+    async def outer() -> str:
+        return await circuit.call(ok)
+
+    assert await circuit.call(outer) == "ok"
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_guarded_without_breaker():
+    class Client:
+        breaker = None
+
+        @guarded
+        async def call(self) -> None:
+            await fail()
+
+    with pytest.raises(ConnectionRefusedError):
+        await Client().call()
+    Client.breaker = breaker()
+    with pytest.raises(DependencyUnavailable):
+        await Client().call()
+
+
+@pytest.mark.asyncio
+async def test_dependency_unavailable_handler():
+    res = await dependency_unavailable_handler(None, CircuitOpen("redis", 2.5))
+    assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert res.headers["retry-after"] == "3"
+    res = await dependency_unavailable_handler(None, DependencyTimeout("db"))
+    assert "retry-after" not in res.headers
+
+
+@pytest.mark.asyncio
+async def test_redis_calls_are_guarded():
+    redis = mock.MagicMock()
+    redis.client.return_value.__aenter__.return_value.get = hang
+    with mock.patch.object(redis_breaker, "timeout", 0.01):
+        with pytest.raises(DependencyTimeout):
+            await get_redis_key(redis, "key")
+        redis.exists = mock.AsyncMock(side_effect=ConnectionError())
+        with pytest.raises(DependencyUnavailable):
+            await RedisTokenStore(redis).exists(access_token())
+    redis_breaker.consecutive = 0
+
+
+@pytest.mark.asyncio
+async def test_sql_token_store_guarded(engine):
+    store = SQLTokenStore(engine, breaker=breaker())
+    token = access_token()
+    await store.add(token, 60)
+    assert await store.exists(token)
+    with mock.patch.object(store, "engine") as broken:
+        broken.connect.side_effect = OSError()
+        with pytest.raises(DependencyUnavailable):
+            await store.exists(token)
+    assert store.breaker.consecutive == 1
@@ -0,0 +1,276 @@
+"""
+Test request deadlines propagation.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Iterator, List
+from unittest import mock
+
+import pytest
+from starlette import status
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from tests.test_circuit import breaker, hang
+from utils.deadline import (
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    check_deadline,
+    deadline_var,
+    parse_budgets,
+    remaining,
+)
+from utils.password import run_hashing_job
+
+
+@contextmanager
+def set_deadline(seconds: float) -> Iterator[None]:
+    token = deadline_var.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+
+class Client:
+    """ASGI client sending request body and disconnecting on demand."""
+
+    def __init__(self, body: List[bytes]) -> None:
+        self.body = list(body)
+        self.disconnect = asyncio.Event()
+        self.sent: List[dict] = []
+
+    async def receive(self) -> dict:
+        if self.body:
+            chunk = self.body.pop(0)
+            return {
+                "type": "http.request",
+                "body": chunk,
+                "more_body": bool(self.body),
+            }
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message: dict) -> None:
+        self.sent.append(message)
+
+    @property
+    def status(self) -> int:
+        return self.sent[0]["status"]
+
+
+def http_scope(path: str, headers=()) -> dict:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": list(headers),
+    }
+
+
+async def echo(scope, receive, send) -> None:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    await PlainTextResponse(body)(scope, receive, send)
+
+
+def test_parse_budgets():
+    assert parse_budgets("login:auth=2, debug:profile=0,,") == {
+        "login:auth": 2,
+        "debug:profile": 0,
+    }
+    assert parse_budgets("") == {}
+
+
+def test_remaining_and_check_deadline():
+    assert remaining() is None
+    assert check_deadline() is None
+    with set_deadline(5):
+        assert 4 < check_deadline() <= 5
+    with set_deadline(-1):
+        assert remaining() < 0
+        with pytest.raises(DeadlineExceeded):
+            check_deadline()
+
+
+def test_middleware_budget_of_route():
+    app = Starlette(
+        routes=[
+            Route("/slow", echo, name="slow"),
+            Route("/feed", echo, name="feed"),
+            Route("/other", echo, name="other"),
+        ]
+    )
+    middleware = DeadlineMiddleware(
+        app, default=10, budgets={"slow": 2, "feed": 0}, maximum=30
+    )
+
+    def budget(path: str, headers=()) -> float:
+        return middleware.budget({**http_scope(path, headers), "app": app})
+
+    assert budget("/slow") == 2
+    assert budget("/other") == 10
+    assert budget("/missing") == 10
+    assert budget("/feed") is None
+    assert budget("/slow", [(b"x-request-timeout", b"0.5")]) == 0.5
+    assert budget("/slow", [(b"x-request-timeout", b"120")]) == 30
+    assert budget("/slow", [(b"x-request-timeout", b"never")]) == 2
+    assert budget("/slow", [(b"x-request-timeout", b"0")]) == 2
+
+
+@pytest.mark.asyncio
+async def test_middleware_replays_body():
+    client = Client([b"a", b"b"])
+    middleware = DeadlineMiddleware(echo, default=5, budgets={})
+    await middleware(http_scope("/"), client.receive, client.send)
+    assert client.status == status.HTTP_200_OK
+    assert client.sent[1]["body"] == b"ab"
+
+
+@pytest.mark.asyncio
+async def test_middleware_deadline_exceeded():
+    seen = []
+
+    async def slow(scope, receive, send) -> None:
+        seen.append(remaining())
+        await asyncio.sleep(10)
+
+    client = Client([b""])
+    middleware = DeadlineMiddleware(slow, default=0.05, budgets={})
+    started = time.monotonic()
+    await middleware(http_scope("/"), client.receive, client.send)
+    assert time.monotonic() - started < 1
+    assert 0 < seen[0] <= 0.05
+    assert client.status == status.HTTP_504_GATEWAY_TIMEOUT
+    assert remaining() is None
+
+
+@pytest.mark.asyncio
+async def test_middleware_cancels_request_of_disconnected_client():
+    cancelled = asyncio.Event()
+
+    async def slow(scope, receive, send) -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    client = Client([b""])
+    middleware = DeadlineMiddleware(slow, default=0, budgets={})
+    request = asyncio.ensure_future(
+        middleware(http_scope("/"), client.receive, client.send)
+    )
+    await asyncio.sleep(0.01)
+    client.disconnect.set()
+    await asyncio.wait_for(request, 1)
+    assert cancelled.is_set()
+    assert client.sent == []
+
+
+@pytest.mark.asyncio
+async def test_middleware_propagates_errors():
+    async def broken(scope, receive, send) -> None:
+        raise RuntimeError()
+
+    client = Client([b""])
+    middleware = DeadlineMiddleware(broken, default=5, budgets={})
+    with pytest.raises(RuntimeError):
+        await middleware(http_scope("/"), client.receive, client.send)
+
+
+@pytest.mark.asyncio
+async def test_deadline_header(get_client, get_app):
+    res = await get_client.get(
+        get_app.url_path_for("health-live"),
+        headers={"x-request-timeout": "1"},
+    )
+    assert res.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_breaker_bounded_by_request_deadline():
+    circuit = breaker(timeout=5)
+    with set_deadline(0.02):
+        with pytest.raises(DeadlineExceeded):
+            await circuit.call(hang)
+    assert circuit.consecutive == 0
+    with set_deadline(-1):
+        with pytest.raises(DeadlineExceeded):
+            await circuit.call(hang)
+
+
+def test_apply_statement_timeout():
+    # engine creation of the application is patched after test collection
+    from db.database import apply_statement_timeout, forget_statement_timeout
+
+    conn = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), info={})
+    cursor = mock.MagicMock()
+    apply_statement_timeout(conn, cursor, "SELECT 1", None, None, False)
+    cursor.execute.assert_not_called()
+    with set_deadline(1.5):
+        deadline = deadline_var.get()
+        apply_statement_timeout(conn, cursor, "SELECT 1", None, None, False)
+        apply_statement_timeout(conn, cursor, "SELECT 1", None, None, False)
+        cursor.execute.assert_called_once()
+        setting = cursor.execute.call_args[0][0]
+        assert setting.startswith("SET statement_timeout = ")
+        assert 1000 < int(setting.rsplit(" ", 1)[1]) <= 1500
+        assert conn.info["statement_deadline"] == deadline
+        # budget is taken again once the set one overruns the deadline
+        with mock.patch("db.database.STATEMENT_TIMEOUT_SLACK", -1):
+            apply_statement_timeout(
+                conn, cursor, "SELECT 1", None, None, False
+            )
+        assert cursor.execute.call_count == 2
+    apply_statement_timeout(conn, cursor, "SELECT 1", None, None, False)
+    cursor.execute.assert_called_with("SET statement_timeout TO DEFAULT")
+    assert conn.info["statement_deadline"] is None
+    forget_statement_timeout(conn)
+    assert conn.info == {}
+    conn.dialect.name = "mariadb"
+    with set_deadline(1.5):
+        apply_statement_timeout(conn, cursor, "SELECT 1", None, None, False)
+    setting = cursor.execute.call_args[0][0]
+    assert setting.startswith("SET SESSION max_statement_time = ")
+    assert 1 < float(setting.rsplit(" ", 1)[1]) <= 1.5
+    conn.dialect.name = "sqlite"
+    with set_deadline(1):
+        apply_statement_timeout(conn, cursor, "SELECT 1", None, None, False)
+    assert cursor.execute.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_hashing_job_within_deadline():
+    assert await run_hashing_job(sum, [1, 2]) == 3
+    with set_deadline(-1):
+        with pytest.raises(DeadlineExceeded):
+            await run_hashing_job(sum, [1, 2])
+
+
+@pytest.mark.asyncio
+async def test_pending_hashing_job_cancelled():
+    release = threading.Event()
+    executor = ThreadPoolExecutor(1)
+    ran = []
+    with mock.patch("utils.password.password_executor", executor):
+        busy = asyncio.ensure_future(run_hashing_job(release.wait, 5))
+        await asyncio.sleep(0.01)
+        with set_deadline(0.02):
+            with pytest.raises(DeadlineExceeded):
+                await run_hashing_job(ran.append, 1)
+        release.set()
+        assert await busy
+    executor.shutdown(wait=True)
+    assert ran == []
@@ -0,0 +1,129 @@
+"""
+Test background dependencies health prober and readiness views.
+"""
+import asyncio
+from unittest import mock
+
+import pytest
+from starlette import status
+
+from tests.test_redis import async_return
+from utils.health import (
+    DependencyStatus,
+    HealthProber,
+    database_check,
+    redis_check,
+)
+
+
+async def ok_check():
+    pass
+
+
+async def failed_check():
+    raise ConnectionRefusedError("refused")
+
+
+async def slow_check():
+    await asyncio.sleep(1)
+
+
+@pytest.mark.asyncio
+async def test_prober_probe_all():
+    prober = HealthProber(
+        {"ok": ok_check, "failed": failed_check, "slow": slow_check},
+        interval=1,
+        timeout=0.01,
+    )
+    assert not prober.is_healthy()
+    await prober.probe_all()
+    assert prober.statuses["ok"].healthy
+    assert prober.statuses["failed"].error == (
+        "ConnectionRefusedError: refused"
+    )
+    assert prober.statuses["slow"].error == "timeout"
+    assert not prober.is_healthy()
+    snapshot = prober.snapshot()
+    assert snapshot["ok"]["healthy"]
+    assert not snapshot["slow"]["healthy"]
+
+
+@pytest.mark.asyncio
+async def test_prober_stale_status_is_unhealthy():
+    prober = HealthProber({"ok": ok_check}, interval=1, timeout=1)
+    await prober.probe_all()
+    assert prober.is_healthy()
+    prober.statuses["ok"].checked -= 10
+    assert not prober.is_healthy()
+
+
+@pytest.mark.asyncio
+async def test_prober_background_task():
+    check = mock.MagicMock(side_effect=lambda: async_return(None))
+    prober = HealthProber({"mocked": check}, interval=0.001, timeout=1)
+    prober.start()
+    await asyncio.sleep(0.05)
+    await prober.stop()
+    assert check.call_count > 1
+    assert prober.is_healthy()
+    await prober.stop()
+
+
+@pytest.mark.asyncio
+async def test_database_check(engine):
+    await database_check(engine)()
+
+
+@pytest.mark.asyncio
+async def test_redis_check():
+    redis = mock.MagicMock()
+    redis.ping.return_value = async_return(True)
+    await redis_check(redis)()
+    redis.ping.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_view_health_live(get_client, get_app):
+    with mock.patch(
+        "sqlalchemy.ext.asyncio.AsyncSession.execute"
+    ) as session_execute:
+        res = await get_client.get(get_app.url_path_for("health-live"))
+    assert res.status_code == status.HTTP_200_OK
+    session_execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_view_health_ready_200_ok(get_client, get_app):
+    prober = get_app.state.health
+    statuses = prober.statuses
+    prober.statuses = {
+        name: DependencyStatus(True, 0.001, statuses[name].checked)
+        for name in prober.checks
+    }
+    try:
+        res = await get_client.get(get_app.url_path_for("health-ready"))
+    finally:
+        prober.statuses = statuses
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json()["detail"] == "OK"
+    assert set(res.json()["dependencies"]) == {"database", "redis"}
+
+
+@pytest.mark.asyncio
+async def test_view_health_ready_503_unavailable(get_client, get_app):
+    prober = get_app.state.health
+    statuses = prober.statuses
+    prober.statuses = {
+        "database": DependencyStatus(
+            True, 0.001, statuses["database"].checked
+        ),
+        "redis": DependencyStatus(
+            False, 0.001, statuses["redis"].checked, "timeout"
+        ),
+    }
+    try:
+        res = await get_client.get(get_app.url_path_for("health-ready"))
+    finally:
+        prober.statuses = statuses
+    assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert res.json()["dependencies"]["redis"]["error"] == "timeout"
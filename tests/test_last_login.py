@@ -0,0 +1,66 @@
+"""
+Test last login write-behind buffer.
+"""
+import asyncio
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+
+from repositories.last_login import LastLoginBuffer, dropped, flush_batch_size
+from repositories.users import InMemoryUserRepository
+
+
+@pytest.mark.asyncio
+async def test_buffer_flush():
+    users = InMemoryUserRepository()
+    user = await users.create({"email": "a@example.com", "password": "p"})
+    buffer = LastLoginBuffer(users, max_size=10, interval=60)
+    when = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    buffer.record(user.id, when)
+    buffer.record(user.id, when)
+    assert await buffer.flush() == 1
+    assert flush_batch_size.value == 1
+    assert (await users.get_by_id(user.id)).last_login == when
+    assert await buffer.flush() == 0
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_bounded():
+    buffer = LastLoginBuffer(InMemoryUserRepository(), max_size=2, interval=60)
+    before = dropped.value
+    buffer.record(1)
+    buffer.record(2)
+    buffer.record(2)
+    buffer.record(3)
+    assert set(buffer.logins) == {1, 2}
+    assert dropped.value == before + 1
+    assert buffer._full.is_set()
+
+
+@pytest.mark.asyncio
+async def test_buffer_failed_flush_keeps_logins():
+    users = mock.MagicMock()
+    users.update_last_login.side_effect = ConnectionRefusedError()
+    buffer = LastLoginBuffer(users, max_size=10, interval=60)
+    buffer.record(1)
+    assert await buffer.flush() == 0
+    assert set(buffer.logins) == {1}
+    assert buffer.oldest is not None
+
+
+@pytest.mark.asyncio
+async def test_buffer_background_flush_and_stop():
+    users = InMemoryUserRepository()
+    buffer = LastLoginBuffer(users, max_size=2, interval=60)
+    first = await users.create({"email": "a@example.com", "password": "p"})
+    second = await users.create({"email": "b@example.com", "password": "p"})
+    buffer.start()
+    buffer.record(first.id)
+    buffer.record(second.id)
+    await asyncio.sleep(0.01)
+    assert not buffer.logins
+    assert (await users.get_by_id(first.id)).last_login
+    buffer.record(first.id)
+    await buffer.stop()
+    assert not buffer.logins
@@ -0,0 +1,56 @@
+"""
+Test event loop lag monitor.
+"""
+import asyncio
+import logging
+import time
+
+import pytest
+
+from utils.loop_monitor import LoopLagMonitor, loop_lag_seconds
+
+
+def block_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_logs_blocking_stack(caplog):
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.05, stack_limit=10)
+    count = loop_lag_seconds.count
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        with caplog.at_level(logging.WARNING, logger="utils.loop_monitor"):
+            block_loop(0.3)
+            await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+    blocked = [
+        record
+        for record in caplog.records
+        if record.getMessage().startswith("event loop blocked")
+    ]
+    assert len(blocked) == 1
+    assert "in block_loop\n" in blocked[0].getMessage()
+    assert "time.sleep(seconds)" in blocked[0].getMessage()
+    assert loop_lag_seconds.count > count
+    assert monitor._task is None and monitor._thread is None
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_check_not_blocked():
+    monitor = LoopLagMonitor(interval=10, threshold=0.05, stack_limit=10)
+    monitor.start()
+    try:
+        assert monitor.check() is None
+    finally:
+        await monitor.stop()
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_app(get_client, get_app):
+    assert get_app.state.loop_monitor._task is not None
+    res = await get_client.get(get_app.url_path_for("metrics"))
+    assert "event_loop_lag_seconds_count " in res.text
+    assert "event_loop_blocked_total " in res.text
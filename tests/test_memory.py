@@ -0,0 +1,81 @@
+"""
+Test allocations tracing endpoints and memory gauges.
+"""
+from types import SimpleNamespace
+
+import pytest
+from starlette import status
+
+from db.redis import pool_connections
+from tests.test_security import admin_headers
+from utils.memory import MemoryTracer
+
+
+def allocate() -> list:
+    return [bytearray(1024) for _ in range(1000)]
+
+
+def test_memory_tracer_diff():
+    tracer = MemoryTracer()
+    assert tracer.diff(10) is None
+    try:
+        assert tracer.start(frames=5)["tracing"]
+        kept = allocate()
+        stats = tracer.diff(10, rebase=True)
+        top = stats[0]
+        assert top["location"][0].startswith(__file__)
+        assert top["size_diff"] >= 1024 * 1000
+        assert top["count_diff"] >= 1000
+        rebased = tracer.diff(10, group_by="filename")
+        assert all(stat["size_diff"] < 1024 * 100 for stat in rebased)
+        del kept
+    finally:
+        status_ = tracer.stop()
+    assert not status_["tracing"]
+    assert tracer.diff(10) is None
+
+
+def test_pool_connections():
+    pool = SimpleNamespace(_in_use_connections={1, 2})
+    redis = SimpleNamespace(connection_pool=pool)
+    assert pool_connections(redis, "_in_use_connections") == 2
+    assert pool_connections(None, "_in_use_connections") == 0
+
+
+@pytest.mark.asyncio
+async def test_debug_memory_views(get_client, get_app):
+    headers = admin_headers()
+    diff_url = get_app.url_path_for("debug:memory-diff")
+    res = await get_client.get(diff_url, headers=headers)
+    assert res.status_code == status.HTTP_409_CONFLICT
+    res = await get_client.post(
+        get_app.url_path_for("debug:memory-start"),
+        params={"frames": 2},
+        headers=headers,
+    )
+    try:
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["frames"] == 2
+        res = await get_client.get(
+            diff_url, params={"limit": 3}, headers=headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["tracing"]
+        assert len(res.json()["stats"]) <= 3
+    finally:
+        res = await get_client.post(
+            get_app.url_path_for("debug:memory-stop"), headers=headers
+        )
+    assert res.json()["tracing"] is False
+    res = await get_client.get(
+        get_app.url_path_for("debug:memory"), headers=headers
+    )
+    assert res.json()["tracing"] is False
+
+
+@pytest.mark.asyncio
+async def test_memory_gauges(get_client, get_app):
+    res = await get_client.get(get_app.url_path_for("metrics"))
+    assert "sqlalchemy_session_identity_map_size " in res.text
+    assert "redis_pool_connections_in_use " in res.text
+    assert "redis_pool_connections_available " in res.text
@@ -0,0 +1,248 @@
+"""
+Test user change events outbox and relay.
+"""
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from unittest import mock
+
+import pytest
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette import status
+
+from config.outbox import OUTBOX_STREAM
+from repositories.outbox import (
+    OutboxRelay,
+    list_events,
+    outbox_table,
+    published_events,
+)
+from repositories.users import SQLUserRepository
+from tests.test_security import admin_headers
+
+
+class FakeRedis:
+    """Redis collecting stream entries added with pipelines."""
+
+    def __init__(self, error: Optional[Exception] = None) -> None:
+        self.entries: List[tuple] = []
+        self.error = error
+
+    def pipeline(self, transaction: bool = True) -> "FakeRedis":
+        return self
+
+    async def __aenter__(self):
+        self.queued = []
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        self.queued.append((name, fields))
+
+    async def execute(self):
+        if self.error:
+            raise self.error
+        self.entries.extend(self.queued)
+        return [b"0-1"] * len(self.queued)
+
+
+async def drain(relay: OutboxRelay) -> None:
+    while await relay.publish_batch():
+        pass
+
+
+async def last_event_id(engine: AsyncEngine) -> int:
+    async with engine.connect() as conn:
+        res = await conn.execute(select(func.max(outbox_table.c.id)))
+        return res.scalar() or 0
+
+
+async def last_position(engine: AsyncEngine) -> int:
+    await drain(OutboxRelay(engine, FakeRedis(), 100, 1, 3600))
+    async with engine.connect() as conn:
+        res = await conn.execute(select(func.max(outbox_table.c.position)))
+        return res.scalar() or 0
+
+
+def new_user_values() -> dict:
+    return {
+        "email": f"{uuid.uuid4().hex}@example.com",
+        "password": "password",
+        "is_active": True,
+    }
+
+
+@pytest.mark.asyncio
+async def test_changes_write_outbox_events(engine: AsyncEngine):
+    repository = SQLUserRepository(engine)
+    after = await last_position(engine)
+    created = await repository.create(new_user_values())
+    await repository.update(created.id, {"confirmed": True})
+    await repository.update(created.id, {})
+    await repository.update(99999, {"confirmed": True})
+    await repository.delete(created.id)
+    await repository.delete(created.id)
+    assert await list_events(engine, after, 100) == []
+    await last_position(engine)
+    events = await list_events(engine, after, 100)
+    assert [event.event for event in events] == [
+        "created",
+        "updated",
+        "deleted",
+    ]
+    assert {event.key for event in events} == {str(created.id)}
+    assert {event.topic for event in events} == {"user"}
+    assert events[0].payload["email"] == created.email
+    assert "password" not in events[0].payload
+    assert events[1].payload["confirmed"] is True
+    assert [event.id for event in events] == sorted(
+        event.id for event in events
+    )
+    next_page = await list_events(engine, events[0].position, 1)
+    assert [event.id for event in next_page] == [events[1].id]
+
+
+@pytest.mark.asyncio
+async def test_failed_change_writes_no_event(engine: AsyncEngine):
+    repository = SQLUserRepository(engine)
+    created = await repository.create(new_user_values())
+    after = await last_position(engine)
+    with pytest.raises(IntegrityError):
+        await repository.create({**new_user_values(), "email": created.email})
+    await last_position(engine)
+    assert await list_events(engine, after, 100) == []
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_batches_once(engine: AsyncEngine):
+    repository = SQLUserRepository(engine)
+    redis = FakeRedis()
+    relay = OutboxRelay(
+        engine, redis, batch_size=2, interval=1, retention=3600
+    )
+    await drain(relay)
+    after = await last_position(engine)
+    published = published_events.value
+    for _ in range(3):
+        await repository.create(new_user_values())
+    assert await relay.publish_batch() == 2
+    assert await relay.publish_batch() == 1
+    assert await relay.publish_batch() == 0
+    assert published_events.value == published + 3
+    ids = [int(fields["id"]) for _, fields in redis.entries[-3:]]
+    events = await list_events(engine, after, 9)
+    assert ids == [event.id for event in events]
+    assert [event.position for event in events] == [
+        after + 1,
+        after + 2,
+        after + 3,
+    ]
+    assert redis.entries[-1][1]["position"] == after + 3
+    name, fields = redis.entries[-1]
+    assert name == OUTBOX_STREAM
+    assert fields["event"] == "created"
+    assert json.loads(fields["payload"])["is_active"] is True
+
+
+@pytest.mark.asyncio
+async def test_relay_keeps_events_when_redis_fails(engine: AsyncEngine):
+    repository = SQLUserRepository(engine)
+    await drain(OutboxRelay(engine, FakeRedis(), 100, 1, 3600))
+    await repository.create(new_user_values())
+    failing = OutboxRelay(
+        engine, FakeRedis(ConnectionError("down")), 100, 1, 3600
+    )
+    with pytest.raises(ConnectionError):
+        await failing.publish_batch()
+    redis = FakeRedis()
+    assert await OutboxRelay(engine, redis, 100, 1, 3600).publish_batch() == 1
+    assert len(redis.entries) == 1
+
+
+@pytest.mark.asyncio
+async def test_relay_prunes_old_published_events(engine: AsyncEngine):
+    repository = SQLUserRepository(engine)
+    relay = OutboxRelay(engine, FakeRedis(), 100, 1, retention=3600)
+    await drain(relay)
+    await repository.create(new_user_values())
+    await drain(relay)
+    kept = await last_event_id(engine)
+    async with engine.begin() as conn:
+        await conn.execute(
+            update(outbox_table)
+            .where(outbox_table.c.id < kept)
+            .values(published=datetime.now(timezone.utc) - timedelta(days=1))
+        )
+    assert await relay.prune() > 0
+    assert [event.id for event in await list_events(engine, 0, 100)] == [kept]
+
+
+@pytest.mark.asyncio
+async def test_late_commit_replayed_after_higher_id(engine: AsyncEngine):
+    repository = SQLUserRepository(engine)
+    after = await last_position(engine)
+    await repository.create(new_user_values())
+    late_id = await last_event_id(engine)
+    await repository.create(new_user_values())
+    # event allocated first and committed last
+    async with engine.begin() as conn:
+        res = await conn.execute(
+            select(*outbox_table.c).where(outbox_table.c.id == late_id)
+        )
+        late = res.mappings().one()
+        await conn.execute(
+            delete(outbox_table).where(outbox_table.c.id == late_id)
+        )
+    await last_position(engine)
+    page = await list_events(engine, after, 100)
+    assert [event.id for event in page] == [late_id + 1]
+    async with engine.begin() as conn:
+        await conn.execute(insert(outbox_table).values(**late))
+    await last_position(engine)
+    page = await list_events(engine, page[-1].position, 100)
+    assert [event.id for event in page] == [late_id]
+
+
+@pytest.mark.asyncio
+async def test_relay_yields_positions_taken_concurrently(engine: AsyncEngine):
+    relay = OutboxRelay(engine, FakeRedis(), 100, 1, 3600)
+    taken = await last_position(engine)
+    await SQLUserRepository(engine).create(new_user_values())
+    # read before concurrent relay committed its position
+    stale = select(literal(taken - 1))
+    with mock.patch("repositories.outbox.select_last_position", stale):
+        assert await relay.publish_batch() == 0
+    assert relay.redis.entries == []
+    assert await relay.publish_batch() == 1
+    assert relay.redis.entries[0][1]["position"] == taken + 1
+
+
+@pytest.mark.asyncio
+async def test_view_user_events(get_client, get_app, engine: AsyncEngine):
+    after = await last_position(engine)
+    await SQLUserRepository(engine).create(new_user_values())
+    await last_position(engine)
+    res = await get_client.get(
+        get_app.url_path_for("users:events"),
+        params={"after": after, "limit": 10},
+        headers=admin_headers(),
+    )
+    assert res.status_code == status.HTTP_200_OK
+    data = res.json()
+    assert len(data["events"]) == 1
+    assert data["events"][0]["event"] == "created"
+    assert data["last_position"] == data["events"][0]["position"]
+    res = await get_client.get(
+        get_app.url_path_for("users:events"),
+        params={"after": data["last_position"]},
+        headers=admin_headers(),
+    )
+    assert res.json() == {
+        "events": [],
+        "last_position": data["last_position"],
+    }
@@ -0,0 +1,103 @@
+"""
+Test sampling profiler and profile endpoint.
+"""
+import asyncio
+import threading
+
+import pytest
+from starlette import status
+
+from tests.test_security import admin_headers
+from utils.profiler import SamplingProfiler
+
+
+def busy_work(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def profile_threads(idle: bool) -> SamplingProfiler:
+    stop = threading.Event()
+    busy = threading.Thread(target=busy_work, args=(stop,), name="busy")
+    waiting = threading.Thread(target=stop.wait, name="waiting")
+    busy.start()
+    waiting.start()
+    profiler = SamplingProfiler(0.005, idle)
+    profiler.start()
+    try:
+        while profiler.samples < 10:
+            stop.wait(0.01)
+    finally:
+        profiler.stop()
+        stop.set()
+        busy.join()
+        waiting.join()
+    return profiler
+
+
+def test_profiler_samples_busy_threads():
+    profiler = profile_threads(idle=False)
+    threads = {thread for thread, _ in profiler.stacks}
+    assert "busy" in threads
+    assert "waiting" not in threads
+    collapsed = profiler.collapsed()
+    assert any(
+        line.startswith("busy;") and "busy_work (" in line
+        for line in collapsed.splitlines()
+    )
+    assert all(
+        line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines()
+    )
+
+
+def test_profiler_idle_threads_and_speedscope():
+    profiler = profile_threads(idle=True)
+    assert "waiting" in {thread for thread, _ in profiler.stacks}
+    profile = profiler.speedscope()
+    frames = profile["shared"]["frames"]
+    assert {"name", "file", "line"} == set(frames[0])
+    assert "busy_work" in {frame["name"] for frame in frames}
+    for item in profile["profiles"]:
+        assert len(item["samples"]) == len(item["weights"])
+        assert all(
+            0 <= index < len(frames)
+            for sample in item["samples"]
+            for index in sample
+        )
+
+
+@pytest.mark.asyncio
+async def test_debug_profile_view(get_client, get_app):
+    url = get_app.url_path_for("debug:profile")
+    first, second = await asyncio.gather(
+        get_client.get(url, params={"seconds": 0.2}, headers=admin_headers()),
+        get_client.get(url, params={"seconds": 0.2}, headers=admin_headers()),
+    )
+    assert sorted([first.status_code, second.status_code]) == [
+        status.HTTP_200_OK,
+        status.HTTP_409_CONFLICT,
+    ]
+    res = await get_client.get(
+        url,
+        params={"seconds": 0.05, "output": "speedscope", "idle": True},
+        headers=admin_headers(),
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert "profiles" in res.json()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seconds", [0, 3600])
+async def test_debug_profile_seconds_limits(get_client, get_app, seconds):
+    res = await get_client.get(
+        get_app.url_path_for("debug:profile"),
+        params={"seconds": seconds},
+        headers=admin_headers(),
+    )
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_debug_profile_requires_admin(get_client, get_app):
+    res = await get_client.get(get_app.url_path_for("debug:profile"))
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
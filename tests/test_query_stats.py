@@ -0,0 +1,110 @@
+"""
+Test slow query log and aggregated statements stats.
+"""
+import logging
+from unittest import mock
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette import status
+
+from db.query_stats import (
+    QueryStats,
+    normalize_statement,
+    parameter_shape,
+    query_end,
+    query_error,
+    query_start,
+    query_stats,
+)
+from tests.test_security import admin_headers
+
+
+def test_normalize_statement():
+    assert normalize_statement("SELECT a FROM t WHERE id IN (?, ?, ?)") == (
+        "SELECT a FROM t WHERE id IN (...)"
+    )
+    assert normalize_statement("VALUES ($1,$2)") == "VALUES (...)"
+    assert normalize_statement("WHERE id = ?") == "WHERE id = ?"
+
+
+def test_parameter_shape_without_values():
+    assert parameter_shape({"email": "secret", "id": 1}) == {
+        "email": "str",
+        "id": "int",
+    }
+    assert parameter_shape(("secret", None)) == ["str", "NoneType"]
+    assert parameter_shape([(1,), (2,)], executemany=True) == {
+        "sets": 2,
+        "shape": ["int"],
+    }
+
+
+def test_stats_size_limit():
+    stats = QueryStats(size=1, threshold=1, explain_rate=0)
+    stats.record("SELECT 1", 0.5)
+    stats.record("SELECT 2", 2, error=True)
+    stats.record("SELECT 3", 0.1)
+    top = stats.top(10)
+    assert [item["statement"] for item in top] == ["<other>", "SELECT 1"]
+    assert top[0]["calls"] == 2
+    assert top[0]["errors"] == 1
+    assert top[0]["slow"] == 1
+    assert top[0]["max_ms"] == 2000
+    stats.reset()
+    assert stats.top(10) == []
+
+
+@pytest.mark.asyncio
+async def test_slow_query_logged_and_explained(caplog):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    event.listen(engine.sync_engine, "before_cursor_execute", query_start)
+    event.listen(engine.sync_engine, "after_cursor_execute", query_end)
+    event.listen(engine.sync_engine, "handle_error", query_error)
+    query_stats.reset()
+    caplog.set_level(logging.WARNING, logger="db.query_stats")
+    with mock.patch.object(query_stats, "threshold", 0), mock.patch.object(
+        query_stats, "explain_rate", 1
+    ):
+        async with engine.connect() as conn:
+            await conn.execute(text("CREATE TABLE t (id INTEGER, name TEXT)"))
+            await conn.execute(
+                text("SELECT id FROM t WHERE name = :name"),
+                {"name": "secret-value"},
+            )
+            with pytest.raises(OperationalError):
+                await conn.execute(text("SELECT * FROM missing"))
+    await engine.dispose()
+    stats = {item["statement"]: item for item in query_stats.top(10)}
+    select = stats["SELECT id FROM t WHERE name = ?"]
+    assert select["calls"] == 1
+    assert select["slow"] == 1
+    assert any("SCAN" in line for line in select["plan"])
+    assert stats["SELECT * FROM missing"]["errors"] == 1
+    assert "secret-value" not in caplog.text
+    assert "['str']" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_debug_queries_view(get_client, get_app):
+    query_stats.reset()
+    query_stats.record("SELECT 1", 0.002)
+    query_stats.record("SELECT 2", 0.001)
+    query_stats.record("SELECT 2", 0.001)
+    url = get_app.url_path_for("debug:queries")
+    res = await get_client.get(
+        url, params={"order": "calls", "limit": 1}, headers=admin_headers()
+    )
+    assert res.status_code == status.HTTP_200_OK
+    (statement,) = res.json()["statements"]
+    assert statement["statement"] == "SELECT 2"
+    assert statement["calls"] == 2
+    res = await get_client.delete(
+        get_app.url_path_for("debug:queries-reset"), headers=admin_headers()
+    )
+    assert res.status_code == status.HTTP_204_NO_CONTENT
+    assert query_stats.top(10) == []
+    res = await get_client.get(url)
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,143 @@
+"""
+Test redis cluster mode against local redis-server processes.
+
+Three cluster masters are started on free ports when ``redis-server``
+and ``redis-cli`` are installed, tests are skipped otherwise.
+"""
+import shutil
+import socket
+import subprocess
+import time
+from typing import Iterator, List
+
+import pytest
+
+from db.keys import revoked_key
+from db.redis import create_redis, get_redis_key, set_redis_key
+from db.revocation import disable_user, revoke_token, tokens_active
+from repositories.tokens import RedisTokenStore
+from utils.auth import create_access_token, decode_token
+
+pytestmark = pytest.mark.skipif(
+    not (shutil.which("redis-server") and shutil.which("redis-cli")),
+    reason="requires redis-server and redis-cli",
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(command: List[str], expected: str, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = subprocess.run(command, capture_output=True, text=True)
+        if expected in result.stdout:
+            return
+        time.sleep(0.1)
+    raise TimeoutError(" ".join(command))
+
+
+@pytest.fixture(scope="module")
+def cluster_url(tmp_path_factory) -> Iterator[str]:
+    """Start three masters cluster and get url of its first node."""
+    directory = tmp_path_factory.mktemp("redis-cluster")
+    ports = [free_port() for _ in range(3)]
+    servers = [
+        subprocess.Popen(
+            [
+                "redis-server",
+                "--port",
+                str(port),
+                "--cluster-enabled",
+                "yes",
+                "--cluster-config-file",
+                f"nodes-{port}.conf",
+                "--dir",
+                str(directory),
+                "--save",
+                "",
+                "--appendonly",
+                "no",
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        for port in ports
+    ]
+    try:
+        for port in ports:
+            wait_for(["redis-cli", "-p", str(port), "ping"], "PONG")
+        nodes = [f"127.0.0.1:{port}" for port in ports]
+        subprocess.run(
+            [
+                "redis-cli",
+                "--cluster",
+                "create",
+                *nodes,
+                "--cluster-replicas",
+                "0",
+                "--cluster-yes",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        wait_for(
+            ["redis-cli", "-p", str(ports[0]), "cluster", "info"],
+            "cluster_state:ok",
+        )
+        yield f"redis://127.0.0.1:{ports[0]}"
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+
+def user_token(user_id: int, token_type: str) -> str:
+    return create_access_token(
+        {
+            "id": user_id,
+            "jti": f"{token_type}-{user_id}",
+            "token_type": token_type,
+        },
+        None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_cluster_keys_and_revocation(cluster_url):
+    client = create_redis("cluster", cluster_url)
+    try:
+        assert await set_redis_key(client, "key", "value", 60)
+        assert await get_redis_key(client, "key") == b"value"
+        store = RedisTokenStore(client)
+        tokens = [
+            user_token(user_id, token_type)
+            for user_id in range(1, 6)
+            for token_type in ("access_token", "refresh_token")
+        ]
+        claims = [decode_token(token) for token in tokens]
+        for token in tokens[1::2]:
+            await store.add(token, 60)
+        assert await store.exists_many(tokens[1::2]) == [True] * 5
+        assert await revoke_token(client, "access_token-2", 60, user_id=2)
+        assert await client.exists(revoked_key("access_token-2", 2))
+        assert await disable_user(client, 3)
+        active = await tokens_active(client, tokens, claims, store)
+        assert active == [
+            True,
+            True,
+            False,
+            True,
+            False,
+            False,
+            True,
+            True,
+            True,
+            True,
+        ]
+        assert await store.delete(tokens[1])
+        assert not await store.exists(tokens[1])
+    finally:
+        await client.close()
@@ -0,0 +1,133 @@
+"""
+Test redis cluster and sentinel modes and keys layout.
+"""
+from unittest import mock
+
+import pytest
+import redis.asyncio as redis
+from redis.crc import key_slot
+
+from config.connection import REDIS_CONNECT_TIMEOUT, REDIS_SOCKET_TIMEOUT
+from db.keys import disabled_key, refresh_key, revoked_key
+from db.redis import (
+    create_redis,
+    get_redis_key,
+    parse_sentinels,
+    reads_legacy_keys,
+    redis_connection,
+)
+from db.revocation import revoke_token, tokens_active
+from repositories.tokens import RedisTokenStore
+from tests.test_redis import async_return
+from tests.test_security import access_token
+from tests.test_token_store import FakeRedis
+from utils.auth import decode_token
+from utils.warmup import warmup_redis
+
+
+def cluster_mock() -> mock.MagicMock:
+    return mock.MagicMock(spec=redis.RedisCluster)
+
+
+def test_user_keys_share_slot():
+    claims = {"id": 42, "jti": "abc"}
+    slots = {
+        key_slot(key.encode())
+        for key in (
+            refresh_key(claims, "token"),
+            revoked_key("abc", 42),
+            revoked_key("other", 42),
+            disabled_key(42),
+        )
+    }
+    assert len(slots) == 1
+    assert key_slot(disabled_key(43).encode()) not in slots
+
+
+def test_keys_without_user():
+    assert revoked_key("abc") == "revoked:abc"
+    assert refresh_key({}, "token") == refresh_key({"id": 1}, "token")
+    assert refresh_key({}, "token") != refresh_key({}, "other")
+
+
+@pytest.mark.asyncio
+async def test_legacy_keys_read():
+    redis_pool = FakeRedis()
+    store = RedisTokenStore(redis_pool)
+    token = access_token(token_type="refresh_token")
+    claims = decode_token(token)
+    # refresh token stored before upgrade
+    await redis_pool.set(token, "1", ex=60)
+    assert await store.exists(token)
+    assert await tokens_active(redis_pool, [token], [claims]) == [True]
+    with mock.patch("db.redis.REDIS_LEGACY_KEYS", False):
+        assert not await store.exists(token)
+        assert await tokens_active(redis_pool, [token], [claims]) == [False]
+    assert await store.delete(token)
+    assert not await store.exists(token)
+    assert not reads_legacy_keys(cluster_mock())
+
+
+def test_parse_sentinels():
+    assert parse_sentinels("a:26379, b:26380,") == [
+        ("a", 26379),
+        ("b", 26380),
+    ]
+
+
+def test_create_redis_modes():
+    with mock.patch("db.redis.redis.from_url") as from_url:
+        assert create_redis("standalone", "redis://a") is from_url.return_value
+    with mock.patch("db.redis.redis.RedisCluster") as cluster:
+        client = create_redis("cluster", "redis://a:7000")
+    assert client is cluster.from_url.return_value
+    cluster.from_url.assert_called_once_with(
+        "redis://a:7000",
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+    )
+    with mock.patch("db.redis.redis.Sentinel") as sentinel, mock.patch(
+        "db.redis.REDIS_SENTINELS", "s1:26379,s2:26379"
+    ), mock.patch("db.redis.REDIS_SENTINEL_SERVICE", "auth"):
+        client = create_redis("sentinel", "redis://:secret@ignored:1/2")
+    sentinel.assert_called_once_with(
+        [("s1", 26379), ("s2", 26379)],
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+    )
+    sentinel.return_value.master_for.assert_called_once_with(
+        "auth", password="secret", db=2
+    )
+    assert client is sentinel.return_value.master_for.return_value
+    with pytest.raises(ValueError):
+        create_redis("replicated", None)
+
+
+@pytest.mark.asyncio
+async def test_cluster_commands_without_dedicated_connection():
+    client = cluster_mock()
+    client.get.return_value = async_return(b"1")
+    async with redis_connection(client) as conn:
+        assert conn is client
+    # cluster client has no client() to take a connection with
+    assert await get_redis_key(client, "key") == b"1"
+
+
+@pytest.mark.asyncio
+async def test_cluster_revoke_without_transaction():
+    client = cluster_mock()
+    pipe = mock.MagicMock()
+    pipe.execute.return_value = async_return([True, b"1-0"])
+    client.pipeline.return_value.__aenter__.return_value = pipe
+    assert await revoke_token(client, "abc", 60, user_id=5)
+    client.pipeline.assert_called_once_with(transaction=False)
+    pipe.set.assert_called_once_with(revoked_key("abc", 5), "1", ex=60)
+    assert pipe.xadd.call_args[0][1]["user_id"] == 5
+
+
+@pytest.mark.asyncio
+async def test_warmup_redis_cluster():
+    client = cluster_mock()
+    client.initialize.return_value = async_return(client)
+    await warmup_redis(client, 4)
+    client.initialize.assert_called_once()
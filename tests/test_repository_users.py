@@ -0,0 +1,236 @@
+"""
+Test users repositories.
+"""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette import status
+
+from repositories.users import (
+    InMemoryUserRepository,
+    SQLUserRepository,
+    UserRecord,
+    UserRepository,
+    VersionConflict,
+    get_user_repository,
+)
+from tests.test_circuit import breaker, open_circuit
+from tests.test_security import admin_headers
+
+
+@pytest_asyncio.fixture(params=["memory", "sql"])
+async def repository(request, engine: AsyncEngine) -> UserRepository:
+    """Create users repository of every implementation.
+
+    Args:
+        request: pytest fixture request with implementation name
+        engine: async database engine with applied migrations
+
+    Returns:
+        users repository
+    """
+    if request.param == "memory":
+        return InMemoryUserRepository()
+    return SQLUserRepository(engine)
+
+
+def new_user_values(**kwargs) -> dict:
+    """Generate attributes of a new user."""
+    return {
+        "email": f"{uuid.uuid4().hex}@example.com",
+        "password": "password",
+        "is_active": True,
+        **kwargs,
+    }
+
+
+def test_user_record_slots():
+    """Test user record has no instance dict."""
+    record = UserRecord(id=1, email="test@example.com")
+    assert not hasattr(record, "__dict__")
+    assert record.as_dict()["email"] == "test@example.com"
+    assert record == UserRecord(id=1, email="test@example.com")
+    assert record != UserRecord(id=2, email="test@example.com")
+
+
+@pytest.mark.asyncio
+async def test_repository_create_and_get(repository: UserRepository):
+    values = new_user_values()
+    created = await repository.create(values)
+    assert isinstance(created, UserRecord)
+    assert created.id
+    assert created.email == values["email"]
+    assert created.is_active
+    assert created.is_superuser is False
+    assert created.confirmed is False
+    assert created.created is not None
+    assert created.last_login is None
+    assert await repository.get_by_id(created.id) == created
+    assert await repository.get_by_email(created.email) == created
+
+
+@pytest.mark.asyncio
+async def test_repository_get_not_found(repository: UserRepository):
+    assert await repository.get_by_id(99999) is None
+    assert await repository.get_by_email("not-exists@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_repository_get_list(repository: UserRepository):
+    first = await repository.create(new_user_values())
+    second = await repository.create(new_user_values())
+    found = await repository.get_list(0, 10000)
+    ids = [user.id for user in found]
+    assert first.id in ids
+    assert second.id in ids
+    assert ids == sorted(ids)
+    assert len(await repository.get_list(0, 1)) == 1
+
+
+@pytest.mark.asyncio
+async def test_repository_update(repository: UserRepository):
+    created = await repository.create(new_user_values())
+    email = f"{uuid.uuid4().hex}@example.com"
+    updated = await repository.update(
+        created.id, {"email": email, "confirmed": True}
+    )
+    assert updated.id == created.id
+    assert updated.email == email
+    assert updated.confirmed
+    assert await repository.get_by_email(email) == updated
+    assert await repository.update(created.id, {}) == updated
+    assert await repository.update(99999, {"confirmed": True}) is None
+
+
+@pytest.mark.asyncio
+async def test_repository_delete(repository: UserRepository):
+    created = await repository.create(new_user_values())
+    deleted = await repository.delete(created.id)
+    assert deleted == created
+    assert await repository.get_by_id(created.id) is None
+    assert await repository.delete(created.id) is None
+
+
+@pytest.mark.asyncio
+async def test_views_with_in_memory_repository(
+    get_client: AsyncClient, get_app: FastAPI
+):
+    """Test views work with any repository implementation.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+    """
+    repository = InMemoryUserRepository()
+    get_app.dependency_overrides[get_user_repository] = lambda: repository
+    try:
+        res = await get_client.post(
+            get_app.url_path_for("users:post"),
+            json={"email": "memory@example.com", "password": "password"},
+            headers=admin_headers(),
+        )
+        assert res.status_code == status.HTTP_201_CREATED
+        user_id = res.json()["id"]
+        res = await get_client.get(
+            get_app.url_path_for("users:get-by-id", user_id=str(user_id)),
+            headers=admin_headers(),
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["email"] == "memory@example.com"
+    finally:
+        get_app.dependency_overrides.clear()
+    found = await repository.get_by_email("memory@example.com")
+    assert found.id == user_id
+
+
+@pytest.mark.asyncio
+async def test_repository_update_last_login(repository: UserRepository):
+    first = await repository.create(new_user_values())
+    second = await repository.create(new_user_values())
+    first_login = datetime(2021, 1, 1, 10, 0, tzinfo=timezone.utc)
+    second_login = datetime(2021, 1, 2, 10, 0, tzinfo=timezone.utc)
+    updated = await repository.update_last_login(
+        {first.id: first_login, second.id: second_login, 99999: first_login}
+    )
+    assert updated == 2
+    found = await repository.get_by_id(first.id)
+    assert found.last_login.replace(tzinfo=timezone.utc) == first_login
+    found = await repository.get_by_id(second.id)
+    assert found.last_login.replace(tzinfo=timezone.utc) == second_login
+    assert await repository.update_last_login({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_sql_update_last_login_chunks(engine: AsyncEngine):
+    circuit = breaker()
+    await open_circuit(circuit)
+    repository = SQLUserRepository(engine, breaker=circuit, last_login_chunk=2)
+    users = [
+        await SQLUserRepository(engine).create(new_user_values())
+        for _ in range(5)
+    ]
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("UPDATE"):
+            statements.append(statement)
+
+    now = datetime.now(timezone.utc)
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        # background flush isn't rejected by open request circuit
+        updated = await repository.update_last_login(
+            {user.id: now for user in users}
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    assert updated == 5
+    assert len(statements) == 3
+
+
+@pytest.mark.asyncio
+async def test_repository_get_many(repository: UserRepository):
+    first = await repository.create(new_user_values())
+    second = await repository.create(new_user_values())
+    found = await repository.get_many([second.id, 99999, first.id])
+    assert found == {first.id: first, second.id: second}
+    assert await repository.get_many([]) == {}
+
+
+@pytest.mark.asyncio
+async def test_repository_version(repository: UserRepository):
+    created = await repository.create(new_user_values())
+    assert created.version == 1
+    assert await repository.get_version(created.id) == 1
+    updated = await repository.update(created.id, {"confirmed": True})
+    assert updated.version == 2
+    await repository.update_last_login(
+        {created.id: datetime.now(timezone.utc)}
+    )
+    assert await repository.get_version(created.id) == 2
+    assert await repository.get_version(99999) is None
+    versions = await repository.get_list_versions(0, 10000)
+    assert (created.id, 2) in versions
+
+
+@pytest.mark.asyncio
+async def test_repository_update_versions(repository: UserRepository):
+    created = await repository.create(new_user_values())
+    updated = await repository.update(
+        created.id, {"confirmed": True}, versions=[created.version]
+    )
+    assert updated.version == created.version + 1
+    with pytest.raises(VersionConflict):
+        await repository.update(
+            created.id, {"confirmed": False}, versions=[created.version]
+        )
+    with pytest.raises(VersionConflict):
+        await repository.update(created.id, {}, versions=[])
+    assert (await repository.get_by_id(created.id)).confirmed
+    assert await repository.update(99999, {"confirmed": True}, [1]) is None
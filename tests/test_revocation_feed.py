@@ -0,0 +1,254 @@
+"""
+Test revocation stream and server-sent events feed.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+from unittest import mock
+
+import pytest
+from starlette import status
+
+from db.revocation import (
+    RevocationFeed,
+    disable_user,
+    disabled_key,
+    is_retained,
+    read_events,
+    revoke_token,
+    revoked_key,
+    snapshot,
+    stream_id,
+)
+from tests.test_security import admin_headers
+from views.revocations import revocations_feed
+
+Entry = Tuple[bytes, Dict[bytes, bytes]]
+
+
+def entry_id(entry: Entry) -> Tuple[int, int]:
+    milliseconds, sequence = entry[0].split(b"-")
+    return int(milliseconds), int(sequence)
+
+
+def bound(value: str) -> Tuple[Tuple[int, int], bool]:
+    exclusive = value.startswith("(")
+    milliseconds, _, sequence = value.lstrip("(").partition("-")
+    return (int(milliseconds), int(sequence or 0)), exclusive
+
+
+class FakeStreamRedis:
+    """In memory redis supporting commands used by revocation module."""
+
+    def __init__(self) -> None:
+        self.keys: Dict[str, Tuple[str, int]] = {}
+        self.entries: List[Entry] = []
+        self.added = asyncio.Event()
+        self.reads = 0
+
+    def store(self, key: str, value: str, ex: int) -> bool:
+        self.keys[key] = (value, ex)
+        return True
+
+    def xadd(self, name, fields, minid=None, approximate=True) -> bytes:
+        last = entry_id(self.entries[-1]) if self.entries else (0, 0)
+        now = int(time.time() * 1000)
+        new = (now, 0) if now > last[0] else (last[0], last[1] + 1)
+        key = f"{new[0]}-{new[1]}".encode()
+        self.entries.append(
+            (key, {k.encode(): str(v).encode() for k, v in fields.items()})
+        )
+        self.added.set()
+        return key
+
+    def select(self, low: str = "-", high: str = "+") -> List[Entry]:
+        found = []
+        for entry in self.entries:
+            if low != "-":
+                limit, exclusive = bound(low)
+                if entry_id(entry) < limit or (
+                    exclusive and entry_id(entry) == limit
+                ):
+                    continue
+            if high != "+" and entry_id(entry) > bound(high)[0]:
+                continue
+            found.append(entry)
+        return found
+
+    async def xrange(self, name, min="-", max="+", count=None):
+        return self.select(min, max)
+
+    async def xrevrange(self, name, max="+", min="-", count=None):
+        return list(reversed(self.select(min, max)))[:count]
+
+    async def xread(self, streams: dict, count=None, block=None):
+        self.reads += 1
+        ((name, last),) = streams.items()
+        found = self.select(f"({last}")
+        if not found:
+            self.added.clear()
+            try:
+                await asyncio.wait_for(self.added.wait(), block / 1000)
+            except asyncio.TimeoutError:
+                return []
+            found = self.select(f"({last}")
+        return [[name.encode(), found[:count]]]
+
+    def pipeline(self, transaction=True) -> "FakeStreamPipeline":
+        return FakeStreamPipeline(self)
+
+
+class FakeStreamPipeline:
+    """Pipeline of fake redis executing commands on execute."""
+
+    def __init__(self, redis: FakeStreamRedis) -> None:
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def set(self, key, value, ex=None):
+        self.commands.append(lambda: self.redis.store(key, value, ex))
+
+    def xadd(self, *args, **kwargs):
+        self.commands.append(lambda: self.redis.xadd(*args, **kwargs))
+
+    async def execute(self):
+        return [command() for command in self.commands]
+
+
+@pytest.mark.asyncio
+async def test_revoke_token_and_disable_user():
+    redis = FakeStreamRedis()
+    assert await revoke_token(redis, "abc", 60)
+    assert await disable_user(redis, 7)
+    assert redis.keys[revoked_key("abc")] == ("1", 60)
+    assert disabled_key(7) in redis.keys
+    events = await read_events(redis, "0-0")
+    assert [fields["type"] for _, fields in events] == ["token", "user"]
+    assert events[0][1]["jti"] == "abc"
+    assert events[1][1]["user_id"] == "7"
+    assert await read_events(redis, events[-1][0]) == []
+
+
+@pytest.mark.asyncio
+async def test_snapshot_compacts_events():
+    redis = FakeStreamRedis()
+    now = int(time.time())
+    redis.xadd("s", {"type": "token", "jti": "old", "exp": now - 1})
+    redis.xadd("s", {"type": "token", "jti": "abc", "exp": now + 10})
+    redis.xadd("s", {"type": "token", "jti": "abc", "exp": now + 20})
+    redis.xadd("s", {"type": "user", "user_id": 7, "exp": now + 30})
+    last_id, data = await snapshot(redis)
+    assert last_id == redis.entries[-1][0].decode()
+    assert data == {
+        "tokens": [{"jti": "abc", "exp": now + 20}],
+        "users": [{"user_id": 7, "exp": now + 30}],
+    }
+    assert await snapshot(FakeStreamRedis()) == (
+        "0-0",
+        {"tokens": [], "users": []},
+    )
+
+
+def test_is_retained():
+    assert is_retained(stream_id(time.time()))
+    assert not is_retained("0-0")
+    assert not is_retained("not-an-id")
+
+
+@pytest.mark.asyncio
+async def test_feed_fan_out_and_stop_reading():
+    redis = FakeStreamRedis()
+    redis.xadd("s", {"type": "token", "jti": "before"})
+    feed = RevocationFeed(redis, queue_size=10, block=0.05)
+    first = await feed.subscribe()
+    second = await feed.subscribe()
+    redis.xadd("s", {"type": "token", "jti": "after"})
+    event = await asyncio.wait_for(first.queue.get(), 1)
+    assert event[1] == {"type": "token", "jti": "after"}
+    assert (await asyncio.wait_for(second.queue.get(), 1)) == event
+    feed.unsubscribe(first)
+    feed.unsubscribe(second)
+    await asyncio.sleep(0.1)
+    reads = redis.reads
+    await asyncio.sleep(0.1)
+    assert redis.reads == reads
+
+
+@pytest.mark.asyncio
+async def test_feed_drops_lagged_subscriber():
+    feed = RevocationFeed(FakeStreamRedis(), queue_size=1, block=0.05)
+    subscription = await feed.subscribe()
+    feed.publish(("1-0", {}))
+    feed.publish(("2-0", {}))
+    assert subscription.lagged
+    assert subscription not in feed.subscribers
+    await feed.stop()
+
+
+def feed_request(redis: FakeStreamRedis, feed: RevocationFeed):
+    state = SimpleNamespace(redis=redis, revocation_feed=feed)
+    return SimpleNamespace(app=SimpleNamespace(state=state))
+
+
+@pytest.mark.asyncio
+async def test_revocations_feed_snapshot_then_events():
+    redis = FakeStreamRedis()
+    await revoke_token(redis, "abc", 60)
+    feed = RevocationFeed(redis, queue_size=10, block=0.05)
+    response = await revocations_feed(feed_request(redis, feed), None)
+    assert response.media_type == "text/event-stream"
+    events = response.body_iterator
+    first = await events.__anext__()
+    assert first.startswith(f"id: {redis.entries[0][0].decode()}\n")
+    assert "event: snapshot\n" in first
+    assert '"jti":"abc"' in first
+    await disable_user(redis, 7)
+    second = await asyncio.wait_for(events.__anext__(), 1)
+    assert f"id: {redis.entries[1][0].decode()}\n" in second
+    assert "event: revoke\n" in second
+    assert '"user_id":7' in second
+    await events.aclose()
+    assert not feed.subscribers
+
+
+@pytest.mark.asyncio
+async def test_revocations_feed_resume_after_last_event_id():
+    redis = FakeStreamRedis()
+    await revoke_token(redis, "seen", 60)
+    await revoke_token(redis, "missed", 60)
+    feed = RevocationFeed(redis, queue_size=10, block=0.05)
+    seen = redis.entries[0][0].decode()
+    response = await revocations_feed(feed_request(redis, feed), seen)
+    events = response.body_iterator
+    first = await events.__anext__()
+    assert "event: snapshot" not in first
+    assert '"jti":"missed"' in first
+    assert '"jti":"seen"' not in first
+    await events.aclose()
+
+
+@pytest.mark.asyncio
+async def test_revocations_feed_requires_admin(get_client, get_app):
+    res = await get_client.get(get_app.url_path_for("revocations:feed"))
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_revocations_feed_redis_failure(get_client, get_app):
+    feed = get_app.state.revocation_feed
+    with mock.patch.object(
+        feed.redis, "xrevrange", side_effect=ConnectionError("refused")
+    ):
+        with pytest.raises(ConnectionError):
+            await get_client.get(
+                get_app.url_path_for("revocations:feed"),
+                headers=admin_headers(),
+            )
+    assert not feed.subscribers
@@ -0,0 +1,129 @@
+"""
+Test bearer token authorization dependency.
+"""
+import time
+import uuid
+from datetime import timedelta
+from typing import List, Optional
+from unittest import mock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette import status
+
+from tests.test_redis import async_return
+from utils.auth import create_access_token
+from utils.security import TokenCache
+
+
+def access_token(
+    scope: Optional[List[str]] = None,
+    token_type: str = "access_token",
+    expires: int = 300,
+) -> str:
+    """Create signed token of testing user.
+
+    Args:
+        scope: granted scopes, None - no scope claim
+        token_type: token type claim
+        expires: token ttl in seconds
+
+    Returns:
+        encoded token
+    """
+    claims = {
+        "id": 1,
+        "email": "admin@example.com",
+        "jti": uuid.uuid4().hex,
+        "token_type": token_type,
+    }
+    if scope is not None:
+        claims["scope"] = scope
+    return create_access_token(claims, timedelta(seconds=expires))
+
+
+def bearer(token: str) -> dict:
+    """Create authorization header with bearer token."""
+    return {"Authorization": f"Bearer {token}"}
+
+
+def admin_headers() -> dict:
+    """Create authorization header with admin access token."""
+    return bearer(access_token(["admin"]))
+
+
+def test_token_cache_expiry_and_eviction():
+    cache = TokenCache(max_size=2)
+    now = time.time()
+    cache.set("first", {"exp": now + 60})
+    cache.set("expired", {"exp": now - 1})
+    assert cache.get("first") == {"exp": now + 60}
+    assert cache.get("expired") is None
+    assert len(cache) == 1
+    cache.set("second", {"exp": now + 60})
+    cache.set("third", {"exp": now + 60})
+    assert len(cache) == 2
+    assert cache.get("first") is None
+    assert cache.get("third") is not None
+    cache.clear()
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {},
+        {"Authorization": "Basic dXNlcjpwYXNz"},
+        bearer("not-a-token"),
+        bearer(access_token(["admin"], expires=-10)),
+        bearer(access_token(["admin"], token_type="refresh_token")),
+    ],
+)
+async def test_authorize_401_unauthorized(get_client, get_app, headers):
+    res = await get_client.get(
+        get_app.url_path_for("users:get"), headers=headers
+    )
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
+    assert res.headers["WWW-Authenticate"] == 'Bearer scope="admin"'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scope", [None, [], ["user"]])
+async def test_authorize_403_forbidden_without_database(
+    get_client, get_app, scope
+):
+    with mock.patch.object(
+        AsyncEngine, "connect", autospec=True, side_effect=AsyncEngine.connect
+    ) as connect:
+        res = await get_client.get(
+            get_app.url_path_for("users:get"),
+            headers=bearer(access_token(scope)),
+        )
+    assert res.status_code == status.HTTP_403_FORBIDDEN
+    connect.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_authorize_uses_token_cache(get_client, get_app):
+    headers = admin_headers()
+    url = get_app.url_path_for("users:get-by-id", user_id="9999")
+    res = await get_client.get(url, headers=headers)
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+    with mock.patch("utils.security.decode_token") as decode:
+        res = await get_client.get(url, headers=headers)
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+    decode.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_authorize_checks_revocation(get_client, get_app):
+    revocation = mock.MagicMock()
+    revocation.is_revoked.side_effect = lambda jti, user_id: async_return(True)
+    with mock.patch.object(get_app.state, "revocation", revocation):
+        res = await get_client.get(
+            get_app.url_path_for("users:get-by-id", user_id="9999"),
+            headers=admin_headers(),
+        )
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
+    revocation.is_revoked.assert_called_once()
@@ -0,0 +1,146 @@
+"""
+Test production server supervisor.
+"""
+import logging
+import signal
+import socket
+import time
+from unittest import mock
+
+import pytest
+
+from server import (
+    Supervisor,
+    create_socket,
+    max_requests,
+    parse_args,
+    reuse_port_supported,
+    select_http,
+    select_loop,
+)
+
+
+def sleeping_worker(notify):
+    notify()
+    time.sleep(60)
+
+
+def exiting_worker(notify):
+    pass
+
+
+def silent_worker(notify):
+    time.sleep(60)
+
+
+def wait_for(supervisor: Supervisor, predicate, timeout: float = 10) -> None:
+    """Run supervisor loop until predicate is true."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "supervisor timed out"
+        supervisor.step()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def supervisor():
+    supervisors = []
+
+    def create(worker, workers):
+        instance = Supervisor(worker, workers=workers, graceful_timeout=5)
+        instance.running = True
+        supervisors.append(instance)
+        return instance
+
+    yield create
+    for instance in supervisors:
+        instance.stop()
+
+
+def test_select_implementations():
+    with mock.patch("importlib.util.find_spec", return_value=None):
+        assert select_loop() == "asyncio"
+        assert select_http() == "h11"
+    with mock.patch("importlib.util.find_spec", return_value=object()):
+        assert select_loop() == "uvloop"
+        assert select_http() == "httptools"
+
+
+def test_max_requests():
+    assert max_requests(0, 100) is None
+    assert 1000 <= max_requests(1000, 100) <= 1100
+
+
+def test_parse_args():
+    settings = parse_args(["--workers", "3", "--reuse-port"])
+    assert settings.workers == 3
+    assert settings.reuse_port
+    assert parse_args([]).workers >= 1
+
+
+@pytest.mark.skipif(not reuse_port_supported(), reason="no SO_REUSEPORT")
+def test_create_socket_reuse_port():
+    first = create_socket("127.0.0.1", 0, reuse_port=True)
+    port = first.getsockname()[1]
+    second = create_socket("127.0.0.1", port, reuse_port=True)
+    assert second.getsockname()[1] == port
+    assert second.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT)
+    first.close()
+    second.close()
+
+
+def test_supervisor_start_and_stop(supervisor):
+    instance = supervisor(sleeping_worker, 2)
+    instance.maintain()
+    wait_for(instance, lambda: len(instance.ready) == 2)
+    assert set(instance.ready) == set(instance.children)
+    instance.stop()
+    assert not instance.children
+
+
+def test_supervisor_respawns_exited_workers(supervisor):
+    instance = supervisor(exiting_worker, 1)
+    first = instance.spawn()
+    wait_for(instance, lambda: first not in instance.children)
+    assert len(instance.children) == 1
+
+
+def test_supervisor_graceful_reload(supervisor):
+    instance = supervisor(sleeping_worker, 2)
+    instance.maintain()
+    wait_for(instance, lambda: len(instance.ready) == 2)
+    old = set(instance.children)
+    instance.handle_signal(signal.SIGHUP, None)
+    wait_for(
+        instance,
+        lambda: not old & set(instance.children) and len(instance.ready) == 2,
+    )
+    assert instance.generation == 1
+    assert len(instance.children) == 2
+
+
+def test_supervisor_aborts_reload(supervisor, caplog):
+    caplog.set_level(logging.ERROR, logger="server")
+    instance = supervisor(sleeping_worker, 2)
+    instance.maintain()
+    wait_for(instance, lambda: len(instance.ready) == 2)
+    old = set(instance.children)
+    instance.worker = silent_worker
+    instance.graceful_timeout = 0.2
+    instance.handle_signal(signal.SIGHUP, None)
+    instance.step()
+    assert len(instance.children) == 4
+    wait_for(instance, lambda: set(instance.children) == old)
+    assert "reload aborted" in caplog.text
+    assert not instance.retiring
+    assert sorted(instance.current()) == sorted(old)
+    instance.step()
+    assert set(instance.children) == old
+
+
+def test_supervisor_stops_on_sigterm(supervisor):
+    instance = supervisor(sleeping_worker, 1)
+    instance.handle_signal(signal.SIGTERM, None)
+    instance.step()
+    assert not instance.running
+    assert not instance.children
@@ -0,0 +1,184 @@
+"""
+Test cross-process shared memory cache.
+"""
+import multiprocessing
+import os
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from db.revocation import SharedRevocation, disabled_key, revoked_key
+from tests.test_token_store import FakeRedis
+from utils.auth import create_access_token, decode_token
+from utils.security import (
+    SharedTokenCache,
+    TokenCache,
+    app_init_token_cache,
+)
+from utils.shared_cache import (
+    PROBES,
+    SEQUENCE,
+    VALUE_SIZE,
+    SharedTable,
+    app_dispose_shared_cache,
+    app_init_shared_cache,
+)
+
+
+@pytest.fixture
+def table_path(tmp_path) -> str:
+    return str(tmp_path / "shared.cache")
+
+
+def write_entry(path: str) -> None:
+    table = SharedTable(path, 64, b"secret")
+    table.set(b"child", b"value", time.time() + 60)
+    table.close()
+
+
+def test_shared_table_get_set(table_path):
+    table = SharedTable(table_path, 64, b"secret")
+    try:
+        assert table.get(b"key") is None
+        assert table.set(b"key", b"value", time.time() + 60)
+        assert table.get(b"key") == b"value"
+        assert table.set(b"key", b"other", time.time() + 60)
+        assert table.get(b"key") == b"other"
+        assert table.set(b"old", b"value", time.time() - 1)
+        assert table.get(b"old") is None
+        assert not table.set(b"big", b"x" * (VALUE_SIZE + 1), time.time())
+        assert len(table) == 1
+        table.clear()
+        assert table.get(b"key") is None
+        assert len(table) == 0
+    finally:
+        table.close()
+
+
+def test_shared_table_shared_by_processes(table_path):
+    table = SharedTable(table_path, 64, b"secret")
+    try:
+        process = multiprocessing.get_context("fork").Process(
+            target=write_entry, args=(table_path,)
+        )
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+        assert table.get(b"child") == b"value"
+    finally:
+        table.close()
+
+
+def test_shared_table_reset_on_layout_change(table_path):
+    table = SharedTable(table_path, 64, b"secret")
+    table.set(b"key", b"value", time.time() + 60)
+    table.close()
+    table = SharedTable(table_path, 32, b"secret")
+    try:
+        assert table.get(b"key") is None
+    finally:
+        table.close()
+
+
+def test_shared_table_layout_change_keeps_mapped_file(table_path):
+    old = SharedTable(table_path, 64, b"secret")
+    new = None
+    try:
+        old.set(b"key", b"old", time.time() + 60)
+        new = SharedTable(table_path, 128, b"secret")
+        same = SharedTable(table_path, 128, b"secret")
+        same.set(b"key", b"new", time.time() + 60)
+        same.close()
+        # old mapping isn't truncated under its readers
+        assert os.fstat(old._fd).st_size == old.size
+        assert old.get(b"key") == b"old"
+        assert new.get(b"key") == b"new"
+        assert os.stat(table_path).st_ino == os.fstat(new._fd).st_ino
+        assert os.stat(table_path).st_ino != os.fstat(old._fd).st_ino
+    finally:
+        old.close()
+        if new is not None:
+            new.close()
+
+
+def test_shared_table_skips_slot_being_written(table_path):
+    table = SharedTable(table_path, 64, b"secret")
+    try:
+        table.set(b"key", b"value", time.time() + 60)
+        offset = next(table._offsets(table.digest(b"key")))
+        (sequence,) = SEQUENCE.unpack_from(table._map, offset)
+        SEQUENCE.pack_into(table._map, offset, sequence + 1)
+        assert table.get(b"key") is None
+        SEQUENCE.pack_into(table._map, offset, sequence + 2)
+        assert table.get(b"key") == b"value"
+    finally:
+        table.close()
+
+
+def test_shared_table_evicts_closest_to_expiry(table_path):
+    table = SharedTable(table_path, PROBES, b"secret")
+    try:
+        now = time.time()
+        for index in range(PROBES):
+            table.set(str(index).encode(), b"value", now + 60 + index)
+        table.set(b"new", b"value", now + 60)
+        assert table.get(b"0") is None
+        assert table.get(b"1") == b"value"
+        assert table.get(b"new") == b"value"
+    finally:
+        table.close()
+
+
+def test_shared_token_cache(table_path):
+    table = SharedTable(table_path, 64, b"secret")
+    try:
+        cache = SharedTokenCache(table)
+        token = create_access_token({"id": 1, "scope": ["admin"]}, None)
+        claims = decode_token(token)
+        assert cache.get(token) is None
+        cache.set(token, claims)
+        assert cache.get(token) == claims
+        assert len(cache) == 1
+        cache.clear()
+        assert cache.get(token) is None
+    finally:
+        table.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_revocation(table_path):
+    table = SharedTable(table_path, 64, b"secret")
+    redis = FakeRedis()
+    await redis.set(revoked_key("revoked", 1), "1", ex=30)
+    await redis.set(disabled_key(2), "1", ex=30)
+    try:
+        revocation = SharedRevocation(redis, table, ttl=60)
+        assert not await revocation.is_revoked(None)
+        assert await revocation.is_revoked("revoked", 1)
+        assert not await revocation.is_revoked("active", 1)
+        assert await revocation.is_revoked("active", 2)
+        with mock.patch.object(redis, "pipeline", side_effect=AssertionError):
+            other = SharedRevocation(redis, table, ttl=60)
+            assert await other.is_revoked("revoked", 1)
+            assert not await other.is_revoked("active", 1)
+            assert await other.is_revoked("active", 2)
+    finally:
+        table.close()
+
+
+@pytest.mark.asyncio
+async def test_app_init_shared_cache(table_path):
+    app = SimpleNamespace(state=SimpleNamespace())
+    await app_init_shared_cache(app)
+    assert app.state.shared_cache is None
+    await app_init_token_cache(app)
+    assert isinstance(app.state.token_cache, TokenCache)
+    await app_dispose_shared_cache(app)
+    with mock.patch("utils.shared_cache.SHARED_CACHE_PATH", table_path):
+        await app_init_shared_cache(app)
+    assert isinstance(app.state.shared_cache, SharedTable)
+    await app_init_token_cache(app)
+    assert isinstance(app.state.token_cache, SharedTokenCache)
+    await app_dispose_shared_cache(app)
@@ -0,0 +1,148 @@
+"""
+Test single-flight coalescing of concurrent calls.
+"""
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from repositories.users import SQLUserRepository
+from tests.test_circuit import breaker
+from tests.test_deadline import set_deadline
+from utils.deadline import DeadlineExceeded, remaining
+from utils.singleflight import SingleFlight, coalesced_calls
+
+
+class SlowCall:
+    """Call counting starts and finishing when released."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_call():
+    group = SingleFlight()
+    call = SlowCall()
+    coalesced = coalesced_calls.value
+    tasks = [asyncio.create_task(group.do("key", call)) for _ in range(5)]
+    other = asyncio.create_task(group.do("other", call))
+    await asyncio.sleep(0)
+    assert len(group) == 2
+    call.release.set()
+    assert await asyncio.gather(*tasks) == [1] * 5
+    assert await other == 2
+    assert coalesced_calls.value == coalesced + 4
+    assert len(group) == 0
+    assert await group.do("key", call) == 3
+
+
+@pytest.mark.asyncio
+async def test_error_raised_to_all_callers_and_not_kept():
+    group = SingleFlight()
+    release = asyncio.Event()
+
+    async def fail():
+        await release.wait()
+        raise ConnectionError("down")
+
+    tasks = [asyncio.create_task(group.do("key", fail)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+    async def succeed():
+        return "ok"
+
+    assert await group.do("key", succeed) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    group = SingleFlight()
+    call = SlowCall()
+    first = asyncio.create_task(group.do("key", call))
+    second = asyncio.create_task(group.do("key", call))
+    await asyncio.sleep(0)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    call.release.set()
+    assert await second == 1
+    assert not call.cancelled
+
+
+@pytest.mark.asyncio
+async def test_call_cancelled_when_all_callers_cancelled():
+    group = SingleFlight()
+    call = SlowCall()
+    tasks = [asyncio.create_task(group.do("key", call)) for _ in range(2)]
+    await asyncio.sleep(0)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert call.cancelled
+    assert len(group) == 0
+    call.release.set()
+    assert await group.do("key", call) == 2
+
+
+@pytest.mark.asyncio
+async def test_callers_bounded_by_own_deadlines():
+    group = SingleFlight()
+    circuit = breaker(timeout=5)
+    deadlines = []
+
+    async def query() -> str:
+        deadlines.append(remaining())
+        return await circuit.call(lambda: asyncio.sleep(0.1, "ok"))
+
+    with set_deadline(0.05):
+        short = asyncio.create_task(group.do("key", query))
+    with set_deadline(10):
+        long = asyncio.create_task(group.do("key", query))
+    with pytest.raises(DeadlineExceeded):
+        await short
+    assert await long == "ok"
+    assert deadlines == [None]
+    assert circuit.consecutive == 0
+
+
+@pytest.mark.asyncio
+async def test_repository_concurrent_lookups_one_query(engine: AsyncEngine):
+    repository = SQLUserRepository(engine)
+    email = f"{uuid.uuid4().hex}@example.com"
+    user = await repository.create({"email": email, "password": "password"})
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        by_id = await asyncio.gather(
+            *(repository.get_by_id(user.id) for _ in range(10))
+        )
+        by_email = await asyncio.gather(
+            *(repository.get_by_email(email) for _ in range(10))
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    assert by_id == [user] * 10
+    assert by_email == [user] * 10
+    assert len(statements) == 2
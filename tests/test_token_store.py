@@ -0,0 +1,292 @@
+"""
+Test refresh tokens stores conformance.
+"""
+import asyncio
+import math
+import time
+from types import SimpleNamespace
+from typing import Awaitable, Dict, List
+from unittest import mock
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db.revocation import tokens_active
+from repositories.tokens import (
+    InMemoryTokenStore,
+    RedisTokenStore,
+    SQLTokenStore,
+    TokenStore,
+    app_dispose_token_store,
+    app_init_token_store,
+    delete_tokens_expired,
+    select_tokens_expired,
+)
+from tests.test_redis import async_return
+from tests.test_security import access_token
+from tests.test_views_introspect import fake_redis
+from utils.auth import decode_token
+
+
+class FakeRedis:
+    """Redis keys with expiry answering commands used by token store."""
+
+    def __init__(self) -> None:
+        self.keys: Dict[str, float] = {}
+
+    def client(self) -> "FakeRedis":
+        return self
+
+    async def __aenter__(self) -> "FakeRedis":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    def alive(self, key: str) -> bool:
+        return self.keys.get(key, 0) > time.time()
+
+    async def set(self, key: str, value: str, ex=None) -> bool:
+        self.keys[key] = time.time() + ex if ex else math.inf
+        return True
+
+    async def exists(self, *keys: str) -> int:
+        return sum(self.alive(key) for key in keys)
+
+    async def pttl(self, key: str) -> int:
+        if not self.alive(key):
+            return -2
+        if self.keys[key] == math.inf:
+            return -1
+        return int((self.keys[key] - time.time()) * 1000)
+
+    async def delete(self, *keys: str) -> int:
+        alive = await self.exists(*keys)
+        for key in keys:
+            self.keys.pop(key, None)
+        return alive
+
+    def pipeline(self, transaction: bool = True) -> "FakeRedisPipeline":
+        return FakeRedisPipeline(self)
+
+
+class FakeRedisPipeline:
+    """Pipeline of commands of fake redis used by stores and revocation."""
+
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.queued: List[Awaitable] = []
+
+    async def __aenter__(self) -> "FakeRedisPipeline":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self.queued)
+
+    def exists(self, *keys: str) -> None:
+        self.queued.append(self.redis.exists(*keys))
+
+    def pttl(self, key: str) -> None:
+        self.queued.append(self.redis.pttl(key))
+
+    def set(self, key: str, value: str, ex=None) -> None:  # noqa: A003
+        self.queued.append(self.redis.set(key, value, ex=ex))
+
+    def xadd(self, *args, **kwargs) -> None:
+        self.queued.append(async_return(b"0-1"))
+
+    async def execute(self) -> list:
+        queued, self.queued = self.queued, []
+        return [await command for command in queued]
+
+
+@pytest_asyncio.fixture(params=["redis", "memory", "sql"])
+async def store(request, engine: AsyncEngine) -> TokenStore:
+    """Create refresh tokens store of every backend.
+
+    Args:
+        request: pytest fixture request with backend name
+        engine: async database engine with applied migrations
+
+    Returns:
+        refresh tokens store
+    """
+    if request.param == "redis":
+        return RedisTokenStore(FakeRedis())
+    if request.param == "memory":
+        return InMemoryTokenStore()
+    return SQLTokenStore(engine)
+
+
+def later(seconds: float):
+    """Patch current time to be seconds later."""
+    return mock.patch("time.time", return_value=time.time() + seconds)
+
+
+@pytest.mark.asyncio
+async def test_store_add_exists_delete(store):
+    active, other = access_token(), access_token()
+    assert not await store.exists(active)
+    await store.add(active, 60)
+    assert await store.exists(active)
+    assert await store.exists_many([active, other, active]) == [
+        True,
+        False,
+        True,
+    ]
+    assert await store.exists_many([]) == []
+    assert await store.delete(active)
+    assert not await store.delete(active)
+    assert not await store.exists(active)
+
+
+@pytest.mark.asyncio
+async def test_store_add_again_extends_expiry(store):
+    token = access_token()
+    await store.add(token, 10)
+    await store.add(token, 60)
+    with later(30):
+        assert await store.exists(token)
+
+
+@pytest.mark.asyncio
+async def test_store_expiry(store):
+    token = access_token()
+    await store.add(token, 10)
+    with later(20):
+        assert not await store.exists(token)
+        assert await store.exists_many([token]) == [False]
+        assert not await store.delete(token)
+        assert await store.purge() in (0, 1)
+    assert not await store.exists(token)
+
+
+@pytest.mark.asyncio
+async def test_memory_store_expiry_heap():
+    store = InMemoryTokenStore()
+    await store.add("short", 10)
+    await store.add("long", 60)
+    await store.add("short", 30)
+    await store.delete("long")
+    with later(20):
+        assert await store.purge() == 0
+        assert await store.exists("short")
+    with later(70):
+        assert await store.purge() == 1
+    assert store._expires == {}
+    assert store._heap == []
+
+
+@pytest.mark.asyncio
+async def test_sql_store_purges_expired_in_batches(engine):
+    store = SQLTokenStore(engine, purge_batch_size=2)
+    active = access_token()
+    for _ in range(5):
+        await store.add(access_token(), 10)
+    await store.add(active, 60)
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("DELETE"):
+            statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        with later(20):
+            assert await store.purge() == 5
+            assert await store.exists(active)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    assert len(statements) == 3
+
+
+def test_purge_statements_compile_for_mysql():
+    delete_sql = str(delete_tokens_expired.compile(dialect=mysql.dialect()))
+    assert "SELECT" not in delete_sql
+    assert "LIMIT" not in delete_sql
+    select_sql = str(select_tokens_expired.compile(dialect=mysql.dialect()))
+    assert "LIMIT" in select_sql
+
+
+@pytest.mark.asyncio
+async def test_sql_store_background_purge(engine):
+    store = SQLTokenStore(engine, purge_interval=0.01)
+    await store.add(access_token(), 10)
+    purged = asyncio.Event()
+    purge = store.purge
+
+    async def purge_once() -> int:
+        # stop the task while it sleeps, not in the middle of a query
+        store.purge_interval = 3600
+        removed = await purge()
+        purged.set()
+        return removed
+
+    with later(20), mock.patch.object(store, "purge", purge_once):
+        store.start()
+        await asyncio.wait_for(purged.wait(), 5)
+        await store.stop()
+    assert store._task is None
+    assert await store.purge() == 0
+
+
+@pytest.mark.asyncio
+async def test_tokens_active_checks_refresh_tokens_in_store():
+    stored = access_token(token_type="refresh_token")
+    logged_out = access_token(token_type="refresh_token")
+    access = access_token()
+    tokens = [stored, logged_out, access]
+    claims = [decode_token(token) for token in tokens]
+    store = InMemoryTokenStore()
+    await store.add(stored, 60)
+    redis = fake_redis(set())
+    active = await tokens_active(redis, tokens, claims, store)
+    assert active == [True, False, True]
+    assert redis.pipeline.return_value.executed == 1
+
+
+@pytest.mark.asyncio
+async def test_tokens_active_redis_store_one_round_trip():
+    refresh = access_token(token_type="refresh_token")
+    redis = fake_redis({RedisTokenStore.key(refresh)})
+    store = RedisTokenStore(redis)
+    active = await tokens_active(
+        redis, [refresh], [decode_token(refresh)], store
+    )
+    assert active == [True]
+    assert redis.pipeline.return_value.executed == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "backend, store_class",
+    [
+        ("redis", RedisTokenStore),
+        ("memory", InMemoryTokenStore),
+        ("sql", SQLTokenStore),
+    ],
+)
+async def test_app_init_token_store(backend, store_class):
+    app = SimpleNamespace(
+        state=SimpleNamespace(
+            redis=FakeRedis(), users=SimpleNamespace(engine=None)
+        )
+    )
+    with mock.patch("repositories.tokens.TOKEN_STORE", backend):
+        await app_init_token_store(app)
+    assert isinstance(app.state.token_store, store_class)
+    await app_dispose_token_store(app)
+
+
+@pytest.mark.asyncio
+async def test_app_init_token_store_unknown():
+    app = SimpleNamespace(state=SimpleNamespace())
+    with mock.patch("repositories.tokens.TOKEN_STORE", "memcached"):
+        with pytest.raises(ValueError):
+            await app_init_token_store(app)
@@ -0,0 +1,192 @@
+"""
+Test request tracing.
+"""
+import json
+import uuid
+from types import SimpleNamespace
+from typing import List
+from unittest import mock
+
+import pytest
+import pytest_asyncio
+
+from tests.test_redis import async_return
+from utils.password import password_hash_ctx
+from utils.tracing import (
+    NOOP_SPAN,
+    BatchSpanProcessor,
+    Span,
+    app_dispose_tracing,
+    app_init_tracing,
+    dropped_spans,
+    parse_traceparent,
+    start_span,
+    tracer,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class ListExporter:
+    """Exporter keeping exported batches."""
+
+    def __init__(self, error: Exception = None) -> None:
+        self.batches: List[List[Span]] = []
+        self.error = error
+
+    async def export(self, spans: List[Span]) -> None:
+        if self.error:
+            raise self.error
+        self.batches.append(list(spans))
+
+    @property
+    def spans(self) -> List[Span]:
+        return [span for batch in self.batches for span in batch]
+
+
+@pytest_asyncio.fixture
+async def exporter():
+    exporter = ListExporter()
+    processor = BatchSpanProcessor(exporter, 100, 3600, 1000)
+    tracer.configure(processor, ratio=1.0)
+    try:
+        yield exporter
+    finally:
+        tracer.configure(None)
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        (f"00-{TRACE_ID}-{PARENT_ID}-01", (TRACE_ID, PARENT_ID, True)),
+        (f"00-{TRACE_ID}-{PARENT_ID}-00", (TRACE_ID, PARENT_ID, False)),
+        (f"01-{TRACE_ID}-{PARENT_ID}-01-extra", (TRACE_ID, PARENT_ID, True)),
+        (f"00-{TRACE_ID}-{PARENT_ID}-01-extra", None),
+        (f"ff-{TRACE_ID}-{PARENT_ID}-01", None),
+        (f"00-{'0' * 32}-{PARENT_ID}-01", None),
+        (f"00-{TRACE_ID}-{'0' * 16}-01", None),
+        (f"00-{TRACE_ID}-{PARENT_ID}-zz", None),
+        ("invalid", None),
+    ],
+)
+def test_parse_traceparent(header, expected):
+    assert parse_traceparent(header) == expected
+
+
+def test_no_spans_outside_of_trace(exporter):
+    assert start_span("operation") is NOOP_SPAN
+    with start_span("operation") as span:
+        assert span is None
+    assert password_hash_ctx.verify("a", password_hash_ctx.hash("a"))
+    assert not tracer.processor.queue
+
+
+@pytest.mark.asyncio
+async def test_child_spans_of_current_span(exporter):
+    root = tracer.start_trace("root")
+    with root:
+        with start_span("child") as child:
+            password_hash_ctx.hash("password")
+        with pytest.raises(ValueError):
+            with start_span("failed"):
+                raise ValueError("broken")
+    await tracer.processor.flush()
+    spans = {span.name: span for span in exporter.spans}
+    assert set(spans) == {"root", "child", "password.hash", "failed"}
+    assert spans["root"].parent_id is None
+    assert spans["child"].parent_id == root.span_id
+    assert spans["password.hash"].parent_id == child.span_id
+    assert spans["failed"].error == "ValueError: broken"
+    assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+
+
+@pytest.mark.asyncio
+async def test_login_trace(get_client, get_app, exporter):
+    email = f"{uuid.uuid4().hex}@example.com"
+    credentials = {"email": email, "password": "password"}
+    await get_client.post(
+        get_app.url_path_for("login:register"), json=credentials
+    )
+    await tracer.processor.flush()
+    exporter.batches.clear()
+    with mock.patch.object(
+        get_app.state.redis, "client", return_value=mock.AsyncMock()
+    ) as client:
+        client.return_value.__aenter__.return_value.set = mock.Mock(
+            return_value=async_return(True)
+        )
+        res = await get_client.post(
+            get_app.url_path_for("login:auth"),
+            json=credentials,
+            headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"},
+        )
+    assert res.status_code == 200
+    await tracer.processor.flush()
+    spans = exporter.spans
+    root = spans[-1]
+    assert root.name == "POST /login/auth/"
+    assert root.parent_id == PARENT_ID
+    assert root.attributes["http.status_code"] == 200
+    assert root.attributes["http.route"] == "/login/auth/"
+    names = [span.name for span in spans[:-1]]
+    assert names == [
+        "SELECT",
+        "password.verify",
+        "jwt.encode",
+        "jwt.encode",
+        "redis SET",
+    ]
+    assert {span.trace_id for span in spans} == {TRACE_ID}
+    assert {span.parent_id for span in spans[:-1]} == {root.span_id}
+    assert "FROM user" in spans[0].attributes["db.statement"]
+
+
+@pytest.mark.asyncio
+async def test_trace_not_sampled(get_client, get_app, exporter):
+    url = get_app.url_path_for("health-live")
+    await get_client.get(
+        url, headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"}
+    )
+    tracer.ratio = 0.0
+    await get_client.get(url)
+    assert not tracer.processor.queue
+    tracer.ratio = 1.0
+    await get_client.get(url)
+    assert len(tracer.processor.queue) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_processor_drops_spans():
+    exporter = ListExporter()
+    processor = BatchSpanProcessor(exporter, 2, 3600, 3)
+    dropped = dropped_spans.value
+    for _ in range(4):
+        processor.add(Span("span", TRACE_ID))
+    assert dropped_spans.value == dropped + 1
+    assert await processor.flush() == 3
+    assert [len(batch) for batch in exporter.batches] == [2, 1]
+    processor.exporter = ListExporter(ConnectionError("down"))
+    processor.add(Span("span", TRACE_ID))
+    assert await processor.flush() == 0
+    assert dropped_spans.value == dropped + 2
+
+
+@pytest.mark.asyncio
+async def test_file_export(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    app = SimpleNamespace(state=SimpleNamespace())
+    with mock.patch("utils.tracing.TRACE_EXPORT_FILE", str(path)):
+        await app_init_tracing(app)
+    try:
+        with tracer.start_trace("root", attributes={"count": 1}):
+            pass
+    finally:
+        await app_dispose_tracing(app)
+    assert tracer.processor is None
+    (line,) = path.read_text().splitlines()
+    resource_spans = json.loads(line)["resourceSpans"][0]
+    (span,) = resource_spans["scopeSpans"][0]["spans"]
+    assert span["name"] == "root"
+    assert span["attributes"] == [{"key": "count", "value": {"intValue": "1"}}]
+    assert span["status"] == {"code": 1}
@@ -4,6 +4,7 @@ import pytest
 from starlette import status
 
 from tests.test_redis import async_return
+from utils.circuit import DependencyTimeout
 
 
 @pytest.mark.asyncio
@@ -27,6 +28,16 @@ async def test_view_health_check_503_unavailable(get_client, get_app):
         assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
 
 
+@pytest.mark.asyncio
+async def test_view_health_check_503_redis_timeout(get_client, get_app):
+    with mock.patch(
+        "views.healthcheck.get_redis_key",
+        mock.MagicMock(side_effect=DependencyTimeout("redis")),
+    ):
+        res = await get_client.get(get_app.url_path_for("health-check"))
+    assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
 @pytest.mark.asyncio
 async def test_view_health_check_500_internal_error(get_client, get_app):
     with pytest.raises(RuntimeError):
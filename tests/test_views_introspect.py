@@ -0,0 +1,125 @@
+"""
+Test token revocation and batch introspection.
+"""
+from typing import Set
+from unittest import mock
+
+import pytest
+from starlette import status
+
+from db.keys import disabled_key, refresh_key, revoked_key
+from db.revocation import tokens_active
+from tests.test_security import access_token, admin_headers
+from utils.auth import decode_token
+
+
+class FakePipeline:
+    """Redis pipeline answering EXISTS from a set of keys."""
+
+    def __init__(self, keys: Set[str]) -> None:
+        self.keys = keys
+        self.queued = []
+        self.executed = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __len__(self) -> int:
+        return len(self.queued)
+
+    def exists(self, *keys: str) -> "FakePipeline":
+        self.queued.append(keys)
+        return self
+
+    async def execute(self) -> list:
+        self.executed += 1
+        return [sum(key in self.keys for key in keys) for keys in self.queued]
+
+
+def fake_redis(keys: Set[str]) -> mock.MagicMock:
+    redis = mock.MagicMock()
+    redis.pipeline.return_value = FakePipeline(keys)
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_tokens_active_one_round_trip():
+    access = access_token()
+    revoked = access_token()
+    refresh = access_token(token_type="refresh_token")
+    logged_out = access_token(token_type="refresh_token")
+    disabled = access_token()
+    tokens = [access, revoked, refresh, logged_out, disabled, "invalid"]
+    claims = [decode_token(token) for token in tokens[:-1]] + [None]
+    claims[4]["id"] = 2
+    redis = fake_redis(
+        {
+            revoked_key(claims[1]["jti"], 1),
+            refresh_key(claims[2], refresh),
+            disabled_key(2),
+        }
+    )
+    active = await tokens_active(redis, tokens, claims)
+    assert active == [True, False, True, False, False, False]
+    assert redis.pipeline.return_value.executed == 1
+
+
+@pytest.mark.asyncio
+async def test_tokens_active_without_lookups():
+    redis = fake_redis(set())
+    assert await tokens_active(redis, ["a", "b"], [None, {}]) == [
+        False,
+        True,
+    ]
+    assert redis.pipeline.return_value.executed == 0
+
+
+@pytest.mark.asyncio
+async def test_token_introspect_batch(get_client, get_app):
+    active = access_token(["admin"])
+    revoked = access_token()
+    expired = access_token(expires=-10)
+    redis = fake_redis({revoked_key(decode_token(revoked)["jti"], 1)})
+    with mock.patch.object(get_app.state, "redis", redis):
+        res = await get_client.post(
+            get_app.url_path_for("token:introspect-batch"),
+            json={"tokens": [active, revoked, expired, "invalid"]},
+            headers=admin_headers(),
+        )
+    assert res.status_code == status.HTTP_200_OK
+    results = res.json()["results"]
+    assert results[1:] == [{"active": False}] * 3
+    claims = decode_token(active)
+    assert results[0] == {
+        "active": True,
+        "scope": "admin",
+        "username": "admin@example.com",
+        "sub": "1",
+        "exp": claims["exp"],
+        "jti": claims["jti"],
+        "token_type": "access_token",
+    }
+    assert redis.pipeline.return_value.executed == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("tokens", [[], ["token"] * 101])
+async def test_token_introspect_batch_size(get_client, get_app, tokens):
+    res = await get_client.post(
+        get_app.url_path_for("token:introspect-batch"),
+        json={"tokens": tokens},
+        headers=admin_headers(),
+    )
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_token_introspect_batch_requires_admin(get_client, get_app):
+    res = await get_client.post(
+        get_app.url_path_for("token:introspect-batch"),
+        json={"tokens": ["token"]},
+    )
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
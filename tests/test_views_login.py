@@ -14,6 +14,7 @@ from schemas import Auth, Register, UserCreate
 from tests.test_redis import async_return
 from tests.test_views_users import create_new_user
 from utils.auth import decode_token
+from utils.circuit import CircuitOpen
 from utils.password import password_hash_ctx
 
 
@@ -91,10 +92,11 @@ async def test_login_auth_success(get_client, get_app, data):
     created_user = await create_new_user(get_app, get_client, user)
     auth_user = Auth(**created_user)
     auth_user.password = data.get("password")
-    with mock.patch(
-        "views.login.set_redis_key",
-        mock.MagicMock(return_value=async_return(True)),
-    ) as set_redis_mock:
+    with mock.patch.object(
+        get_app.state.token_store,
+        "add",
+        mock.MagicMock(return_value=async_return(None)),
+    ) as store_add_mock:
         res = await get_client.post(
             get_app.url_path_for("login:auth"),
             content=auth_user.model_dump_json(),
@@ -118,11 +120,8 @@ async def test_login_auth_success(get_client, get_app, data):
     assert "exp" in access_payload
     assert refresh_payload.get("email") == data.get("email")
     assert refresh_payload.get("id") == created_user.get("id")
-    set_redis_mock.assert_called_once_with(
-        get_app.state.redis,
-        res.json().get("refresh_token"),
-        "1",
-        REFRESH_TOKEN_EXPIRE,
+    store_add_mock.assert_called_once_with(
+        res.json().get("refresh_token"), REFRESH_TOKEN_EXPIRE
     )
 
 
@@ -137,15 +136,16 @@ async def test_login_auth_not_found(get_client, get_app):
     email = f"{uuid.uuid4().hex}@example.com"
     password = "new_password"
     user = UserCreate(email=email, password=password)
-    with mock.patch(
-        "views.login.set_redis_key",
-        mock.MagicMock(return_value=async_return(True)),
-    ) as set_redis_mock:
+    with mock.patch.object(
+        get_app.state.token_store,
+        "add",
+        mock.MagicMock(return_value=async_return(None)),
+    ) as store_add_mock:
         res = await get_client.post(
             get_app.url_path_for("login:auth"), content=user.model_dump_json()
         )
     assert res.status_code == status.HTTP_404_NOT_FOUND
-    set_redis_mock.assert_not_called()
+    store_add_mock.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -161,13 +161,83 @@ async def test_login_auth_password_not_match(get_client, get_app):
     user = UserCreate(email=email, password=password)
     created_user = await create_new_user(get_app, get_client, user)
     auth_user = Auth(**created_user)
-    with mock.patch(
-        "views.login.set_redis_key",
-        mock.MagicMock(return_value=async_return(True)),
-    ) as set_redis_mock:
+    with mock.patch.object(
+        get_app.state.token_store,
+        "add",
+        mock.MagicMock(return_value=async_return(None)),
+    ) as store_add_mock:
         res = await get_client.post(
             get_app.url_path_for("login:auth"),
             content=auth_user.model_dump_json(),
         )
     assert res.status_code == status.HTTP_404_NOT_FOUND
-    set_redis_mock.assert_not_called()
+    store_add_mock.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_login_records_last_login(get_client, get_app):
+    """Test login records last login time to be written in background.
+
+    Args:
+        get_client (_type_): http test client.
+        get_app (_type_): http application.
+    """
+    email = f"{uuid.uuid4().hex}@example.com"
+    user = UserCreate(email=email, password="password")
+    created_user = await create_new_user(get_app, get_client, user)
+    assert created_user["last_login"] is None
+    auth_user = Auth(email=user.email, password=user.password)
+    with mock.patch.object(
+        get_app.state.token_store,
+        "add",
+        mock.MagicMock(return_value=async_return(None)),
+    ):
+        res = await get_client.post(
+            get_app.url_path_for("login:auth"),
+            content=auth_user.model_dump_json(),
+        )
+    assert res.status_code == status.HTTP_200_OK
+    assert created_user["id"] in get_app.state.last_login.logins
+    await get_app.state.last_login.flush()
+    found = await get_app.state.users.get_by_id(created_user["id"])
+    assert found.last_login is not None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "policy, status_code",
+    [
+        ("fail", status.HTTP_503_SERVICE_UNAVAILABLE),
+        ("degrade", status.HTTP_200_OK),
+    ],
+)
+async def test_login_token_store_unavailable(
+    get_client, get_app, policy, status_code
+):
+    """Test login policy when refresh tokens store is unavailable.
+
+    Args:
+        get_client (_type_): http test client.
+        get_app (_type_): http application.
+        policy (_type_): parametrized login policy.
+        status_code (_type_): expected response status.
+    """
+    email = f"{uuid.uuid4().hex}@example.com"
+    user = UserCreate(email=email, password="password")
+    await create_new_user(get_app, get_client, user)
+    auth_user = Auth(email=user.email, password=user.password)
+    with mock.patch.object(
+        get_app.state.token_store,
+        "add",
+        mock.MagicMock(side_effect=CircuitOpen("redis", 7)),
+    ), mock.patch("views.login.LOGIN_TOKEN_STORE_POLICY", policy):
+        res = await get_client.post(
+            get_app.url_path_for("login:auth"),
+            content=auth_user.model_dump_json(),
+        )
+    assert res.status_code == status_code
+    if policy == "fail":
+        assert res.headers["retry-after"] == "7"
+    else:
+        assert res.json()["refresh_token"] is None
+        assert decode_token(res.json()["access_token"])["email"] == email
@@ -1,15 +1,23 @@
 """
 Test user views.
 """
+import asyncio
 import uuid
+from datetime import timedelta
+from unittest import mock
 
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
+from sqlalchemy import event
 from starlette import status
 
+from config.auth import USERS_BATCH_SIZE
 from models import User
 from schemas import UserCreate, UserUpdate
+from tests.test_redis import async_return
+from tests.test_security import admin_headers
+from utils.auth import create_access_token
 from utils.password import password_hash_ctx
 
 
@@ -24,7 +32,9 @@ async def test_get_users_list(
         get_app (FastAPI): testing application.
         add_some_user (User): user added to database.
     """
-    res = await get_client.get(get_app.url_path_for("users:get"))
+    res = await get_client.get(
+        get_app.url_path_for("users:get"), headers=admin_headers()
+    )
     data = res.json()
     assert res.status_code == status.HTTP_200_OK
     user = next(item for item in data if item["id"] == add_some_user.id)
@@ -47,7 +57,8 @@ async def test_get_user_by_id(
         add_some_user (User): user added to database.
     """
     res = await get_client.get(
-        get_app.url_path_for("users:get-by-id", user_id=str(add_some_user.id))
+        get_app.url_path_for("users:get-by-id", user_id=str(add_some_user.id)),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_200_OK
     assert {
@@ -70,7 +81,8 @@ async def test_get_user_by_id_not_exists(
         get_app (FastAPI): testing application.
     """
     res = await get_client.get(
-        get_app.url_path_for("users:get-by-id", user_id="9999")
+        get_app.url_path_for("users:get-by-id", user_id="9999"),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_404_NOT_FOUND
 
@@ -99,7 +111,9 @@ async def create_new_user(
     :return: dict with created user attributes
     """
     res = await get_client.post(
-        get_app.url_path_for("users:post"), content=user.model_dump_json()
+        get_app.url_path_for("users:post"),
+        content=user.model_dump_json(),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_201_CREATED
     assert not res.json().get("confirmed")
@@ -124,7 +138,9 @@ async def test_post_user_create_400_bad_request(
     random_email = "myuserwithid@example.com"
     user = UserCreate(email=random_email, password="password")
     res = await get_client.post(
-        get_app.url_path_for("users:post"), content=user.model_dump_json()
+        get_app.url_path_for("users:post"),
+        content=user.model_dump_json(),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_400_BAD_REQUEST
 
@@ -162,6 +178,7 @@ async def test_put_user_update_200_ok(
     res = await get_client.put(
         get_app.url_path_for("users:put", user_id=user["id"]),
         content=new_user.model_dump_json(),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_200_OK
     assert res.json().get("confirmed") == data.get("confirmed")
@@ -192,6 +209,7 @@ async def test_put_user_update_404_not_found(
     res = await get_client.put(
         get_app.url_path_for("users:put", user_id="9999"),
         content=new_user.model_dump_json(),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_404_NOT_FOUND
     assert res.json() == {"detail": "User with id '9999' not found"}
@@ -227,6 +245,7 @@ async def test_patch_user_update_200_ok(
         content=new_user.model_dump_json(
             exclude_defaults=True, exclude_unset=True
         ),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_200_OK
     assert res.json().get("id") == user["id"]
@@ -263,6 +282,7 @@ async def test_patch_user_update_404_not_found(
     res = await get_client.patch(
         get_app.url_path_for("users:patch", user_id="9999"),
         content=new_user.model_dump_json(),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_404_NOT_FOUND
     assert res.json() == {"detail": "User with id '9999' not found"}
@@ -277,10 +297,15 @@ async def test_delete_user_200_ok(get_client: AsyncClient, get_app: FastAPI):
         get_app (FastAPI): testing application.
     """
     user = await test_post_user_create_201_created(get_client, get_app)
-    res = await get_client.delete(
-        get_app.url_path_for("users:delete", user_id=user["id"]),
-    )
+    with mock.patch(
+        "views.users.disable_user", return_value=async_return(True)
+    ) as disable_user:
+        res = await get_client.delete(
+            get_app.url_path_for("users:delete", user_id=user["id"]),
+            headers=admin_headers(),
+        )
     assert res.status_code == status.HTTP_200_OK
+    disable_user.assert_called_once_with(get_app.state.redis, user["id"])
     assert res.json().get("id") == user["id"]
     assert res.json().get("confirmed") == user["confirmed"]
     assert res.json().get("is_active") == user["is_active"]
@@ -291,6 +316,43 @@ async def test_delete_user_200_ok(get_client: AsyncClient, get_app: FastAPI):
     assert "created" in res.json()
 
 
+@pytest.mark.asyncio
+async def test_deleted_user_token_revoked(
+    get_client: AsyncClient, get_app: FastAPI
+):
+    """Test access token of deleted admin is rejected by admin routes.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+    """
+    user = await test_post_user_create_201_created(get_client, get_app)
+    token = create_access_token(
+        {
+            "id": user["id"],
+            "jti": uuid.uuid4().hex,
+            "token_type": "access_token",
+            "scope": ["admin"],
+        },
+        timedelta(seconds=300),
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    url = get_app.url_path_for("users:get")
+    res = await get_client.get(url, headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    # deletion revokes user in redis revocation is looked up in
+    with mock.patch.object(
+        get_app.state, "redis", get_app.state.revocation.redis
+    ):
+        res = await get_client.delete(
+            get_app.url_path_for("users:delete", user_id=user["id"]),
+            headers=admin_headers(),
+        )
+    assert res.status_code == status.HTTP_200_OK
+    res = await get_client.get(url, headers=headers)
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
 @pytest.mark.asyncio
 async def test_delete_user_404_not_found(
     get_client: AsyncClient, get_app: FastAPI
@@ -302,7 +364,228 @@ async def test_delete_user_404_not_found(
         get_app (FastAPI): testing application.
     """
     res = await get_client.delete(
-        get_app.url_path_for("users:patch", user_id="9999")
+        get_app.url_path_for("users:patch", user_id="9999"),
+        headers=admin_headers(),
     )
     assert res.status_code == status.HTTP_404_NOT_FOUND
     assert res.json() == {"detail": "User with id '9999' not found"}
+
+
+@pytest.mark.asyncio
+async def test_get_users_batch_single_query(
+    get_client: AsyncClient, get_app: FastAPI, engine
+):
+    """Test users batch lookup keeps order and marks missing users.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+        engine: database engine.
+    """
+    first = await test_post_user_create_201_created(get_client, get_app)
+    second = await test_post_user_create_201_created(get_client, get_app)
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        res = await get_client.get(
+            get_app.url_path_for("users:get-batch"),
+            params={"ids": f"{second['id']},9999,{first['id']},9999"},
+            headers=admin_headers(),
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    assert res.status_code == status.HTTP_200_OK
+    assert len(statements) == 1
+    users = res.json()["users"]
+    assert [user and user["id"] for user in users] == [
+        second["id"],
+        None,
+        first["id"],
+        None,
+    ]
+    assert "password" not in users[0]
+    assert res.json()["missing"] == [9999]
+
+
+@pytest.mark.asyncio
+async def test_post_users_batch(get_client: AsyncClient, get_app: FastAPI):
+    """Test users batch lookup with ids in request body.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+    """
+    user = await test_post_user_create_201_created(get_client, get_app)
+    res = await get_client.post(
+        get_app.url_path_for("users:post-batch"),
+        json={"ids": [9999, user["id"]]},
+        headers=admin_headers(),
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json()["users"][1]["email"] == user["email"]
+    assert res.json()["missing"] == [9999]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "ids", ["", "1,a", ",".join(["1"] * (USERS_BATCH_SIZE + 1))]
+)
+async def test_get_users_batch_422(
+    get_client: AsyncClient, get_app: FastAPI, ids: str
+):
+    """Test users batch lookup with invalid ids.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+        ids (str): parametrized ids.
+    """
+    res = await get_client.get(
+        get_app.url_path_for("users:get-batch"),
+        params={"ids": ids},
+        headers=admin_headers(),
+    )
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_id_304_not_modified(
+    get_client: AsyncClient, get_app: FastAPI, engine
+):
+    """Test conditional get of user answered with version-only query.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+        engine: database engine.
+    """
+    user = await test_post_user_create_201_created(get_client, get_app)
+    url = get_app.url_path_for("users:get-by-id", user_id=str(user["id"]))
+    res = await get_client.get(url, headers=admin_headers())
+    etag = res.headers["ETag"]
+    assert etag == f'"{user["version"]}"'
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        res = await get_client.get(
+            url, headers={**admin_headers(), "If-None-Match": f"W/{etag}"}
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    assert res.status_code == status.HTTP_304_NOT_MODIFIED
+    assert res.headers["ETag"] == etag
+    assert not res.content
+    assert len(statements) == 1
+    assert "email" not in statements[0]
+    await get_client.patch(
+        url, json={"confirmed": True}, headers=admin_headers()
+    )
+    res = await get_client.get(
+        url, headers={**admin_headers(), "If-None-Match": etag}
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["ETag"] != etag
+    assert res.json()["confirmed"] is True
+
+
+@pytest.mark.asyncio
+async def test_get_users_list_304_not_modified(
+    get_client: AsyncClient, get_app: FastAPI
+):
+    """Test conditional get of users list page.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+    """
+    user = await test_post_user_create_201_created(get_client, get_app)
+    url = get_app.url_path_for("users:get")
+    params = {"skip": 0, "limit": 10000}
+    res = await get_client.get(url, params=params, headers=admin_headers())
+    etag = res.headers["ETag"]
+    headers = {**admin_headers(), "If-None-Match": f'"other", {etag}'}
+    res = await get_client.get(url, params=params, headers=headers)
+    assert res.status_code == status.HTTP_304_NOT_MODIFIED
+    await get_client.patch(
+        get_app.url_path_for("users:patch", user_id=str(user["id"])),
+        json={"confirmed": True},
+        headers=admin_headers(),
+    )
+    res = await get_client.get(url, params=params, headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", ["put", "patch"])
+async def test_update_user_if_match(
+    get_client: AsyncClient, get_app: FastAPI, method: str
+):
+    """Test conditional update of user with If-Match entity tag.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+        method (str): parametrized update method.
+    """
+    user = await test_post_user_create_201_created(get_client, get_app)
+    url = get_app.url_path_for(f"users:{method}", user_id=str(user["id"]))
+    etag = f'"{user["version"]}"'
+    res = await getattr(get_client, method)(
+        url,
+        json={"confirmed": True},
+        headers={**admin_headers(), "If-Match": etag},
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["ETag"] == f'"{user["version"] + 1}"'
+    for stale in (etag, f"W/{res.headers['ETag']}"):
+        res = await getattr(get_client, method)(
+            url,
+            json={"confirmed": False},
+            headers={**admin_headers(), "If-Match": stale},
+        )
+        assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
+    res = await get_client.get(
+        get_app.url_path_for("users:get-by-id", user_id=str(user["id"])),
+        headers=admin_headers(),
+    )
+    assert res.json()["confirmed"] is True
+    res = await getattr(get_client, method)(
+        get_app.url_path_for(f"users:{method}", user_id="99999"),
+        json={"confirmed": True},
+        headers={**admin_headers(), "If-Match": etag},
+    )
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_concurrent_patch_if_match_one_wins(
+    get_client: AsyncClient, get_app: FastAPI
+):
+    """Test concurrent updates of the same version don't overwrite.
+
+    Args:
+        get_client (AsyncClient): http test client.
+        get_app (FastAPI): testing application.
+    """
+    user = await test_post_user_create_201_created(get_client, get_app)
+    url = get_app.url_path_for("users:patch", user_id=str(user["id"]))
+    headers = {**admin_headers(), "If-Match": f'"{user["version"]}"'}
+    responses = await asyncio.gather(
+        *(
+            get_client.patch(url, json={"is_active": value}, headers=headers)
+            for value in (True, False)
+        )
+    )
+    assert sorted(res.status_code for res in responses) == [
+        status.HTTP_200_OK,
+        status.HTTP_412_PRECONDITION_FAILED,
+    ]
@@ -0,0 +1,86 @@
+"""
+Test forward authentication views.
+"""
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette import status
+
+from tests.test_security import access_token, bearer
+from utils.auth import create_access_token
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", ["GET", "HEAD"])
+async def test_auth_verify_200_ok(get_client, get_app, method):
+    with mock.patch.object(
+        AsyncEngine, "connect", autospec=True, side_effect=AsyncEngine.connect
+    ) as connect:
+        res = await get_client.request(
+            method,
+            get_app.url_path_for("auth:verify"),
+            headers=bearer(access_token(["admin", "user"])),
+        )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["X-Auth-User-Id"] == "1"
+    assert res.headers["X-Auth-User-Email"] == "admin@example.com"
+    assert res.headers["X-Auth-Scopes"] == "admin user"
+    assert not res.content
+    connect.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_auth_verify_non_ascii_email(get_client, get_app):
+    token = create_access_token(
+        {
+            "id": 1,
+            "email": "jürgen@exämple.com",
+            "jti": uuid.uuid4().hex,
+            "token_type": "access_token",
+        },
+        timedelta(seconds=300),
+    )
+    res = await get_client.get(
+        get_app.url_path_for("auth:verify"), headers=bearer(token)
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["X-Auth-User-Email"] == (
+        "UTF-8''j%C3%BCrgen%40ex%C3%A4mple.com"
+    )
+
+
+@pytest.mark.asyncio
+async def test_auth_verify_cached_decision(get_client, get_app):
+    headers = bearer(access_token())
+    url = get_app.url_path_for("auth:verify")
+    res = await get_client.get(url, headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    with mock.patch("utils.security.decode_token") as decode:
+        res = await get_client.get(url, headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["X-Auth-Scopes"] == ""
+    decode.assert_not_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {},
+        {"Authorization": "Bearer"},
+        {"Authorization": "Basic dXNlcjpwYXNz"},
+        bearer("not-a-token"),
+        bearer(access_token(expires=-10)),
+        bearer(access_token(token_type="refresh_token")),
+    ],
+)
+async def test_auth_verify_401_unauthorized(get_client, get_app, headers):
+    res = await get_client.get(
+        get_app.url_path_for("auth:verify"), headers=headers
+    )
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
+    assert res.headers["WWW-Authenticate"] == "Bearer"
+    assert "X-Auth-User-Id" not in res.headers
@@ -0,0 +1,69 @@
+"""
+Test application startup warm-up.
+"""
+from unittest import mock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette import status
+
+from tests.test_redis import async_return
+from utils.warmup import (
+    app_warmup,
+    warmup_crypto,
+    warmup_db,
+    warmup_redis,
+    warmup_validators,
+)
+
+
+@pytest.mark.asyncio
+async def test_warmup_db(engine):
+    with mock.patch.object(
+        AsyncEngine, "connect", autospec=True, side_effect=AsyncEngine.connect
+    ) as connect_mock:
+        await warmup_db(engine, 3)
+    assert connect_mock.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_warmup_redis():
+    redis = mock.MagicMock()
+    pool = redis.connection_pool
+    pool.get_connection.side_effect = lambda *args: async_return(
+        mock.MagicMock()
+    )
+    pool.release.side_effect = lambda conn: async_return(None)
+    await warmup_redis(redis, 4)
+    assert pool.get_connection.call_count == 4
+    assert pool.release.call_count == 4
+
+
+def test_warmup_validators_and_crypto():
+    warmup_validators()
+    warmup_crypto()
+
+
+@pytest.mark.asyncio
+async def test_app_warmup_failed_dependency(engine, caplog):
+    app = mock.MagicMock()
+    app.state.users.engine = engine
+    app.state.redis.connection_pool.get_connection.side_effect = (
+        ConnectionRefusedError()
+    )
+    with mock.patch("utils.warmup.warmup_crypto") as crypto_mock:
+        await app_warmup(app)
+    crypto_mock.assert_called_once()
+    assert "warm-up of redis failed" in caplog.text
+    assert "warm-up of database failed" not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_health_check_not_ready(get_client, get_app):
+    get_app.state.ready = False
+    try:
+        res = await get_client.get(get_app.url_path_for("health-check"))
+    finally:
+        get_app.state.ready = True
+    assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert res.json() == {"detail": "application is warming up"}
@@ -3,15 +3,21 @@ Authentication methods module.
 
 Methods:
     create_access_token: creates access token string
+    decode_token: decodes and verifies token string
 """
 from datetime import datetime, timedelta
 from typing import Optional
 
-from jose import jwt
+from jose import jwk, jwt
 
 from config.auth import JWT_ALGORITHM, SECRET_KEY
+from utils.tracing import traced
 
+# key material is constructed once and shared by all token verifications
+verify_key = jwk.construct(SECRET_KEY, JWT_ALGORITHM)
 
+
+@traced("jwt.encode")
 def create_access_token(
     data: dict, expires_delta: Optional[timedelta] = None
 ) -> str:
@@ -34,6 +40,7 @@ def create_access_token(
     return encoded_jwt
 
 
+@traced("jwt.decode")
 def decode_token(token: str) -> dict:
     """Decode and verify JWT token.
 
@@ -43,4 +50,4 @@ def decode_token(token: str) -> dict:
     Returns:
         dict of decoded data (key, value)
     """
-    return jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    return jwt.decode(token, verify_key, algorithms=[JWT_ALGORITHM])
@@ -0,0 +1,246 @@
+"""Circuit breaker module.
+
+Calls to a dependency are bounded by a deadline and guarded by circuit
+breaker: after a number of consecutive failures or timeouts the circuit
+opens and calls fail fast without waiting for the degraded dependency.
+Once reset timeout passes the circuit is half-open: one trial call is
+let through, its success closes the circuit, its failure opens it
+again. Requests fail with 503 instead of piling up in workers. Calls
+made for a request with deadline are bounded by what is left of it,
+running out of request budget isn't counted as dependency failure.
+
+Attributes:
+    DependencyUnavailable: dependency call failed or was rejected
+    DependencyTimeout: dependency call exceeded its deadline
+    CircuitOpen: call rejected by open circuit
+    CircuitBreaker: deadline and circuit breaker of one dependency
+
+Methods:
+    guarded: call method through ``breaker`` attribute of its object
+    dependency_unavailable_handler: respond 503 to unavailable dependency
+"""
+import asyncio
+import functools
+import math
+import time
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from utils.deadline import DeadlineExceeded, check_deadline
+from utils.metrics import REGISTRY, Counter, Gauge, Registry
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+# state gauge values
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class DependencyUnavailable(Exception):
+    """Dependency call failed or was rejected."""
+
+    def __init__(self, name: str, retry_after: Optional[float] = None):
+        """Create error.
+
+        Args:
+            name: dependency name
+            retry_after: seconds until dependency is called again
+        """
+        super().__init__(name)
+        self.name = name
+        self.retry_after = retry_after
+
+
+class DependencyTimeout(DependencyUnavailable):
+    """Dependency call exceeded its deadline."""
+
+
+class CircuitOpen(DependencyUnavailable):
+    """Call rejected by open circuit."""
+
+
+class CircuitBreaker:
+    """Deadline and circuit breaker of one dependency.
+
+    Calls made inside a guarded call are part of it: they share its
+    deadline and outcome instead of being counted twice.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        failure_threshold: int,
+        reset_timeout: float,
+        failures: Tuple[Type[BaseException], ...] = (OSError,),
+        registry: Optional[Registry] = REGISTRY,
+    ) -> None:
+        """Create closed circuit breaker.
+
+        Args:
+            name: dependency name, prefix of metrics names
+            timeout: deadline of one call in seconds
+            failure_threshold: consecutive failures opening circuit
+            reset_timeout: seconds circuit stays open
+            failures: exception types of dependency failures, other
+                exceptions are answers of a working dependency
+            registry: metrics registry, None - don't register metrics
+        """
+        self.name = name
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = failures
+        self.consecutive = 0
+        self._opened = 0.0
+        self._open = False
+        self._trial = False
+        self._inside = ContextVar(f"{name}_circuit_call", default=False)
+        Gauge(
+            f"{name}_circuit_state",
+            f"{name} circuit state: 0 - closed, 1 - half-open, 2 - open",
+            registry=registry,
+        ).set_function(lambda: STATE_VALUES[self.state])
+        self._rejected = Counter(
+            f"{name}_circuit_rejected_total",
+            f"{name} calls rejected by open circuit",
+            registry=registry,
+        )
+
+    @property
+    def state(self) -> str:
+        """Get circuit state.
+
+        Returns:
+            closed, half_open or open
+        """
+        if not self._open:
+            return CLOSED
+        if time.monotonic() - self._opened >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def _reject(self) -> CircuitOpen:
+        self._rejected.inc()
+        retry_after = self._opened + self.reset_timeout - time.monotonic()
+        return CircuitOpen(self.name, max(retry_after, 1))
+
+    def _failure(self) -> None:
+        self.consecutive += 1
+        if self._trial or self.consecutive >= self.failure_threshold:
+            self._open = True
+            self._opened = time.monotonic()
+        self._trial = False
+
+    def _success(self) -> None:
+        self.consecutive = 0
+        self._open = False
+        self._trial = False
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Call dependency within deadline unless circuit is open.
+
+        Args:
+            func: coroutine function calling dependency
+
+        Returns:
+            result of the call
+
+        Raises:
+            CircuitOpen: circuit is open or trial call is in progress
+            DependencyTimeout: call exceeded deadline
+            DependencyUnavailable: call failed with dependency failure
+            DeadlineExceeded: request deadline passed
+        """
+        if self._inside.get():
+            return await func()
+        timeout = self.timeout
+        left = check_deadline()
+        request_bound = left is not None and left < timeout
+        if request_bound:
+            timeout = left
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._trial):
+            raise self._reject()
+        self._trial = state == HALF_OPEN
+        inside = self._inside.set(True)
+        try:
+            result = await asyncio.wait_for(func(), timeout)
+        except asyncio.TimeoutError:
+            if request_bound:
+                self._trial = False
+                raise DeadlineExceeded() from None
+            self._failure()
+            raise DependencyTimeout(self.name) from None
+        except self.failures as exc:
+            self._failure()
+            raise DependencyUnavailable(self.name) from exc
+        except asyncio.CancelledError:
+            self._trial = False
+            raise
+        except Exception:
+            self._success()
+            raise
+        finally:
+            self._inside.reset(inside)
+        self._success()
+        return result
+
+
+def guarded(method: Callable[..., Awaitable[T]]) -> Callable[..., Any]:
+    """Call method through ``breaker`` attribute of its object.
+
+    Method is called directly when the object has no breaker.
+
+    Args:
+        method: coroutine method
+
+    Returns:
+        guarded coroutine method
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> T:
+        breaker: Optional[CircuitBreaker] = self.breaker
+        if breaker is None:
+            return await method(self, *args, **kwargs)
+        return await breaker.call(lambda: method(self, *args, **kwargs))
+
+    return wrapper
+
+
+async def dependency_unavailable_handler(
+    request: Request, exc: Exception
+) -> JSONResponse:
+    """Respond 503 to unavailable dependency.
+
+    Args:
+        request: incoming request
+        exc: dependency error
+
+    Returns:
+        503 response with retry after header when it's known
+    """
+    assert isinstance(exc, DependencyUnavailable)
+    headers = {}
+    if exc.retry_after is not None:
+        headers["Retry-After"] = str(math.ceil(exc.retry_after))
+    return JSONResponse(
+        {"detail": f"{exc.name} is unavailable"},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers=headers,
+    )
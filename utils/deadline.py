@@ -0,0 +1,268 @@
+"""Request deadline module.
+
+Every request gets a time budget of its route, which client may replace
+with deadline header. Absolute deadline is carried in ``deadline_var``
+context variable, so redis and database calls, SQL statement timeouts
+and password hashing jobs are bounded by what is left of the budget.
+Request is cancelled once its deadline passes or its client
+disconnects, so no work is done for responses nobody waits for.
+
+Attributes:
+    deadline_var: monotonic deadline of current request, None - unbounded
+    DeadlineExceeded: request deadline passed
+    DeadlineMiddleware: ASGI middleware enforcing request deadlines
+
+Methods:
+    remaining: get seconds left until deadline of current request
+    check_deadline: fail when deadline of current request passed
+    parse_budgets: parse route budgets setting
+    deadline_exceeded_handler: respond 504 to passed deadline
+"""
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.deadline import (
+    REQUEST_DEADLINE,
+    REQUEST_DEADLINE_HEADER,
+    REQUEST_DEADLINE_MAX,
+    REQUEST_DEADLINE_ROUTES,
+)
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+deadline_var: ContextVar[Optional[float]] = ContextVar(
+    "request_deadline", default=None
+)
+
+deadline_exceeded = Counter(
+    "requests_deadline_exceeded_total",
+    "requests cancelled because their deadline passed",
+)
+requests_abandoned = Counter(
+    "requests_abandoned_total",
+    "requests cancelled because client disconnected",
+)
+
+
+class DeadlineExceeded(Exception):
+    """Request deadline passed."""
+
+
+def remaining() -> Optional[float]:
+    """Get seconds left until deadline of current request.
+
+    Returns:
+        seconds, negative when deadline passed, None - no deadline
+    """
+    deadline = deadline_var.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline() -> Optional[float]:
+    """Fail when deadline of current request passed.
+
+    Returns:
+        seconds left until deadline, None - no deadline
+
+    Raises:
+        DeadlineExceeded: deadline passed
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+    return left
+
+
+def parse_budgets(budgets: str) -> Dict[str, float]:
+    """Parse route budgets setting.
+
+    Args:
+        budgets: comma separated route_name=seconds pairs
+
+    Returns:
+        seconds by route name
+    """
+    parsed = {}
+    for budget in budgets.split(","):
+        name, _, seconds = budget.strip().rpartition("=")
+        if name:
+            parsed[name] = float(seconds)
+    return parsed
+
+
+async def deadline_exceeded_handler(
+    request: Request, exc: Exception
+) -> JSONResponse:
+    """Respond 504 to passed deadline.
+
+    Args:
+        request: incoming request
+        exc: deadline error
+
+    Returns:
+        504 response
+    """
+    deadline_exceeded.inc()
+    return JSONResponse(
+        {"detail": "request deadline exceeded"},
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+    )
+
+
+class DeadlineMiddleware:
+    """ASGI middleware enforcing request deadlines.
+
+    Request body is read before the application is called, afterwards
+    the only message client can send is disconnect, which is awaited
+    alongside the application to cancel it.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default: float = REQUEST_DEADLINE,
+        budgets: Optional[Dict[str, float]] = None,
+        header: str = REQUEST_DEADLINE_HEADER,
+        maximum: float = REQUEST_DEADLINE_MAX,
+    ) -> None:
+        """Create middleware.
+
+        Args:
+            app: wrapped ASGI application
+            default: seconds budget of routes without own one, 0 - unbounded
+            budgets: seconds budget by route name, None - from settings
+            header: request header replacing budget
+            maximum: max seconds budget asked with header
+        """
+        self.app = app
+        self.default = default
+        if budgets is None:
+            budgets = parse_budgets(REQUEST_DEADLINE_ROUTES)
+        self.budgets = budgets
+        self.header = header.lower().encode("latin-1")
+        self.maximum = maximum
+
+    def budget(self, scope: Scope) -> Optional[float]:
+        """Get seconds budget of request.
+
+        Args:
+            scope: request scope
+
+        Returns:
+            seconds, None - unbounded
+        """
+        for key, value in scope["headers"]:
+            if key == self.header:
+                try:
+                    seconds = float(value)
+                except ValueError:
+                    break
+                if seconds > 0:
+                    return min(seconds, self.maximum)
+                break
+        seconds = self.default
+        app = scope.get("app")
+        routes = getattr(getattr(app, "router", None), "routes", ())
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                seconds = self.budgets.get(route.name, seconds)
+                break
+        return seconds or None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """Run request within its deadline until client disconnects.
+
+        Request is cancelled once its deadline passes, answered with 504
+        unless response was started, or once its client disconnects.
+
+        Args:
+            scope: request scope
+            receive: ASGI receive channel
+            send: ASGI send channel
+
+        Returns:
+            None
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = self.budget(scope)
+        body: List[Message] = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                requests_abandoned.inc()
+                return
+            body.append(message)
+            more_body = message.get("more_body", False)
+        disconnected = asyncio.Event()
+        started = False
+
+        async def replay() -> Message:
+            if body:
+                return body.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send_started(message: Message) -> None:
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        # application task copies context with request deadline
+        token = deadline_var.set(
+            time.monotonic() + seconds if seconds else None
+        )
+        try:
+            app_task = asyncio.ensure_future(
+                self.app(scope, replay, send_started)
+            )
+        finally:
+            deadline_var.reset(token)
+        client_task = asyncio.ensure_future(receive())
+        try:
+            done, _ = await asyncio.wait(
+                {app_task, client_task},
+                timeout=seconds,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        except asyncio.CancelledError:
+            app_task.cancel()
+            raise
+        finally:
+            if not client_task.done():
+                client_task.cancel()
+        if app_task in done:
+            await app_task
+            return
+        disconnected.set()
+        app_task.cancel()
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            pass
+        if client_task in done:
+            requests_abandoned.inc()
+            logger.info("client disconnected, %s cancelled", scope["path"])
+            return
+        deadline_exceeded.inc()
+        if not started:
+            response = JSONResponse(
+                {"detail": "request deadline exceeded"},
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            )
+            await response(scope, receive, send)
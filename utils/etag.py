@@ -0,0 +1,103 @@
+"""Entity tags module.
+
+Entity tags of user resources are derived from user ``version`` column
+bumped by every update, so a client holding the current representation
+is answered ``304 Not Modified`` after a version-only query, without
+reading and serializing rows. ``If-Match`` tags are turned into
+expected versions of a conditional update.
+
+Methods:
+    user_etag: entity tag of a single user
+    list_etag: entity tag of users list page
+    etag_matches: check If-None-Match header against entity tag
+    if_match_versions: parse If-Match header into user versions
+    not_modified: create 304 response
+"""
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+from starlette import status
+from starlette.responses import Response
+
+
+def user_etag(version: int) -> str:
+    """Create entity tag of user.
+
+    Args:
+        version: user version
+
+    Returns:
+        quoted entity tag
+    """
+    return f'"{version}"'
+
+
+def list_etag(versions: Iterable[Tuple[int, int]]) -> str:
+    """Create entity tag of users list page.
+
+    Args:
+        versions: user id and version pairs in list order
+
+    Returns:
+        quoted entity tag
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for user_id, version in versions:
+        digest.update(f"{user_id}:{version};".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Check If-None-Match header with weak comparison.
+
+    Args:
+        header: If-None-Match header value
+        etag: current entity tag
+
+    Returns:
+        True if any of listed tags matches current one
+    """
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def if_match_versions(header: Optional[str]) -> Optional[List[int]]:
+    """Parse If-Match header into expected user versions.
+
+    Weak tags never match with strong comparison required by If-Match.
+
+    Args:
+        header: If-Match header value
+
+    Returns:
+        expected versions, None - any version
+    """
+    if header is None or header.strip() == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+
+def not_modified(etag: str) -> Response:
+    """Create not modified response.
+
+    Args:
+        etag: current entity tag
+
+    Returns:
+        304 response without body
+    """
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+    )
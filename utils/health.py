@@ -0,0 +1,250 @@
+"""Dependencies health module.
+
+Dependencies are probed by a background task and their status is
+cached, so health endpoints answer without any I/O and probes of many
+pods don't add load to shared database and redis.
+
+Attributes:
+    DependencyStatus: last probe result of dependency
+    HealthProber: background prober of application dependencies
+
+Methods:
+    app_init_health: create prober and start probing
+    app_dispose_health: stop probing
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import FastAPI
+from redis.asyncio.client import Redis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config.health import HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[None]]
+
+
+class DependencyStatus:
+    """Last probe result of dependency."""
+
+    __slots__ = ("healthy", "latency", "checked", "error")
+
+    def __init__(
+        self,
+        healthy: bool,
+        latency: float,
+        checked: float,
+        error: Optional[str] = None,
+    ) -> None:
+        """Create status.
+
+        Args:
+            healthy: whether probe succeeded
+            latency: probe duration in seconds
+            checked: monotonic time of probe
+            error: error description if probe failed
+        """
+        self.healthy = healthy
+        self.latency = latency
+        self.checked = checked
+        self.error = error
+
+
+class HealthProber:
+    """Background prober caching dependencies status."""
+
+    def __init__(
+        self,
+        checks: Dict[str, Check],
+        interval: float,
+        timeout: float,
+    ) -> None:
+        """Create prober.
+
+        Args:
+            checks: dependency name to check coroutine function mapping
+            interval: seconds between probes
+            timeout: seconds to wait for each probe
+        """
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self.statuses: Dict[str, DependencyStatus] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def probe(self, name: str, check: Check) -> DependencyStatus:
+        """Probe dependency and cache its status.
+
+        Args:
+            name: dependency name
+            check: check coroutine function
+
+        Returns:
+            dependency status
+        """
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+        except asyncio.TimeoutError:
+            error: Optional[str] = "timeout"
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        else:
+            error = None
+        checked = time.monotonic()
+        status = DependencyStatus(
+            error is None, checked - started, checked, error
+        )
+        self.statuses[name] = status
+        return status
+
+    async def probe_all(self) -> None:
+        """Probe all dependencies concurrently.
+
+        Returns:
+            None
+        """
+        await asyncio.gather(
+            *(self.probe(name, check) for name, check in self.checks.items())
+        )
+
+    def is_healthy(self) -> bool:
+        """Check whether all dependencies are healthy.
+
+        Statuses older than three probe intervals are considered failed,
+        as prober itself may be stuck.
+
+        Returns:
+            True - all dependencies are healthy, False - otherwise
+        """
+        deadline = time.monotonic() - 3 * (self.interval + self.timeout)
+        return len(self.statuses) == len(self.checks) and all(
+            status.healthy and status.checked >= deadline
+            for status in self.statuses.values()
+        )
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Get cached status of dependencies.
+
+        Returns:
+            dependency name to status dict mapping
+        """
+        now = time.monotonic()
+        return {
+            name: {
+                "healthy": status.healthy,
+                "latency": round(status.latency, 6),
+                "age": round(now - status.checked, 3),
+                "error": status.error,
+            }
+            for name, status in self.statuses.items()
+        }
+
+    async def run(self) -> None:
+        """Probe dependencies forever.
+
+        Returns:
+            None
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.probe_all()
+            except Exception:
+                logger.exception("health probe failed")
+
+    def start(self) -> None:
+        """Start background probing task.
+
+        Returns:
+            None
+        """
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop background probing task.
+
+        Returns:
+            None
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+def database_check(engine: AsyncEngine) -> Check:
+    """Create database check.
+
+    Args:
+        engine: async database engine
+
+    Returns:
+        check coroutine function
+    """
+
+    async def check() -> None:
+        async with engine.connect() as conn:
+            res = await conn.execute(text("select 1"))
+            assert str(res.scalar()) == "1"
+
+    return check
+
+
+def redis_check(redis: Redis) -> Check:
+    """Create redis check.
+
+    Args:
+        redis: redis connection pool object
+
+    Returns:
+        check coroutine function
+    """
+
+    async def check() -> None:
+        await redis.ping()
+
+    return check
+
+
+async def app_init_health(app: FastAPI) -> None:
+    """Create dependencies prober, probe them and start probing.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    prober = HealthProber(
+        {
+            "database": database_check(app.state.users.engine),
+            "redis": redis_check(app.state.redis),
+        },
+        interval=HEALTH_PROBE_INTERVAL,
+        timeout=HEALTH_PROBE_TIMEOUT,
+    )
+    await prober.probe_all()
+    prober.start()
+    app.state.health = prober
+
+
+async def app_dispose_health(app: FastAPI) -> None:
+    """Stop dependencies probing.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    await app.state.health.stop()
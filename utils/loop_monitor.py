@@ -0,0 +1,178 @@
+"""Event loop lag monitor module.
+
+A heartbeat task sleeps for a fixed interval and measures how late the
+event loop wakes it up, lag is observed by histogram. CPU bound or
+blocking calls running inline on the loop delay every request, so a
+watchdog thread checks the heartbeat and, while the loop is overdue by
+more than a threshold, logs stack of the event loop thread and the
+running task: the blocking call is caught in the act.
+
+Attributes:
+    LoopLagMonitor: heartbeat task and watchdog thread
+
+Methods:
+    app_init_loop_monitor: start monitoring event loop of application
+    app_dispose_loop_monitor: stop monitoring
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from fastapi import FastAPI
+
+from config.loop_monitor import (
+    LOOP_LAG_INTERVAL,
+    LOOP_LAG_STACK_LIMIT,
+    LOOP_LAG_THRESHOLD,
+)
+from utils.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+loop_lag_seconds = Histogram(
+    "event_loop_lag_seconds",
+    "Delay of event loop heartbeat wake up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+loop_blocked_total = Counter(
+    "event_loop_blocked_total",
+    "Event loop blocks longer than threshold caught by watchdog",
+)
+
+
+class LoopLagMonitor:
+    """Event loop heartbeat task and watchdog thread."""
+
+    def __init__(
+        self, interval: float, threshold: float, stack_limit: int
+    ) -> None:
+        """Create stopped monitor.
+
+        Args:
+            interval: seconds between heartbeats
+            threshold: seconds of lag after which stack is logged
+            stack_limit: innermost stack frames logged
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_limit = stack_limit
+        # monotonic time the heartbeat is expected to wake up at
+        self.expected = 0.0
+        self._reported = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def heartbeat(self) -> None:
+        """Measure event loop lag forever.
+
+        Returns:
+            None
+        """
+        while True:
+            self.expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            loop_lag_seconds.observe(max(time.monotonic() - self.expected, 0))
+
+    def check(self) -> Optional[str]:
+        """Log stack of event loop thread if heartbeat is overdue.
+
+        Every block is logged once, while it still lasts.
+
+        Returns:
+            logged stack, None - event loop is not blocked
+        """
+        expected = self.expected
+        lag = time.monotonic() - expected
+        if lag <= self.threshold or expected == self._reported:
+            return None
+        frame = sys._current_frames().get(self._loop_thread or -1)
+        if frame is None:
+            return None
+        stack = "".join(traceback.format_stack(frame, self.stack_limit))
+        task = asyncio.current_task(self._loop) if self._loop else None
+        self._reported = expected
+        loop_blocked_total.inc()
+        logger.warning(
+            "event loop blocked for %.3fs in task %s\n%s",
+            lag,
+            task.get_name() if task is not None else None,
+            stack,
+        )
+        return stack
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("event loop watchdog failed")
+
+    def start(self) -> None:
+        """Start heartbeat task on running loop and watchdog thread.
+
+        Returns:
+            None
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.expected = time.monotonic() + self.interval
+        self._task = self._loop.create_task(self.heartbeat())
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Stop heartbeat task and watchdog thread.
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+async def app_init_loop_monitor(app: FastAPI) -> None:
+    """Start monitoring event loop lag.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    monitor = LoopLagMonitor(
+        LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD, LOOP_LAG_STACK_LIMIT
+    )
+    monitor.start()
+    app.state.loop_monitor = monitor
+
+
+async def app_dispose_loop_monitor(app: FastAPI) -> None:
+    """Stop monitoring event loop lag.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    await app.state.loop_monitor.stop()
@@ -0,0 +1,114 @@
+"""Memory allocations tracing module.
+
+Leak hunting in a running worker: ``tracemalloc`` is started on demand
+with a baseline snapshot, later snapshots are compared with it and the
+top allocation differences by file and line are reported. Tracing slows
+allocations down, so it is stopped when the hunt is over.
+
+Attributes:
+    MemoryTracer: tracemalloc baseline and snapshots diff
+    memory_tracer: worker memory tracer
+"""
+import threading
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+# allocations of tracemalloc itself and of import machinery are noise
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemoryTracer:
+    """Tracemalloc baseline and snapshots diff."""
+
+    def __init__(self) -> None:
+        """Create tracer without baseline."""
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        # snapshots may be taken in executor threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    def start(self, frames: int) -> Dict[str, Any]:
+        """Start tracing allocations and take baseline snapshot.
+
+        Args:
+            frames: number of stack frames stored for every allocation
+
+        Returns:
+            tracing status
+        """
+        with self._lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            tracemalloc.start(frames)
+            self.baseline = self._snapshot()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop tracing allocations and drop baseline.
+
+        Returns:
+            tracing status
+        """
+        with self._lock:
+            tracemalloc.stop()
+            self.baseline = None
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        """Get tracing status.
+
+        Returns:
+            tracing flag, traced memory size and its peak in bytes
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced": current,
+            "peak": peak,
+        }
+
+    def diff(
+        self, limit: int, group_by: str = "lineno", rebase: bool = False
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Compare a new snapshot with baseline.
+
+        Args:
+            limit: max number of reported locations
+            group_by: group allocations by lineno, filename or traceback
+            rebase: make the new snapshot baseline of the next diff
+
+        Returns:
+            top differences by size, None - tracing is not started
+        """
+        with self._lock:
+            if self.baseline is None or not tracemalloc.is_tracing():
+                return None
+            snapshot = self._snapshot()
+            stats = snapshot.compare_to(self.baseline, group_by)
+            if rebase:
+                self.baseline = snapshot
+        return [
+            {
+                "location": [
+                    f"{frame.filename}:{frame.lineno}"
+                    for frame in stat.traceback
+                ],
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[:limit]
+        ]
+
+
+memory_tracer = MemoryTracer()
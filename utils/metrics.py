@@ -0,0 +1,283 @@
+"""Application metrics module.
+
+Minimal in-process metrics registry rendered in Prometheus text
+exposition format.
+
+Attributes:
+    REGISTRY: default metrics registry
+    Counter: monotonically increasing metric
+    Gauge: metric which can go up and down or be read from callback
+    Histogram: metric counting observations in buckets
+"""
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Registry:
+    """Metrics registry."""
+
+    def __init__(self) -> None:
+        """Create empty registry."""
+        self._metrics: Dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric") -> None:
+        """Add metric to registry.
+
+        Args:
+            metric: metric to add
+
+        Returns:
+            None
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional["Metric"]:
+        """Get registered metric by name.
+
+        Args:
+            name: metric name
+
+        Returns:
+            metric if found, None - otherwise
+        """
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render all registered metrics.
+
+        Returns:
+            metrics in Prometheus text exposition format
+        """
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.collect():
+                lines.append(f"{name}{_format_labels(labels)} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    return f"{{{pairs}}}"
+
+
+class Metric:
+    """Base metric class."""
+
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        registry: Optional[Registry] = REGISTRY,
+    ) -> None:
+        """Create metric and register it.
+
+        Args:
+            name: metric name
+            documentation: metric help string
+            registry: registry to add metric to, None - don't register
+        """
+        self.name = name
+        self.documentation = documentation
+        if registry is not None:
+            registry.register(self)
+
+    def collect(self) -> Iterable[Sample]:
+        """Collect metric samples.
+
+        Returns:
+            samples of metric (name, labels, value)
+        """
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Counter metric."""
+
+    type = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Create counter starting at zero and register it.
+
+        Args:
+            args: metric positional arguments
+            kwargs: metric keyword arguments
+        """
+        super().__init__(*args, **kwargs)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase counter.
+
+        Args:
+            amount: value to add
+
+        Returns:
+            None
+        """
+        self.value += amount
+
+    def collect(self) -> Iterable[Sample]:
+        """Collect counter sample.
+
+        Returns:
+            counter value sample
+        """
+        return [(self.name, {}, self.value)]
+
+
+class Gauge(Metric):
+    """Gauge metric."""
+
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Create gauge starting at zero and register it.
+
+        Args:
+            args: metric positional arguments
+            kwargs: metric keyword arguments
+        """
+        super().__init__(*args, **kwargs)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    @property
+    def value(self) -> float:
+        """Current gauge value."""
+        if self._function is not None:
+            return float(self._function())
+        return self._value
+
+    def set(self, value: float) -> None:
+        """Set gauge value.
+
+        Args:
+            value: new value
+
+        Returns:
+            None
+        """
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase gauge value.
+
+        Args:
+            amount: value to add
+
+        Returns:
+            None
+        """
+        self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrease gauge value.
+
+        Args:
+            amount: value to subtract
+
+        Returns:
+            None
+        """
+        self._value -= amount
+
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        """Read gauge value from callback on every collection.
+
+        Args:
+            function: callback returning current value, None - to reset
+
+        Returns:
+            None
+        """
+        self._function = function
+
+    def collect(self) -> Iterable[Sample]:
+        """Collect gauge sample.
+
+        Returns:
+            gauge value sample, read from callback when it's set
+        """
+        return [(self.name, {}, self.value)]
+
+
+class Histogram(Metric):
+    """Histogram metric."""
+
+    type = "histogram"
+
+    default_buckets = (
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
+
+    def __init__(
+        self, *args, buckets: Optional[Sequence[float]] = None, **kwargs
+    ) -> None:
+        """Create empty histogram and register it.
+
+        Args:
+            args: metric positional arguments
+            buckets: upper bounds of buckets, None - default buckets
+            kwargs: metric keyword arguments
+        """
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets or self.default_buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add observation.
+
+        Args:
+            value: observed value
+
+        Returns:
+            None
+        """
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+    def collect(self) -> Iterable[Sample]:
+        """Collect histogram samples.
+
+        Returns:
+            cumulative bucket counts, sum and count of observations
+        """
+        samples: List[Sample] = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else repr(bound)
+            samples.append((f"{self.name}_bucket", {"le": le}, cumulative))
+        samples.append((f"{self.name}_sum", {}, self.sum))
+        samples.append((f"{self.name}_count", {}, self.count))
+        return samples
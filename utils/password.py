@@ -1,14 +1,123 @@
 """Password utils.
 
+Hashing runs in a thread pool, so the event loop isn't blocked by key
+derivation. Jobs of a request are bounded by its deadline: a job still
+waiting for a thread when the deadline passes or the request is
+cancelled is dropped, a running one completes with result discarded.
+
 Attributes:
+    TracedCryptContext: passlib context recording hashing as trace spans
     password_hash_ctx: context for creating passwords using
                        password based key derivative function 2 algorithm.
+    password_executor: thread pool running hashing jobs
 
+Methods:
+    hash_password: hash password in thread pool
+    verify_password: verify password in thread pool
 """
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
 from passlib.context import CryptContext
 
-password_hash_ctx = CryptContext(
+from config.auth import PASSWORD_HASH_WORKERS
+from utils.deadline import DeadlineExceeded, check_deadline
+from utils.tracing import traced
+
+T = TypeVar("T")
+
+
+class TracedCryptContext(CryptContext):
+    """Passlib context recording hash and verify calls as spans."""
+
+    @traced("password.hash")
+    def hash(self, *args, **kwargs):  # noqa: A003
+        """Hash password within ``password.hash`` span.
+
+        Args:
+            args: ``CryptContext.hash`` positional arguments
+            kwargs: ``CryptContext.hash`` keyword arguments
+
+        Returns:
+            password hash
+        """
+        return super().hash(*args, **kwargs)
+
+    @traced("password.verify")
+    def verify(self, *args, **kwargs):
+        """Verify password within ``password.verify`` span.
+
+        Args:
+            args: ``CryptContext.verify`` positional arguments
+            kwargs: ``CryptContext.verify`` keyword arguments
+
+        Returns:
+            True - password matches hash, False - otherwise
+        """
+        return super().verify(*args, **kwargs)
+
+
+password_hash_ctx = TracedCryptContext(
     schemes=["pbkdf2_sha256"],
     pbkdf2_sha256__min_rounds=18000,
     pbkdf2_sha256__max_rounds=26000,
 )
+password_executor = ThreadPoolExecutor(
+    PASSWORD_HASH_WORKERS, thread_name_prefix="password"
+)
+
+
+async def run_hashing_job(func: Callable[..., T], *args: Any) -> T:
+    """Run hashing function in thread pool within request deadline.
+
+    Args:
+        func: hashing function
+        args: function arguments
+
+    Returns:
+        function result
+
+    Raises:
+        DeadlineExceeded: request deadline passed
+    """
+    left = check_deadline()
+    loop = asyncio.get_running_loop()
+    # current span is passed to the thread to parent hashing span
+    context = contextvars.copy_context()
+    job = loop.run_in_executor(
+        password_executor, functools.partial(context.run, func, *args)
+    )
+    try:
+        return await asyncio.wait_for(job, left)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded() from None
+
+
+async def hash_password(password: str) -> str:
+    """Hash password in thread pool.
+
+    Args:
+        password: plain password
+
+    Returns:
+        password hash
+    """
+    return await run_hashing_job(password_hash_ctx.hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    """Verify password in thread pool.
+
+    Args:
+        password: plain password
+        password_hash: stored password hash
+
+    Returns:
+        True - password matches, False - otherwise
+    """
+    return await run_hashing_job(
+        password_hash_ctx.verify, password, password_hash
+    )
@@ -0,0 +1,187 @@
+"""Sampling profiler module.
+
+A background thread samples stacks of all other threads of the worker,
+the event loop thread included, at a fixed interval, so profiled code
+is not slowed down by tracing hooks. Samples are aggregated by thread
+and stack of functions and rendered as collapsed stacks for flamegraph
+tools or as speedscope JSON.
+
+Attributes:
+    SamplingProfiler: stacks sampler of worker threads
+
+Methods:
+    frame_label: function label of code object
+    is_idle: check thread waits for work
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Any, Dict, List, Optional, Tuple
+
+Stack = Tuple[str, ...]
+
+# innermost functions of threads waiting for events or work
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+}
+
+_labels: Dict[CodeType, str] = {}
+
+
+def frame_label(code: CodeType) -> str:
+    """Get function label of code object.
+
+    Args:
+        code: function code object
+
+    Returns:
+        function name with file and first line
+    """
+    label = _labels.get(code)
+    if label is None:
+        name = code.co_name.replace(";", ":")
+        label = f"{name} ({code.co_filename}:{code.co_firstlineno})"
+        _labels[code] = label
+    return label
+
+
+def is_idle(frame: FrameType) -> bool:
+    """Check thread waits for events or work.
+
+    Args:
+        frame: innermost frame of thread
+
+    Returns:
+        True if thread is idle
+    """
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class SamplingProfiler:
+    """Stacks sampler of worker threads."""
+
+    def __init__(self, interval: float, idle: bool = False) -> None:
+        """Create stopped profiler.
+
+        Args:
+            interval: seconds between samples
+            idle: include samples of idle threads
+        """
+        self.interval = interval
+        self.idle = idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.stopped = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> None:
+        """Add stacks of all other threads.
+
+        Returns:
+            None
+        """
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (not self.idle and is_idle(frame)):
+                continue
+            stack = []
+            current: Optional[FrameType] = frame
+            while current is not None:
+                stack.append(frame_label(current.f_code))
+                current = current.f_back
+            stack.reverse()
+            self.stacks[(names.get(ident, str(ident)), tuple(stack))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self) -> None:
+        """Start sampling thread.
+
+        Returns:
+            None
+        """
+        self.started = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling thread.
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.stopped = time.monotonic()
+
+    def collapsed(self) -> str:
+        """Render samples as collapsed stacks.
+
+        Returns:
+            lines of thread and functions separated by ``;`` and count
+        """
+        lines = [
+            ";".join((thread,) + stack) + f" {count}"
+            for (thread, stack), count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def speedscope(self) -> Dict[str, Any]:
+        """Render samples as speedscope sampled profiles.
+
+        Returns:
+            speedscope file dict, one profile per thread
+        """
+        frames: List[Dict[str, Any]] = []
+        index: Dict[str, int] = {}
+        profiles: Dict[str, Dict[str, Any]] = {}
+        duration = self.stopped - self.started
+        for (thread, stack), count in self.stacks.items():
+            sample = []
+            for label in stack:
+                if label not in index:
+                    index[label] = len(frames)
+                    name, _, location = label.rpartition(" (")
+                    file, _, line = location.rstrip(")").rpartition(":")
+                    frames.append(
+                        {"name": name, "file": file, "line": int(line)}
+                    )
+                sample.append(index[label])
+            profile = profiles.setdefault(
+                thread,
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": duration,
+                    "samples": [],
+                    "weights": [],
+                },
+            )
+            profile["samples"].append(sample)
+            profile["weights"].append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+            "name": "auth-fapi worker profile",
+            "exporter": __name__,
+        }
@@ -0,0 +1,268 @@
+"""Bearer token authorization module.
+
+Requests are authorized by access token signature, expiry, type and
+scope claims only, so no database query is made per request. Decoded
+claims are cached until token expiry when ``app.state.token_cache``
+is set, and token id is checked against ``app.state.revocation``
+when it is set.
+
+Attributes:
+    TokenCache: bounded cache of decoded tokens claims until expiry
+    SharedTokenCache: decoded tokens claims cache shared by processes
+    bearer_scheme: HTTP bearer credentials extractor
+
+Methods:
+    verify_token: decode access token and check revocation
+    authorize: security dependency checking required scopes
+    app_init_token_cache: create decoded tokens cache
+"""
+import json
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import (
+    HTTPAuthorizationCredentials,
+    HTTPBearer,
+    SecurityScopes,
+)
+from jose import JWTError
+from starlette import status
+from starlette.requests import Request
+
+from config.auth import TOKEN_CACHE_SIZE
+from utils.auth import decode_token
+from utils.metrics import Counter, Gauge
+from utils.shared_cache import SharedTable
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+token_cache_hits = Counter(
+    "token_cache_hits_total", "tokens claims found in decoded tokens cache"
+)
+token_cache_misses = Counter(
+    "token_cache_misses_total", "tokens decoded as not found in cache"
+)
+token_cache_size = Gauge("token_cache_size", "decoded tokens in cache")
+
+
+class TokenCache:
+    """Bounded cache of decoded tokens claims kept until token expiry.
+
+    Cached claims dicts are shared between requests
+    and must not be modified.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """Create cache.
+
+        Args:
+            max_size: max number of cached tokens
+        """
+        self.max_size = max_size
+        self._claims: Dict[str, Tuple[dict, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._claims)
+
+    def get(self, token: str) -> Optional[dict]:
+        """Get claims of not expired token.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            decoded claims, None - not cached or expired
+        """
+        entry = self._claims.get(token)
+        if entry is not None:
+            if entry[1] > time.time():
+                token_cache_hits.inc()
+                return entry[0]
+            del self._claims[token]
+        token_cache_misses.inc()
+        return None
+
+    def set(self, token: str, claims: dict) -> None:
+        """Cache token claims until token expiry.
+
+        The oldest cached token is evicted when cache is full.
+
+        Args:
+            token: encoded token
+            claims: decoded token claims
+
+        Returns:
+            None
+        """
+        if token not in self._claims and len(self._claims) >= self.max_size:
+            del self._claims[next(iter(self._claims))]
+        self._claims[token] = (claims, float(claims.get("exp", 0)))
+
+    def clear(self) -> None:
+        """Remove all cached tokens.
+
+        Returns:
+            None
+        """
+        self._claims.clear()
+
+
+class SharedTokenCache:
+    """Decoded tokens claims cache in table shared by worker processes.
+
+    A token is decoded once per host, claims which don't fit a table
+    slot are not cached.
+    """
+
+    def __init__(self, table: SharedTable) -> None:
+        """Create cache.
+
+        Args:
+            table: shared table
+        """
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def get(self, token: str) -> Optional[dict]:
+        """Get claims of not expired token.
+
+        Args:
+            token: encoded token
+
+        Returns:
+            decoded claims, None - not cached or expired
+        """
+        value = self.table.get(token.encode())
+        if value is None:
+            token_cache_misses.inc()
+            return None
+        token_cache_hits.inc()
+        return json.loads(value)
+
+    def set(self, token: str, claims: dict) -> None:
+        """Cache token claims until token expiry.
+
+        Args:
+            token: encoded token
+            claims: decoded token claims
+
+        Returns:
+            None
+        """
+        self.table.set(
+            token.encode(),
+            json.dumps(claims, separators=(",", ":")).encode(),
+            float(claims.get("exp", 0)),
+        )
+
+    def clear(self) -> None:
+        """Remove all cached tokens.
+
+        Returns:
+            None
+        """
+        self.table.clear()
+
+
+def unauthorized(detail: str, scopes: SecurityScopes) -> HTTPException:
+    """Create not authenticated error with bearer challenge.
+
+    Args:
+        detail: error description
+        scopes: required scopes
+
+    Returns:
+        HTTP 401 exception
+    """
+    challenge = "Bearer"
+    if scopes.scopes:
+        challenge = f'Bearer scope="{scopes.scope_str}"'
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": challenge},
+    )
+
+
+async def verify_token(request: Request, token: str) -> Optional[dict]:
+    """Decode access token and check it isn't revoked.
+
+    Args:
+        request: incoming request
+        token: encoded token
+
+    Returns:
+        token claims, None - token is invalid, expired or revoked
+    """
+    state = request.app.state
+    cache: Optional[TokenCache] = getattr(state, "token_cache", None)
+    claims = cache.get(token) if cache is not None else None
+    if claims is None:
+        try:
+            claims = decode_token(token)
+        except JWTError:
+            return None
+        if claims.get("token_type") != "access_token":
+            return None
+        if cache is not None:
+            cache.set(token, claims)
+    revocation = getattr(state, "revocation", None)
+    if revocation is not None and await revocation.is_revoked(
+        claims.get("jti"), claims.get("id")
+    ):
+        return None
+    return claims
+
+
+async def authorize(
+    security_scopes: SecurityScopes,
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(
+        bearer_scheme
+    ),
+) -> dict:
+    """Authorize request with bearer access token.
+
+    Args:
+        security_scopes: scopes required by path operation
+        request: incoming request
+        credentials: authorization header scheme and token
+
+    Returns:
+        access token claims
+    """
+    if credentials is None:
+        raise unauthorized("Not authenticated", security_scopes)
+    claims = await verify_token(request, credentials.credentials)
+    if claims is None:
+        raise unauthorized("Invalid token", security_scopes)
+    granted = claims.get("scope") or ()
+    for scope in security_scopes.scopes:
+        if scope not in granted:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions",
+            )
+    return claims
+
+
+async def app_init_token_cache(app: FastAPI) -> None:
+    """Create decoded tokens cache.
+
+    Cache is shared by worker processes when shared table is mapped.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    shared = getattr(app.state, "shared_cache", None)
+    if shared is not None:
+        app.state.token_cache = SharedTokenCache(shared)
+    else:
+        app.state.token_cache = TokenCache(TOKEN_CACHE_SIZE)
+    token_cache_size.set_function(lambda: len(app.state.token_cache))
@@ -0,0 +1,274 @@
+"""Cross-process shared memory cache module.
+
+Worker processes of a host map the same file, ``/dev/shm`` is memory
+backed, and share one fixed-size open addressing hash table of short
+values with expiry. Keys are hashed with keyed blake2b, so only digests
+are stored.
+
+Every slot is guarded by a sequence lock: a writer makes the sequence
+odd, writes the slot and makes it even again, a reader retries when
+the sequence is odd or changed while the slot was read. Reads take no
+locks, writers of all processes are serialized by ``flock`` of the
+file. When all probed slots are taken, the entry closest to expiry is
+evicted.
+
+A file of another layout is never resized, as processes mapping it
+would crash reading past its end: a new file replaces it, processes of
+the old layout keep using the old one until they exit.
+
+Attributes:
+    SharedTable: mmap backed hash table with expiry
+
+Methods:
+    app_init_shared_cache: map shared table file if it's configured
+    app_dispose_shared_cache: unmap shared table file
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from fastapi import FastAPI
+
+from config.auth import SECRET_KEY, SHARED_CACHE_PATH, SHARED_CACHE_SLOTS
+from utils.metrics import Counter
+
+MAGIC = b"AFAPISC1"
+HEADER = struct.Struct("<8sII")
+HEADER_SIZE = 64
+# sequence, expiry unix time, key digest, value length
+SLOT = struct.Struct("<Id16sH")
+SEQUENCE = struct.Struct("<I")
+SLOT_SIZE = 512
+VALUE_SIZE = SLOT_SIZE - SLOT.size
+# slots probed for a key
+PROBES = 8
+# reads of a slot before giving up on a busy writer
+READ_RETRIES = 16
+
+shared_cache_evictions = Counter(
+    "shared_cache_evictions_total",
+    "not expired entries evicted from shared cache",
+)
+
+
+class SharedTable:
+    """Mmap backed hash table with expiry shared by processes."""
+
+    def __init__(self, path: str, slots: int, secret: bytes) -> None:
+        """Map table file, file is created or replaced if it doesn't match.
+
+        Args:
+            path: table file path
+            slots: number of slots
+            secret: key of keys digest
+        """
+        self.path = path
+        self.slots = slots
+        self.secret = hashlib.blake2b(secret).digest()
+        self.size = HEADER_SIZE + slots * SLOT_SIZE
+        header = HEADER.pack(MAGIC, slots, SLOT_SIZE)
+        # opening and replacing of table file is serialized by lock file
+        lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            fd = self._open_matching(header)
+            self._fd = fd if fd is not None else self._create(header)
+        finally:
+            os.close(lock_fd)
+        try:
+            self._map = mmap.mmap(self._fd, self.size)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _open_matching(self, header: bytes) -> Optional[int]:
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except FileNotFoundError:
+            return None
+        if (
+            os.fstat(fd).st_size == self.size
+            and os.pread(fd, HEADER.size, 0) == header
+        ):
+            return fd
+        os.close(fd)
+        return None
+
+    def _create(self, header: bytes) -> int:
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", dir=directory)
+        try:
+            os.ftruncate(fd, self.size)
+            os.pwrite(fd, header, 0)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.close(fd)
+            os.unlink(tmp_path)
+            raise
+        return fd
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def digest(self, key: bytes) -> bytes:
+        """Hash key.
+
+        Args:
+            key: key
+
+        Returns:
+            16 bytes digest
+        """
+        return hashlib.blake2b(key, digest_size=16, key=self.secret).digest()
+
+    def _offsets(self, digest: bytes) -> Iterator[int]:
+        start = int.from_bytes(digest[:8], "little")
+        for probe in range(PROBES):
+            index = (start + probe) % self.slots
+            yield HEADER_SIZE + index * SLOT_SIZE
+
+    def _read(self, offset: int) -> Optional[Tuple[bytes, float, bytes]]:
+        for _ in range(READ_RETRIES):
+            (before,) = SEQUENCE.unpack_from(self._map, offset)
+            if before & 1:
+                continue
+            _, expires, digest, length = SLOT.unpack_from(self._map, offset)
+            start = offset + SLOT.size
+            end = start + min(length, VALUE_SIZE)
+            value = self._map[start:end]
+            (after,) = SEQUENCE.unpack_from(self._map, offset)
+            if before == after:
+                return digest, expires, value
+        return None
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """Get not expired value.
+
+        Args:
+            key: key
+
+        Returns:
+            value, None - not found, expired or slot is being written
+        """
+        digest = self.digest(key)
+        now = time.time()
+        for offset in self._offsets(digest):
+            entry = self._read(offset)
+            if entry is not None and entry[0] == digest and entry[1] > now:
+                return entry[2]
+        return None
+
+    def set(self, key: bytes, value: bytes, expires: float) -> bool:
+        """Store value until expiry.
+
+        Args:
+            key: key
+            value: value, at most ``VALUE_SIZE`` bytes
+            expires: expiry unix time
+
+        Returns:
+            True - stored, False - value is too long
+        """
+        if len(value) > VALUE_SIZE:
+            return False
+        digest = self.digest(key)
+        with self._locked():
+            now = time.time()
+            target, target_expires = 0, float("inf")
+            for offset in self._offsets(digest):
+                _, slot_expires, slot_digest, _ = SLOT.unpack_from(
+                    self._map, offset
+                )
+                if slot_digest == digest:
+                    target, target_expires = offset, 0.0
+                    break
+                if slot_expires < target_expires:
+                    target, target_expires = offset, slot_expires
+            if target_expires > now:
+                shared_cache_evictions.inc()
+            self._write(target, digest, value, expires)
+        return True
+
+    def _write(
+        self, offset: int, digest: bytes, value: bytes, expires: float
+    ) -> None:
+        (sequence,) = SEQUENCE.unpack_from(self._map, offset)
+        SEQUENCE.pack_into(self._map, offset, (sequence + 1) & 0xFFFFFFFF)
+        SLOT.pack_into(
+            self._map,
+            offset,
+            (sequence + 1) & 0xFFFFFFFF,
+            expires,
+            digest,
+            len(value),
+        )
+        start = offset + SLOT.size
+        end = start + len(value)
+        self._map[start:end] = value
+        SEQUENCE.pack_into(self._map, offset, (sequence + 2) & 0xFFFFFFFF)
+
+    def clear(self) -> None:
+        """Expire all entries.
+
+        Returns:
+            None
+        """
+        with self._locked():
+            for offset in range(HEADER_SIZE, self.size, SLOT_SIZE):
+                self._write(offset, bytes(16), b"", 0.0)
+
+    def __len__(self) -> int:
+        now = time.time()
+        offsets = range(HEADER_SIZE, self.size, SLOT_SIZE)
+        return sum(
+            SLOT.unpack_from(self._map, offset)[1] > now for offset in offsets
+        )
+
+    def close(self) -> None:
+        """Unmap table file.
+
+        Returns:
+            None
+        """
+        self._map.close()
+        os.close(self._fd)
+
+
+async def app_init_shared_cache(app: FastAPI) -> None:
+    """Map shared table file if it's configured.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    app.state.shared_cache = None
+    if SHARED_CACHE_PATH:
+        app.state.shared_cache = SharedTable(
+            SHARED_CACHE_PATH, SHARED_CACHE_SLOTS, SECRET_KEY.encode()
+        )
+
+
+async def app_dispose_shared_cache(app: FastAPI) -> None:
+    """Unmap shared table file.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    if app.state.shared_cache is not None:
+        app.state.shared_cache.close()
@@ -0,0 +1,109 @@
+"""Single-flight module.
+
+Concurrent calls with the same key share one in-flight call: the first
+caller starts it as a task, callers arriving before it completes await
+the same task instead of issuing an identical query. Nothing is cached,
+a call made after completion starts a new one.
+
+Shared task runs in the context of the caller starting it with the
+deadline cleared, so it isn't bound by the deadline of whichever caller
+happened to start it, while its trace spans still belong to that caller.
+Every caller awaits it through ``asyncio.shield`` bounded by its own
+request deadline, so a cancelled or timed out caller doesn't cancel the
+call of others. The shared task is cancelled only when all its callers
+are gone. Errors are raised to all callers of the failed call and are
+not remembered.
+
+Attributes:
+    SingleFlight: coalescing of concurrent calls by key
+    coalesced_calls: counter of calls served by another in-flight call
+"""
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from utils.deadline import DeadlineExceeded, deadline_var, remaining
+from utils.metrics import Counter
+
+T = TypeVar("T")
+
+coalesced_calls = Counter(
+    "singleflight_coalesced_total",
+    "calls which joined an identical in-flight call",
+)
+
+
+class _Call:
+    """In-flight call with number of awaiting callers."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+def _retrieve(task: asyncio.Task) -> None:
+    # mark exception retrieved when every caller was cancelled before
+    # the call failed, so the loop doesn't log it as never retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """Coalescing of concurrent calls by key."""
+
+    def __init__(self) -> None:
+        """Create group without in-flight calls."""
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Call function or join in-flight call with the same key.
+
+        Result is shared between coalesced callers as is, so it must
+        not be changed by them.
+
+        Args:
+            key: call key, equal keys mean identical calls
+            func: function starting the call
+
+        Returns:
+            call result
+
+        Raises:
+            DeadlineExceeded: deadline of the caller passed first
+        """
+        call = self._calls.get(key)
+        if call is None:
+            context = contextvars.copy_context()
+            context.run(deadline_var.set, None)
+            # task copies context it's created in
+            task = context.run(asyncio.get_running_loop().create_task, func())
+            call = _Call(task)
+            call.task.add_done_callback(_retrieve)
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._calls[key] = call
+        else:
+            coalesced_calls.inc()
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(call.task), remaining()
+            )
+        except asyncio.TimeoutError:
+            if call.task.done():
+                raise
+            raise DeadlineExceeded() from None
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                # nobody waits for the result anymore
+                self._forget(key, call)
+                call.task.cancel()
@@ -0,0 +1,709 @@
+"""Request tracing module.
+
+Minimal in-process tracer. ``TracingMiddleware`` opens a root span for
+every sampled request, continuing W3C ``traceparent`` of the caller, and
+the current span is kept in a context variable, so SQL statements, redis
+commands, password hashing and JWT operations done while handling the
+request are recorded as its child spans. Outside of a sampled request
+span helpers cost one context variable lookup.
+
+Finished spans are queued and exported in batches by a background task
+as OTLP JSON, to a file or to an OTLP/HTTP collector.
+
+Attributes:
+    current_span: context variable holding span of running code
+    tracer: application tracer
+    Span: timed operation of a trace
+    BatchSpanProcessor: batching exporter of finished spans
+    FileSpanExporter: OTLP JSON lines file exporter
+    OTLPSpanExporter: OTLP/HTTP JSON exporter
+    TracingMiddleware: ASGI middleware opening request root spans
+
+Methods:
+    start_span: create child span of current span
+    traced: decorator recording function calls as spans
+    parse_traceparent: parse W3C traceparent header
+    app_init_tracing: configure tracer and start exporting
+    app_dispose_tracing: export queued spans and stop
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+import urllib.request
+from collections import deque
+from contextvars import ContextVar, Token
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.tracing import (
+    TRACE_EXPORT_BATCH_SIZE,
+    TRACE_EXPORT_FILE,
+    TRACE_EXPORT_INTERVAL,
+    TRACE_EXPORT_TIMEOUT,
+    TRACE_EXPORT_URL,
+    TRACE_QUEUE_SIZE,
+    TRACE_SAMPLE_RATIO,
+    TRACE_SERVICE_NAME,
+)
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+exported_spans = Counter(
+    "tracing_spans_exported_total", "spans exported to trace collector"
+)
+dropped_spans = Counter(
+    "tracing_spans_dropped_total",
+    "spans dropped because export queue was full or export failed",
+)
+
+current_span: ContextVar[Optional["Span"]] = ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    """Timed operation of a trace.
+
+    Used as context manager span becomes current one for the code
+    inside, ``finish`` records a span without making it current.
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "kind",
+        "attributes",
+        "start",
+        "end",
+        "error",
+        "_token",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: int = KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Create started span.
+
+        Args:
+            name: operation name
+            trace_id: 32 hex digits trace id
+            parent_id: 16 hex digits parent span id, None - root span
+            kind: OTLP span kind
+            attributes: span attributes
+        """
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes if attributes is not None else {}
+        self.start = time.time_ns()
+        self.end = 0
+        self.error: Optional[str] = None
+        self._token: Optional[Token] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set span attribute.
+
+        Args:
+            key: attribute name
+            value: attribute value
+
+        Returns:
+            None
+        """
+        self.attributes[key] = value
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """End span and queue it for export.
+
+        Args:
+            error: exception operation failed with
+
+        Returns:
+            None
+        """
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        tracer.on_end(self)
+
+    def __enter__(self) -> "Span":
+        self._token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        current_span.reset(self._token)  # type: ignore
+        self.finish(exc)
+
+    def as_otlp(self) -> Dict[str, Any]:
+        """Convert span to OTLP JSON.
+
+        Returns:
+            span dict
+        """
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": otlp_attributes(self.attributes),
+            "status": {"code": 2, "message": self.error}
+            if self.error
+            else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Span of code running outside of sampled trace."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Ignore span attribute.
+
+        Args:
+            key: attribute name
+            value: attribute value
+
+        Returns:
+            None
+        """
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Ignore span end, nothing is exported.
+
+        Args:
+            error: exception operation failed with
+
+        Returns:
+            None
+        """
+
+    def __enter__(self) -> None:
+        """Enter code block without changing current span.
+
+        Returns:
+            None
+        """
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        """Leave code block without recording it.
+
+        Args:
+            exc_type: exception type, None - no exception
+            exc: exception raised in code block
+            tb: exception traceback
+
+        Returns:
+            None
+        """
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert attributes to OTLP JSON key values.
+
+    Args:
+        attributes: attributes dict
+
+    Returns:
+        list of OTLP key values
+    """
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        values.append({"key": key, "value": typed})
+    return values
+
+
+def otlp_payload(spans: Sequence[Span], service_name: str) -> Dict[str, Any]:
+    """Create OTLP JSON export request.
+
+    Args:
+        spans: finished spans
+        service_name: name of this service
+
+    Returns:
+        export request dict
+    """
+    resource = otlp_attributes({"service.name": service_name})
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": resource},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [span.as_otlp() for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def parse_traceparent(header: str) -> Optional[Tuple[str, str, bool]]:
+    """Parse W3C traceparent header.
+
+    Args:
+        header: header value, version-trace id-parent id-flags
+
+    Returns:
+        trace id, parent span id and sampled flag, None - invalid header
+    """
+    parts = header.strip().split("-")
+    # future versions may append fields, version 00 has exactly four
+    if len(parts) < 4 or parts[0] == "ff":
+        return None
+    if parts[0] == "00" and len(parts) != 4:
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    lengths = (len(version), len(trace_id), len(parent_id), len(flags))
+    if lengths != (2, 32, 16, 2):
+        return None
+    try:
+        trace = int(trace_id, 16)
+        parent = int(parent_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if not trace or not parent:
+        return None
+    return trace_id.lower(), parent_id.lower(), sampled
+
+
+def start_span(
+    name: str,
+    kind: int = KIND_INTERNAL,
+    attributes: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """Create child span of current span.
+
+    Args:
+        name: operation name
+        kind: OTLP span kind
+        attributes: span attributes
+
+    Returns:
+        span, or no-op span outside of sampled trace
+    """
+    parent = current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Record calls of a function as spans.
+
+    Args:
+        name: operation name
+
+    Returns:
+        decorator
+    """
+
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            if current_span.get() is None:
+                return func(*args, **kwargs)
+            with start_span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class FileSpanExporter:
+    """Exporter appending OTLP JSON export requests to a file."""
+
+    def __init__(self, path: str, service_name: str) -> None:
+        """Create exporter.
+
+        Args:
+            path: file path, one export request per line
+            service_name: name of this service
+        """
+        self.path = path
+        self.service_name = service_name
+
+    def _write(self, line: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(line)
+
+    async def export(self, spans: Sequence[Span]) -> None:
+        """Write spans.
+
+        Args:
+            spans: finished spans
+
+        Returns:
+            None
+        """
+        line = json.dumps(otlp_payload(spans, self.service_name)) + "\n"
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._write, line
+        )
+
+
+class OTLPSpanExporter:
+    """Exporter posting OTLP JSON export requests to a collector."""
+
+    def __init__(self, url: str, service_name: str, timeout: float) -> None:
+        """Create exporter.
+
+        Args:
+            url: OTLP/HTTP traces url
+            service_name: name of this service
+            timeout: seconds to wait for collector response
+        """
+        self.url = url
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def _post(self, data: bytes) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=data,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as res:
+            res.read()
+
+    async def export(self, spans: Sequence[Span]) -> None:
+        """Post spans.
+
+        Args:
+            spans: finished spans
+
+        Returns:
+            None
+        """
+        data = json.dumps(otlp_payload(spans, self.service_name)).encode()
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._post, data
+        )
+
+
+class BatchSpanProcessor:
+    """Queue of finished spans exported in batches."""
+
+    def __init__(
+        self,
+        exporter: Any,
+        batch_size: int,
+        interval: float,
+        queue_size: int,
+    ) -> None:
+        """Create processor.
+
+        Args:
+            exporter: exporter with async export(spans) method
+            batch_size: max number of spans exported at once
+            interval: seconds between exports of not full batches
+            queue_size: max number of queued spans
+        """
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue_size = queue_size
+        self.queue: Deque[Span] = deque()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, span: Span) -> None:
+        """Queue finished span.
+
+        Args:
+            span: finished span
+
+        Returns:
+            None
+        """
+        if len(self.queue) >= self.queue_size:
+            dropped_spans.inc()
+            return
+        self.queue.append(span)
+        if len(self.queue) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def flush(self) -> int:
+        """Export all queued spans.
+
+        Returns:
+            number of exported spans
+        """
+        exported = 0
+        while self.queue:
+            size = min(self.batch_size, len(self.queue))
+            batch = [self.queue.popleft() for _ in range(size)]
+            try:
+                await self.exporter.export(batch)
+            except Exception:
+                logger.exception("spans export failed")
+                dropped_spans.inc(len(batch))
+                continue
+            exported_spans.inc(len(batch))
+            exported += len(batch)
+        return exported
+
+    async def run(self) -> None:
+        """Export spans when a batch is full or interval passed.
+
+        Returns:
+            None
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Start background export task.
+
+        Returns:
+            None
+        """
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop background export task and export queued spans.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class Tracer:
+    """Sampler of request traces passing finished spans to processor."""
+
+    def __init__(self) -> None:
+        """Create disabled tracer."""
+        self.processor: Optional[BatchSpanProcessor] = None
+        self.ratio = 1.0
+
+    def configure(
+        self, processor: Optional[BatchSpanProcessor], ratio: float = 1.0
+    ) -> None:
+        """Set span processor and sample ratio.
+
+        Args:
+            processor: processor of finished spans, None - disable
+            ratio: share of new traces recorded
+
+        Returns:
+            None
+        """
+        self.processor = processor
+        self.ratio = ratio
+
+    def start_trace(
+        self,
+        name: str,
+        traceparent: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Span]:
+        """Start root span of this service if trace is sampled.
+
+        Sampling decision of the caller is followed, new traces are
+        sampled by trace id, so every service with the same ratio makes
+        the same decision.
+
+        Args:
+            name: operation name
+            traceparent: W3C traceparent header of incoming request
+            attributes: span attributes
+
+        Returns:
+            started span, None - tracing disabled or trace not sampled
+        """
+        if self.processor is None:
+            return None
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = int(trace_id[16:], 16) < self.ratio * 2**64
+        if not sampled:
+            return None
+        return Span(name, trace_id, parent_id, KIND_SERVER, attributes)
+
+    def on_end(self, span: Span) -> None:
+        """Pass finished span to processor.
+
+        Args:
+            span: finished span
+
+        Returns:
+            None
+        """
+        if self.processor is not None:
+            self.processor.add(span)
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    """ASGI middleware opening root span of every sampled request."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Create middleware.
+
+        Args:
+            app: wrapped ASGI application
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """Run request within root span continuing ``traceparent`` trace.
+
+        Span is named by route template once routing is done and
+        records response status code.
+
+        Args:
+            scope: request scope
+            receive: ASGI receive channel
+            send: ASGI send channel
+
+        Returns:
+            None
+        """
+        if scope["type"] != "http" or tracer.processor is None:
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        method = scope["method"]
+        span = tracer.start_trace(
+            f"{method} {scope['path']}",
+            traceparent,
+            {"http.method": method, "http.target": scope["path"]},
+        )
+        if span is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        with span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # route is known after routing, name spans by route
+                # template to keep span names low cardinality
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{method} {route.path}"
+                    span.set_attribute("http.route", route.path)
+
+
+async def app_init_tracing(app: FastAPI) -> None:
+    """Configure tracer and start exporting spans.
+
+    Tracing stays disabled when no export file or url is configured.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    app.state.span_processor = None
+    if TRACE_EXPORT_URL:
+        exporter: Any = OTLPSpanExporter(
+            TRACE_EXPORT_URL, TRACE_SERVICE_NAME, TRACE_EXPORT_TIMEOUT
+        )
+    elif TRACE_EXPORT_FILE:
+        exporter = FileSpanExporter(TRACE_EXPORT_FILE, TRACE_SERVICE_NAME)
+    else:
+        return
+    processor = BatchSpanProcessor(
+        exporter,
+        batch_size=TRACE_EXPORT_BATCH_SIZE,
+        interval=TRACE_EXPORT_INTERVAL,
+        queue_size=TRACE_QUEUE_SIZE,
+    )
+    tracer.configure(processor, TRACE_SAMPLE_RATIO)
+    processor.start()
+    app.state.span_processor = processor
+
+
+async def app_dispose_tracing(app: FastAPI) -> None:
+    """Export queued spans and disable tracer.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    processor = app.state.span_processor
+    if processor is not None:
+        tracer.configure(None)
+        await processor.stop()
@@ -0,0 +1,135 @@
+"""Startup warm-up module.
+
+Pays cold start costs before application starts accepting traffic:
+opens database and redis pool connections, compiles and prepares hot
+queries, builds validators and runs password hash and JWT round trips.
+
+Methods:
+    app_warmup: run all warm-up steps for application
+"""
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from datetime import timedelta
+
+from fastapi import FastAPI
+from redis.asyncio.client import Redis
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config.warmup import WARMUP_DB_CONNECTIONS, WARMUP_REDIS_CONNECTIONS
+from db.redis import is_cluster
+from repositories.users import (
+    UserRecord,
+    select_user_by_email,
+    select_user_by_id,
+)
+from schemas import Auth, Register, UserDB
+from schemas.login import Token
+from schemas.users import UserOut
+from utils.auth import create_access_token, decode_token
+from utils.password import password_hash_ctx
+
+logger = logging.getLogger(__name__)
+
+
+async def warmup_db(engine: AsyncEngine, connections: int) -> None:
+    """Open pool connections and prepare hot queries on each of them.
+
+    Args:
+        engine: async database engine
+        connections: number of connections to open
+
+    Returns:
+        None
+    """
+    async with AsyncExitStack() as stack:
+        conns = await asyncio.gather(
+            *(
+                stack.enter_async_context(engine.connect())
+                for _ in range(connections)
+            )
+        )
+        for conn in conns:
+            await conn.execute(select_user_by_id, {"user_id": 0})
+            await conn.execute(select_user_by_email, {"email": ""})
+
+
+async def warmup_redis(redis: Redis, connections: int) -> None:
+    """Open redis pool connections.
+
+    Args:
+        redis: redis connection pool object
+        connections: number of connections to open
+
+    Returns:
+        None
+    """
+    if is_cluster(redis):
+        # discovers slots of nodes and connects to them
+        await redis.initialize()
+        return
+    pool = redis.connection_pool
+    conns = []
+    try:
+        for _ in range(connections):
+            conns.append(await pool.get_connection("PING"))
+    finally:
+        for conn in conns:
+            await pool.release(conn)
+
+
+def warmup_validators() -> None:
+    """Run validation and serialization of schemas used by views.
+
+    Returns:
+        None
+    """
+    register = Register(email="warmup@example.com", password="warmup")
+    Auth.model_validate(register.model_dump())
+    record = UserRecord(
+        id=0,
+        email=register.email,
+        password="warmup",
+        is_active=True,
+        is_superuser=False,
+        confirmed=False,
+        version=1,
+    )
+    UserDB.model_validate(record, from_attributes=True).model_dump_json()
+    UserOut.model_validate(record, from_attributes=True).model_dump_json()
+    Token(access_token="", refresh_token="").model_dump_json()
+
+
+def warmup_crypto() -> None:
+    """Run password hash and JWT round trips.
+
+    Returns:
+        None
+    """
+    password_hash_ctx.verify("warmup", password_hash_ctx.hash("warmup"))
+    decode_token(create_access_token({"id": 0}, timedelta(seconds=5)))
+
+
+async def app_warmup(app: FastAPI) -> None:
+    """Warm-up application before accepting traffic.
+
+    Failures are logged and don't prevent application start,
+    dependency health is reported by health checks.
+
+    Args:
+        app: FastAPI application
+
+    Returns:
+        None
+    """
+    steps = (
+        ("database", warmup_db(app.state.users.engine, WARMUP_DB_CONNECTIONS)),
+        ("redis", warmup_redis(app.state.redis, WARMUP_REDIS_CONNECTIONS)),
+    )
+    for name, step in steps:
+        try:
+            await step
+        except Exception:
+            logger.exception("warm-up of %s failed", name)
+    warmup_validators()
+    warmup_crypto()
@@ -0,0 +1,209 @@
+"""
+Debug views module.
+
+Admin only endpoints for investigating performance of a running worker.
+"""
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, Security
+from starlette import status
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+
+from config.debug import (
+    MEMORY_TRACE_FRAMES,
+    PROFILE_MAX_SECONDS,
+    PROFILE_SAMPLE_INTERVAL,
+)
+from db.query_stats import query_stats
+from utils.memory import memory_tracer
+from utils.profiler import SamplingProfiler
+from utils.security import authorize
+
+router = APIRouter(dependencies=[Security(authorize, scopes=["admin"])])
+
+# one profile of a worker at a time
+profile_lock = asyncio.Lock()
+
+
+@router.get(
+    "/debug/queries",
+    name="debug:queries",
+    summary="aggregated SQL statements stats",
+    description=(
+        "statements executed by this worker with calls, errors, slow"
+        " calls and timings in milliseconds, plan of a sampled slow call"
+    ),
+)
+async def debug_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    order: Literal[
+        "total_ms", "mean_ms", "max_ms", "calls", "errors", "slow"
+    ] = "total_ms",
+) -> dict:
+    """Get statements stats handler.
+
+    Args:
+        limit: max number of statements
+        order: stats field to order statements by, descending
+
+    Returns:
+        slow query threshold and statements stats
+    """
+    return {
+        "threshold_ms": query_stats.threshold * 1000,
+        "statements": query_stats.top(limit, order),
+    }
+
+
+@router.delete(
+    "/debug/queries",
+    name="debug:queries-reset",
+    summary="reset SQL statements stats",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def debug_queries_reset() -> None:
+    """Reset statements stats handler.
+
+    Returns:
+        None
+    """
+    query_stats.reset()
+
+
+@router.get(
+    "/debug/profile",
+    name="debug:profile",
+    summary="sample CPU profile of the worker",
+    description=(
+        "samples stacks of worker threads, event loop included, for given"
+        " seconds and returns collapsed stacks for flamegraph tools or"
+        " speedscope JSON, 409 - another profile is running"
+    ),
+    response_class=PlainTextResponse,
+)
+async def debug_profile(
+    seconds: float = Query(5, gt=0, le=PROFILE_MAX_SECONDS),
+    output: Literal["collapsed", "speedscope"] = "collapsed",
+    idle: bool = False,
+) -> Response:
+    """Profile sampled stacks handler.
+
+    Args:
+        seconds: profile duration
+        output: collapsed stacks or speedscope JSON
+        idle: include samples of threads waiting for work
+
+    Returns:
+        profile response
+    """
+    if profile_lock.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another profile is running",
+        )
+    async with profile_lock:
+        profiler = SamplingProfiler(PROFILE_SAMPLE_INTERVAL, idle)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.get_running_loop().run_in_executor(
+                None, profiler.stop
+            )
+    if output == "speedscope":
+        return JSONResponse(
+            profiler.speedscope(),
+            headers={
+                "Content-Disposition": "attachment; filename=profile.json"
+            },
+        )
+    return PlainTextResponse(profiler.collapsed())
+
+
+@router.get(
+    "/debug/memory",
+    name="debug:memory",
+    summary="allocations tracing status",
+)
+async def debug_memory() -> dict:
+    """Get allocations tracing status handler.
+
+    Returns:
+        tracing flag, traced memory size and its peak in bytes
+    """
+    return memory_tracer.status()
+
+
+@router.post(
+    "/debug/memory/start",
+    name="debug:memory-start",
+    summary="start tracing allocations",
+    description=(
+        "starts tracemalloc and takes baseline snapshot, restarts tracing"
+        " with a new baseline when it is already started"
+    ),
+)
+async def debug_memory_start(
+    frames: int = Query(MEMORY_TRACE_FRAMES, ge=1, le=100)
+) -> dict:
+    """Start tracing allocations handler.
+
+    Args:
+        frames: number of stack frames stored for every allocation
+
+    Returns:
+        tracing status
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        None, memory_tracer.start, frames
+    )
+
+
+@router.get(
+    "/debug/memory/diff",
+    name="debug:memory-diff",
+    summary="top allocation differences since baseline",
+    description=(
+        "takes snapshot and returns locations with the largest growth of"
+        " allocated memory since baseline, 409 - tracing is not started"
+    ),
+)
+async def debug_memory_diff(
+    limit: int = Query(20, ge=1, le=1000),
+    group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+    rebase: bool = False,
+) -> dict:
+    """Compare allocations to snapshot handler.
+
+    Args:
+        limit: max number of reported locations
+        group_by: group allocations by line, file or whole traceback
+        rebase: make the new snapshot baseline of the next diff
+
+    Returns:
+        tracing status and top differences by size
+    """
+    stats = await asyncio.get_running_loop().run_in_executor(
+        None, memory_tracer.diff, limit, group_by, rebase
+    )
+    if stats is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Allocations tracing is not started",
+        )
+    return {**memory_tracer.status(), "stats": stats}
+
+
+@router.post(
+    "/debug/memory/stop",
+    name="debug:memory-stop",
+    summary="stop tracing allocations",
+)
+async def debug_memory_stop() -> dict:
+    """Stop tracing allocations handler.
+
+    Returns:
+        tracing status
+    """
+    return memory_tracer.stop()
@@ -8,8 +8,11 @@ from sqlalchemy import text
 from sqlalchemy.exc import InterfaceError
 from starlette import status
 from starlette.requests import Request
+from starlette.responses import JSONResponse
 
+from db.database import database_breaker
 from db.redis import get_redis_key
+from utils.circuit import DependencyUnavailable
 
 router = APIRouter()
 
@@ -32,16 +35,70 @@ async def health_check(request: Request) -> dict:
     Returns:
         dict or throws exception
     """
+    if not request.app.state.ready:
+        raise HTTPException(
+            detail="application is warming up",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
     db = request.app.state.db
     redis = request.app.state.redis
     try:
-        res = await db.execute(text("select 1"))
+        res = await database_breaker.call(lambda: db.execute(text("select 1")))
         one = res.scalar()
         assert str(one) == "1"
         await get_redis_key(redis, uuid.uuid4().hex)
         return {"detail": "OK"}
-    except (ConnectionRefusedError, InterfaceError, ConnectionError):
+    except (
+        ConnectionRefusedError,
+        InterfaceError,
+        ConnectionError,
+        DependencyUnavailable,
+    ):
         raise HTTPException(
             detail="connection failed",
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
         )
+
+
+@router.get(
+    "/health/live",
+    name="health-live",
+    summary="check application is alive",
+    description="responds without any I/O while event loop is serving",
+)
+async def health_live() -> dict:
+    """Liveness check.
+
+    Returns:
+        dict with status
+    """
+    return {"detail": "OK"}
+
+
+@router.get(
+    "/health/ready",
+    name="health-ready",
+    summary="check application is ready to serve traffic",
+    description=(
+        "responds with dependencies status cached by background prober,"
+        " fails until warm-up is finished or if any dependency is down"
+    ),
+)
+async def health_ready(request: Request) -> JSONResponse:
+    """Readiness check.
+
+    Args:
+        request: incoming request.
+
+    Returns:
+        json response with dependencies status
+    """
+    state = request.app.state
+    prober = getattr(state, "health", None)
+    dependencies = prober.snapshot() if prober else {}
+    if state.ready and prober and prober.is_healthy():
+        return JSONResponse({"detail": "OK", "dependencies": dependencies})
+    return JSONResponse(
+        {"detail": "not ready", "dependencies": dependencies},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
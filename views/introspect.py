@@ -0,0 +1,105 @@
+"""
+Token introspection views module.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Security
+from jose import JWTError
+from starlette import status
+from starlette.requests import Request
+
+from db.revocation import tokens_active
+from repositories.tokens import get_token_store
+from schemas.introspect import IntrospectBatch, IntrospectionBatch
+from utils.auth import decode_token
+from utils.security import authorize
+
+router = APIRouter()
+
+INACTIVE = {"active": False}
+
+
+def decode_tokens(request: Request, tokens: List[str]) -> List[Optional[dict]]:
+    """Decode tokens using decoded tokens cache when it's available.
+
+    Args:
+        request: incoming request
+        tokens: encoded tokens
+
+    Returns:
+        claims of every token, None - invalid or expired token
+    """
+    cache = getattr(request.app.state, "token_cache", None)
+    claims: List[Optional[dict]] = []
+    for token in tokens:
+        token_claims = cache.get(token) if cache is not None else None
+        if token_claims is None:
+            try:
+                token_claims = decode_token(token)
+            except JWTError:
+                pass
+        claims.append(token_claims)
+    return claims
+
+
+def introspection(claims: dict) -> dict:
+    """Create RFC 7662 introspection result of active token.
+
+    Args:
+        claims: decoded token claims
+
+    Returns:
+        introspection result
+    """
+    return {
+        "active": True,
+        "scope": " ".join(claims.get("scope") or ()),
+        "username": claims.get("email"),
+        "sub": str(claims["id"]) if "id" in claims else None,
+        "exp": claims.get("exp"),
+        "jti": claims.get("jti"),
+        "token_type": claims.get("token_type"),
+    }
+
+
+@router.post(
+    "/token/introspect/batch",
+    name="token:introspect-batch",
+    summary="introspect a batch of tokens",
+    status_code=status.HTTP_200_OK,
+    description=(
+        "checks signature, expiry and revocation of every token"
+        " and responds with RFC 7662 results in the same order"
+    ),
+    response_model=IntrospectionBatch,
+    response_model_exclude_none=True,
+    dependencies=[Security(authorize, scopes=["admin"])],
+)
+async def token_introspect_batch(
+    batch: IntrospectBatch, request: Request
+) -> dict:
+    """Batch token introspection handler.
+
+    Revocation status of all tokens is read with one redis round trip,
+    refresh tokens kept in another store are checked concurrently.
+
+    Args:
+        batch: tokens to introspect
+        request: incoming request
+
+    Returns:
+        introspection results
+    """
+    claims = decode_tokens(request, batch.tokens)
+    active = await tokens_active(
+        request.app.state.redis,
+        batch.tokens,
+        claims,
+        get_token_store(request),
+    )
+    return {
+        "results": [
+            introspection(token_claims) if is_active else INACTIVE
+            for token_claims, is_active in zip(claims, active)
+        ]
+    }
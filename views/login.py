@@ -1,22 +1,33 @@
 """
 Login views handlers.
 """
+import logging
 import uuid
 from datetime import timedelta
 
-from fastapi import APIRouter, HTTPException
-from sqlalchemy.future import select
+from fastapi import APIRouter, Depends, HTTPException
 from starlette import status
 from starlette.requests import Request
 
-from config.auth import ACCESS_TOKEN_EXPIRE, REFRESH_TOKEN_EXPIRE
-from db.redis import set_redis_key
-from models import User
+from config.auth import (
+    ACCESS_TOKEN_EXPIRE,
+    LOGIN_TOKEN_STORE_POLICY,
+    REFRESH_TOKEN_EXPIRE,
+)
+from repositories.tokens import TokenStore, get_token_store
+from repositories.users import (
+    UserRecord,
+    UserRepository,
+    get_user_repository,
+)
 from schemas import Auth, Register, UserCreate
 from schemas.login import Token
 from schemas.users import UserOut
 from utils.auth import create_access_token
-from utils.password import password_hash_ctx
+from utils.circuit import DependencyUnavailable
+from utils.password import hash_password, verify_password
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -29,31 +40,27 @@ router = APIRouter()
     description="Registers new user",
     response_model=UserOut,
 )
-async def login_register(register: Register, request: Request) -> User:
+async def login_register(
+    register: Register, users: UserRepository = Depends(get_user_repository)
+) -> UserRecord:
     """View function for creating a new unprivileged user from registration.
 
     Args:
         register: user data login and password
-        request: request instance
+        users: users repository
 
     Returns:
         a newly registered user from DB
     """
-    db = request.app.state.db
-    res = await db.execute(select(User).filter(User.email == register.email))
-    found_users = res.scalar_one_or_none()
+    found_users = await users.get_by_email(register.email)
     if found_users:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"User with email '{register.email}' already exists",
         )
     user = UserCreate.model_validate(register.model_dump())
-    user.password = password_hash_ctx.hash(register.password)
-    user_db = User(**user.model_dump())
-    db.add(user_db)
-    await db.commit()
-    await db.refresh(user_db)
-    return user_db
+    user.password = await hash_password(register.password)
+    return await users.create(user.model_dump())
 
 
 @router.post(
@@ -64,25 +71,34 @@ async def login_register(register: Register, request: Request) -> User:
     description="Auth user and get access and refresh tokens",
     response_model=Token,
 )
-async def login_auth(auth: Auth, request: Request) -> Token:
+async def login_auth(
+    auth: Auth,
+    request: Request,
+    users: UserRepository = Depends(get_user_repository),
+    tokens: TokenStore = Depends(get_token_store),
+) -> Token:
     """Login view handler function.
 
     Args:
         auth: incoming auth data
         request: incoming request
+        users: users repository
+        tokens: refresh tokens store
 
     Returns:
-        JWT token
+        JWT token, access token only when refresh tokens store is
+        unavailable and ``LOGIN_TOKEN_STORE_POLICY`` is degrade
+
+    Raises:
+        DependencyUnavailable: refresh tokens store is unavailable and
+            ``LOGIN_TOKEN_STORE_POLICY`` is fail
     """
-    res = await request.app.state.db.execute(
-        select(User).filter(User.email == auth.email)
-    )
-    db_user = res.scalar()
+    db_user = await users.get_by_email(auth.email)
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    if not password_hash_ctx.verify(auth.password, db_user.password):
+    if not await verify_password(auth.password, db_user.password):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
@@ -103,8 +119,13 @@ async def login_auth(auth: Auth, request: Request) -> Token:
             refresh_token, timedelta(seconds=REFRESH_TOKEN_EXPIRE)
         ),
     )
-    await set_redis_key(
-        request.app.state.redis, token.refresh_token, "1", REFRESH_TOKEN_EXPIRE
-    )
+    try:
+        await tokens.add(token.refresh_token, REFRESH_TOKEN_EXPIRE)
+    except DependencyUnavailable as exc:
+        if LOGIN_TOKEN_STORE_POLICY != "degrade":
+            raise
+        logger.warning("%s is unavailable, refresh token not issued", exc)
+        token.refresh_token = None
+    request.app.state.last_login.record(db_user.id)
 
     return token
@@ -0,0 +1,27 @@
+"""
+Metrics views module.
+"""
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+
+from utils.metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    name="metrics",
+    summary="application metrics",
+    description="application metrics in Prometheus text exposition format",
+    response_class=PlainTextResponse,
+)
+async def metrics() -> PlainTextResponse:
+    """Render application metrics.
+
+    Returns:
+        plain text response with metrics
+    """
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
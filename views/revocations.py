@@ -0,0 +1,148 @@
+"""
+Revocation feed views module.
+
+Downstream token caches subscribe to ``/revocations/feed`` server-sent
+events stream. A new subscriber gets a compact ``snapshot`` event with
+revocations still in effect, a reconnecting one resumes after
+``Last-Event-ID``, then every new revocation is sent as ``revoke``
+event.
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Header, Security
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from config.auth import REVOCATION_FEED_KEEPALIVE
+from db.revocation import (
+    Event,
+    RevocationFeed,
+    Subscription,
+    is_retained,
+    parse_id,
+    read_events,
+    snapshot,
+)
+from utils.security import authorize
+
+router = APIRouter()
+
+INTEGER_FIELDS = ("user_id", "exp")
+
+
+def format_event(event_id: str, name: str, data: dict) -> str:
+    """Format server-sent event.
+
+    Args:
+        event_id: stream id
+        name: event name
+        data: event data
+
+    Returns:
+        event text
+    """
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {name}\ndata: {payload}\n\n"
+
+
+def format_revoke(event: Event) -> str:
+    """Format revocation stream event.
+
+    Args:
+        event: stream id and fields
+
+    Returns:
+        event text
+    """
+    event_id, fields = event
+    data = {
+        key: int(value) if key in INTEGER_FIELDS else value
+        for key, value in fields.items()
+    }
+    return format_event(event_id, "revoke", data)
+
+
+async def feed_events(
+    feed: RevocationFeed,
+    subscription: Subscription,
+    first: str,
+    last_id: str,
+) -> AsyncIterator[str]:
+    """Stream events to subscriber.
+
+    Args:
+        feed: revocation feed
+        subscription: subscription of this subscriber
+        first: already read snapshot or missed events
+        last_id: stream id of the last read event
+
+    Yields:
+        events text
+    """
+    try:
+        if first:
+            yield first
+        queue = subscription.queue
+        while not (subscription.lagged and queue.empty()):
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), REVOCATION_FEED_KEEPALIVE
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if parse_id(event[0]) <= parse_id(last_id):
+                continue
+            last_id = event[0]
+            yield format_revoke(event)
+    finally:
+        feed.unsubscribe(subscription)
+
+
+@router.get(
+    "/revocations/feed",
+    name="revocations:feed",
+    summary="stream of revoked tokens and disabled users",
+    description=(
+        "server-sent events: snapshot of revocations in effect on connect,"
+        " or missed events after Last-Event-ID, then new revocations"
+    ),
+    response_class=StreamingResponse,
+    dependencies=[Security(authorize, scopes=["admin"])],
+)
+async def revocations_feed(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+) -> StreamingResponse:
+    """Revocation feed handler.
+
+    Args:
+        request: incoming request
+        last_event_id: stream id of the last event received before
+
+    Returns:
+        streaming response with server-sent events
+    """
+    redis = request.app.state.redis
+    feed: RevocationFeed = request.app.state.revocation_feed
+    subscription = await feed.subscribe()
+    try:
+        if last_event_id and is_retained(last_event_id):
+            last_id = last_event_id
+            events = await read_events(redis, last_id)
+            if events:
+                last_id = events[-1][0]
+            first = "".join(format_revoke(event) for event in events)
+        else:
+            last_id, data = await snapshot(redis)
+            first = format_event(last_id, "snapshot", data)
+    except BaseException:
+        feed.unsubscribe(subscription)
+        raise
+    return StreamingResponse(
+        feed_events(feed, subscription, first, last_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,18 +1,50 @@
 """
 Users views handle functions.
 """
-from typing import List, Optional
+from typing import List, Optional, Sequence, Union
 
-from fastapi import APIRouter, HTTPException
-from sqlalchemy.future import select
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Security,
+)
 from starlette import status
 from starlette.requests import Request
+from starlette.responses import Response
 
-from models.users import User
-from schemas.users import UserCreate, UserDB, UserOut, UserUpdate
-from utils.password import password_hash_ctx
+from config.auth import USERS_BATCH_SIZE
+from db.revocation import disable_user
+from repositories.outbox import list_events
+from repositories.users import (
+    UserRecord,
+    UserRepository,
+    VersionConflict,
+    get_user_repository,
+)
+from schemas.users import (
+    UserBatch,
+    UserBatchOut,
+    UserCreate,
+    UserDB,
+    UserEventList,
+    UserOut,
+    UserUpdate,
+)
+from utils.etag import (
+    etag_matches,
+    if_match_versions,
+    list_etag,
+    not_modified,
+    user_etag,
+)
+from utils.password import hash_password
+from utils.security import authorize
 
-router = APIRouter()
+# admin operations, authorized from access token claims only
+router = APIRouter(dependencies=[Security(authorize, scopes=["admin"])])
 
 
 @router.get(
@@ -20,26 +52,41 @@ router = APIRouter()
     name="users:get",
     summary="get list of users",
     status_code=status.HTTP_200_OK,
-    description="get list of users with limit and skip page",
+    description=(
+        "get list of users with limit and skip page,"
+        " 304 - page not changed since If-None-Match ETag"
+    ),
     response_model=List[UserOut],
+    responses={status.HTTP_304_NOT_MODIFIED: {"description": "Not Modified"}},
 )
 async def user_get_list(
-    request: Request, skip: int = 0, limit: int = 50
-) -> List[tuple]:
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    if_none_match: Optional[str] = Header(None),
+    users: UserRepository = Depends(get_user_repository),
+) -> Union[List[UserRecord], Response]:
     """Get user list of users request handler.
 
     Args:
-        request: incoming request
+        response: outgoing response headers
         skip: page number
         limit: items per page
+        if_none_match: entity tags held by client
+        users: users repository
 
     Returns:
-        list of found tuples
+        list of found user records, or not modified response
     """
-    db = request.app.state.db
-    res = await db.execute(select(User).offset(skip).limit(limit))
-    found_users = res.scalars().all()
-    return found_users
+    if if_none_match:
+        etag = list_etag(await users.get_list_versions(skip, limit))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    records = await users.get_list(skip, limit)
+    response.headers["ETag"] = list_etag(
+        (record.id, record.version) for record in records
+    )
+    return records
 
 
 @router.post(
@@ -50,56 +97,179 @@ async def user_get_list(
     description="Creates a new user with post query",
     response_model=UserDB,
 )
-async def user_post(user: UserCreate, request: Request) -> Optional[User]:
+async def user_post(
+    user: UserCreate, users: UserRepository = Depends(get_user_repository)
+) -> Optional[UserRecord]:
     """Post query handler for creating a new user.
 
     Args:
         user: user data
-        request: incoming request
+        users: users repository
 
     Returns:
         created user from db
     """
-    db = request.app.state.db
-    res = await db.execute(select(User).filter(User.email == user.email))
-    found_users = res.scalar_one_or_none()
+    found_users = await users.get_by_email(user.email)
     if found_users:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"User with email '{user.email}' already exists",
         )
-    user_db = User(**user.model_dump())
-    user_db.password = password_hash_ctx.hash(user_db.password)
-    db.add(user_db)
-    await db.commit()
-    await db.refresh(user_db)
-    return user_db
+    values = user.model_dump()
+    values["password"] = await hash_password(user.password)
+    return await users.create(values)
+
+
+@router.get(
+    "/users/events",
+    name="users:events",
+    summary="replay user change events",
+    description=(
+        "returns published user changes after position in publication"
+        " order, pass last_position of a page as after to get the next one;"
+        " positions become visible in order, so no event is skipped"
+    ),
+    response_model=UserEventList,
+)
+async def user_events(
+    request: Request,
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+) -> dict:
+    """Replay user change events handler.
+
+    Args:
+        request: incoming request
+        after: position of the last received event
+        limit: max number of events
+
+    Returns:
+        events page and position of its last event
+    """
+    events = await list_events(request.app.state.outbox.engine, after, limit)
+    return {
+        "events": [event.as_dict() for event in events],
+        "last_position": events[-1].position if events else after,
+    }
+
+
+async def find_users(users: UserRepository, ids: Sequence[int]) -> dict:
+    """Find users by ids with a single repository lookup.
+
+    Args:
+        users: users repository
+        ids: requested user ids
+
+    Returns:
+        users in requested order and ids of missing ones
+    """
+    unique_ids = list(dict.fromkeys(ids))
+    found = await users.get_many(unique_ids)
+    return {
+        "users": [found.get(user_id) for user_id in ids],
+        "missing": [user_id for user_id in unique_ids if user_id not in found],
+    }
+
+
+@router.get(
+    "/users/batch",
+    name="users:get-batch",
+    summary="get many users by ids",
+    description=(
+        "finds users by comma separated ids with a single query,"
+        " users are returned in requested order, null - not found"
+    ),
+    response_model=UserBatchOut,
+)
+async def user_get_batch(
+    ids: str = Query(..., description="comma separated user ids"),
+    users: UserRepository = Depends(get_user_repository),
+) -> dict:
+    """Get many users by ids handler.
+
+    Args:
+        ids: comma separated user ids
+        users: users repository
+
+    Returns:
+        users in requested order and ids of missing ones
+    """
+    try:
+        user_ids = [int(user_id) for user_id in ids.split(",") if user_id]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids must be comma separated integers",
+        )
+    if not 0 < len(user_ids) <= USERS_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"from 1 to {USERS_BATCH_SIZE} ids are expected",
+        )
+    return await find_users(users, user_ids)
+
+
+@router.post(
+    "/users/batch",
+    name="users:post-batch",
+    summary="get many users by ids from request body",
+    description=(
+        "same as GET /users/batch for id lists too long for query string"
+    ),
+    response_model=UserBatchOut,
+)
+async def user_post_batch(
+    batch: UserBatch, users: UserRepository = Depends(get_user_repository)
+) -> dict:
+    """Get many users by ids in request body handler.
+
+    Args:
+        batch: requested user ids
+        users: users repository
+
+    Returns:
+        users in requested order and ids of missing ones
+    """
+    return await find_users(users, batch.ids)
 
 
 @router.get(
     "/users/{user_id}",
     name="users:get-by-id",
     summary="get user by id",
+    description="304 - user not changed since If-None-Match ETag",
     response_model=UserDB,
+    responses={status.HTTP_304_NOT_MODIFIED: {"description": "Not Modified"}},
 )
-async def user_get_by_id(user_id: int, request: Request) -> Optional[UserDB]:
+async def user_get_by_id(
+    user_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    users: UserRepository = Depends(get_user_repository),
+) -> Union[UserRecord, Response]:
     """Get user by id from DB handler.
 
     Args:
         user_id: incoming user id
-        request: incoming request
+        response: outgoing response headers
+        if_none_match: entity tags held by client
+        users: users repository
 
     Returns:
-        user from db, or None of not found
+        user from db, or not modified response
     """
-    res = await request.app.state.db.execute(
-        select(User).filter(User.id == user_id)
-    )
-    db_user = res.scalar()
+    if if_none_match:
+        version = await users.get_version(user_id)
+        if version is not None:
+            etag = user_etag(version)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+    db_user = await users.get_by_id(user_id)
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
+    response.headers["ETag"] = user_etag(db_user.version)
     return db_user
 
 
@@ -107,24 +277,37 @@ async def user_get_by_id(user_id: int, request: Request) -> Optional[UserDB]:
     "/users/{user_id}",
     name="users:put",
     summary="update user data by id overwriting all attributes",
+    description="412 - user changed since If-Match ETag",
     response_model=UserDB,
+    responses={
+        status.HTTP_412_PRECONDITION_FAILED: {
+            "description": "Precondition Failed"
+        }
+    },
 )
 async def user_put(
-    user_id: int, user: UserUpdate, request: Request
-) -> Optional[UserDB]:
+    user_id: int,
+    user: UserUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    users: UserRepository = Depends(get_user_repository),
+) -> Optional[UserRecord]:
     """Update user in db request handler.
 
     Args:
         user_id: updating user id
         user: new user data
-        request: incoming request
+        response: outgoing response headers
+        if_match: entity tags of user versions to be updated
+        users: users repository
 
     Returns:
         updated user from DB
     """
     found_user = await update_user_field(
-        request, user, user_id, exclude_none=True
+        users, user, user_id, if_match_versions(if_match), exclude_none=True
     )
+    response.headers["ETag"] = user_etag(found_user.version)
     return found_user
 
 
@@ -132,56 +315,77 @@ async def user_put(
     "/users/{user_id}",
     name="users:patch",
     summary="partially update user attributes by id",
+    description="412 - user changed since If-Match ETag",
     response_model=UserDB,
+    responses={
+        status.HTTP_412_PRECONDITION_FAILED: {
+            "description": "Precondition Failed"
+        }
+    },
 )
 async def user_patch(
-    user_id: int, user: UserUpdate, request: Request
-) -> Optional[UserDB]:
+    user_id: int,
+    user: UserUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    users: UserRepository = Depends(get_user_repository),
+) -> Optional[UserRecord]:
     """Partial patch user in db request handler.
 
     Args:
         user_id: user id to patch
         user: partial data to be updated
-        request: incoming request
+        response: outgoing response headers
+        if_match: entity tags of user versions to be updated
+        users: users repository
 
     Returns:
         updated user from DB
     """
     found_user = await update_user_field(
-        request, user, user_id, exclude_unset=True
+        users, user, user_id, if_match_versions(if_match), exclude_unset=True
     )
+    response.headers["ETag"] = user_etag(found_user.version)
     return found_user
 
 
 async def update_user_field(
-    request: Request, user: UserUpdate, user_id: int, **kwargs
-) -> Optional[UserDB]:
+    users: UserRepository,
+    user: UserUpdate,
+    user_id: int,
+    versions: Optional[List[int]] = None,
+    **kwargs,
+) -> UserRecord:
     """Update user in db.
 
+    The update is conditional on user version when versions are given,
+    checked by the update statement itself without locking the row.
+
     Args:
-        request: incoming request
+        users: users repository
         user: user data to be updated
         user_id: user id to be updated
+        versions: expected user versions, None - any version
         **kwargs: key value arguments
 
     Returns:
         updated user from DB
     """
-    db = request.app.state.db
-    res = await db.execute(select(User).filter(User.id == user_id))
-    found_user = res.scalar_one_or_none()
+    values = user.model_dump(**kwargs)
+    if user.password is not None:
+        values["password"] = await hash_password(user.password)
+    try:
+        found_user = await users.update(user_id, values, versions)
+    except VersionConflict:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"User with id '{user_id}' was changed",
+        )
     if not found_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with id '{user_id}' not found",
         )
-    for var, value in user.model_dump(**kwargs).items():
-        setattr(found_user, var, value)
-    if user.model_dump(exclude_none=True).get("password") is not None:
-        found_user.password = password_hash_ctx.hash(user.password)
-    db.add(found_user)
-    await db.commit()
-    await db.refresh(found_user)
     return found_user
 
 
@@ -191,24 +395,28 @@ async def update_user_field(
     summary="delete user by id",
     response_model=UserDB,
 )
-async def user_delete(user_id: int, request: Request) -> Optional[UserDB]:
+async def user_delete(
+    user_id: int,
+    request: Request,
+    users: UserRepository = Depends(get_user_repository),
+) -> Optional[UserRecord]:
     """Delete user by id from DB handler.
 
+    Issued tokens of deleted user are revoked.
+
     Args:
         user_id: user id to be deleted
         request: incoming request
+        users: users repository
 
     Returns:
         deleted user from DB
     """
-    db = request.app.state.db
-    res = await db.execute(select(User).filter(User.id == user_id))
-    found_user = res.scalar_one_or_none()
+    found_user = await users.delete(user_id)
     if not found_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with id '{user_id}' not found",
         )
-    await db.delete(found_user)
-    await db.commit()
+    await disable_user(request.app.state.redis, user_id)
     return found_user
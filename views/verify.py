@@ -0,0 +1,68 @@
+"""
+Forward authentication views module.
+
+Reverse proxies (nginx ``auth_request``, Envoy ``ext_authz``) call
+``/auth/verify`` for every proxied request. The route is a plain
+Starlette endpoint, so no body parsing, dependency solving or response
+validation is done, and decoded tokens are served from tokens cache
+until their expiry. Non-ASCII email is sent percent-encoded with
+``UTF-8''`` prefix as in RFC 8187.
+"""
+from urllib.parse import quote
+
+from fastapi import APIRouter
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+from utils.security import verify_token
+
+router = APIRouter()
+
+UNAUTHORIZED_HEADERS = {"WWW-Authenticate": "Bearer"}
+# RFC 8187 attr-char punctuation, left as is in encoded values
+ATTR_CHARS = "!#$&+-.^_`|~"
+
+
+def _header_value(value: str) -> str:
+    if value.isascii():
+        return value
+    return "UTF-8''" + quote(value, safe=ATTR_CHARS)
+
+
+async def auth_verify(request: Request) -> Response:
+    """Verify bearer access token of proxied request.
+
+    Args:
+        request: incoming request
+
+    Returns:
+        empty response, 200 with identity headers if token is valid,
+        401 - otherwise
+    """
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        claims = await verify_token(request, token.strip())
+        if claims is not None:
+            return Response(
+                headers={
+                    "X-Auth-User-Id": str(claims.get("id", "")),
+                    "X-Auth-User-Email": _header_value(
+                        claims.get("email", "")
+                    ),
+                    "X-Auth-Scopes": " ".join(claims.get("scope") or ()),
+                }
+            )
+    return Response(
+        status_code=status.HTTP_401_UNAUTHORIZED, headers=UNAUTHORIZED_HEADERS
+    )
+
+
+router.add_route(
+    "/auth/verify",
+    auth_verify,
+    methods=["GET", "HEAD"],
+    name="auth:verify",
+    include_in_schema=False,
+)